@@ -0,0 +1,80 @@
+"""Cost of the `AlertEngine` per quote and per evaluation at scale.
+
+Quotes only write the columns of their contract, an evaluation runs the
+rules of the contracts quoted since the last one in one numpy pass.
+
+    python -m benchmarks.bench_alerts
+    python -m benchmarks.bench_alerts --contracts 500 --rules-per-contract 20
+"""
+
+import argparse
+import asyncio
+import timeit
+
+from benchmarks.synthetic import TICK, contract_codes, generate
+from sjtop.alerts import AlertEngine
+from sjtop.price import QuotePrices
+
+# rules of every contract
+ANY_RULES = [
+    {"when": "volume > 5 * mean_volume"},
+    {"when": "spread > 3 ticks"},
+    {"when": "volume >= 50"},
+    {"when": "spread >= 10"},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contracts", type=int, default=300)
+    parser.add_argument("--rules-per-contract", type=int, default=10)
+    args = parser.parse_args()
+
+    codes = contract_codes(args.contracts)
+    rules = list(ANY_RULES)
+    for code in codes:
+        for i in range(args.rules_per_contract):
+            op = ">" if i % 2 else "<"
+            rules.append({"code": code, "when": f"close {op} {16000 + i * 40}"})
+    engine = AlertEngine(asyncio.new_event_loop(), rules, cooldown=0)
+    for code in codes:
+        engine.track(code)
+    messages = list(generate(codes, 20_000, 3))
+    ticks = [quote for kind, quote in messages if kind == TICK]
+    bidasks = [quote for kind, quote in messages if kind != TICK]
+    # converted up front, as `SJTop.dispatch_*` does once for every widget
+    prices = QuotePrices()
+    ticks = [(tick, prices.trade(tick)) for tick in ticks]
+    bidasks = [
+        (quote, *(levels[:] for levels in prices.book(quote))) for quote in bidasks
+    ]
+    # evaluations are run by hand below, not by the loop
+    engine.scheduled = True
+
+    def per_quote(quotes, handler) -> float:
+        run = lambda: [handler(*quote) for quote in quotes]  # noqa: E731
+        return min(timeit.repeat(run, number=1, repeat=3)) / len(quotes) * 1e6
+
+    tick_us = per_quote(ticks, engine.on_tick)
+    bidask_us = per_quote(bidasks, engine.on_bidask)
+    print(f"rules              {len(engine.rules):8,d}")
+    print(f"rule x contract    {len(engine):8,d}")
+    print(f"tick update        {tick_us:8.2f} us")
+    print(f"bid/ask update     {bidask_us:8.2f} us")
+    for touched in (1, 20, len(codes)):
+        batch = {tick.code: (tick, close) for tick, close in ticks}
+        batch = [batch[code] for code in codes[:touched] if code in batch]
+
+        def evaluate():
+            for tick, close in batch:
+                engine.on_tick(tick, close)
+            engine.evaluate()
+            engine.scheduled = True
+
+        seconds = min(timeit.repeat(evaluate, number=50, repeat=3)) / 50
+        print(f"batch {touched:4d} codes    {seconds * 1e6:8.1f} us  (quotes + rules)")
+    print(f"evaluations        {engine.evaluations:8,d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Per-frame cost of `ContractDashBoard.render`.
+
+Compares the incremental render, which keeps its rows and cells between
+frames, with the render that rebuilt every row and `Text` each frame.
+A frame is `render()` plus Rich laying the table out into lines.
+
+    python -m benchmarks.bench_dashboard
+"""
+
+import io
+import timeit
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import shioaji as sj
+from rich.console import Console, Group
+from rich.text import Text
+from shioaji.constant import Exchange
+
+from sjtop.dashboard import ContractDashBoard
+
+BID_PRICE = [Decimal(p) for p in ("16411", "16410", "16409", "16408", "16407")]
+ASK_PRICE = [Decimal(p) for p in ("16413", "16414", "16415", "16416", "16417")]
+
+
+class RebuildDashBoard(ContractDashBoard):
+    """The render before rows and cells were kept between frames."""
+
+    def render(self):
+        if self.modify:
+            self.modify = False
+            for col in self.table.columns:
+                col._cells = []
+            self.table.rows = []
+            book = self.book
+            barsize = book.depth
+            bidsum = book.bid_total
+            asksum = book.ask_total
+            self.total_bar.size = bidsum + asksum
+            self.total_bar.end = bidsum
+
+            for idx in range(10):
+                bar = self.bars[idx]
+                bar.size = barsize
+                bar.begin = barsize - book.cumvol[idx] if idx < 5 else 0
+                bar.end = barsize if idx < 5 else book.cumvol[idx]
+                row_color = "green" if idx < 5 else "red"
+                row_justify = "right" if idx < 5 else "left"
+                self.table.add_row(
+                    *[
+                        bar,
+                        Text(str(book.volume[idx] or ""), justify=row_justify),
+                        Text(
+                            self.scale.text(book.price[idx]) if book.price[idx] else "",
+                            justify=row_justify,
+                        ),
+                    ],
+                    style=row_color,
+                )
+            row_color = "red" if self.cur_tick.tick_type == 1 else "green"
+            row_justify = "right" if self.cur_tick.tick_type == 1 else "left"
+            self.deal_side_bar.end = self.cur_tick.bid_side_total_vol / (
+                self.cur_tick.ask_side_total_vol + self.cur_tick.bid_side_total_vol
+            )
+            self.table.add_row(
+                *[
+                    self.total_bar,
+                    Group(
+                        Text(str(asksum), style="green", justify="right"),
+                        Text(str(bidsum), style="red", justify="left"),
+                    ),
+                    Group(
+                        Text(
+                            str(self.cur_tick.close),
+                            style=row_color,
+                            justify=row_justify,
+                        ),
+                        Text(
+                            str(self.cur_tick.volume),
+                            style=row_color,
+                            justify=row_justify,
+                        ),
+                        self.deal_side_bar,
+                        Text(
+                            f"{self.deal_side_bar.end * 100:.4f}%",
+                            style=row_color,
+                            justify="center",
+                        ),
+                    ),
+                ],
+            )
+        return self.table
+
+
+def bidask(bid_volume):
+    return sj.BidAskFOPv1(
+        code="TXFJ1",
+        datetime=datetime(2021, 10, 4, 9),
+        bid_total_vol=sum(bid_volume),
+        ask_total_vol=60,
+        bid_price=BID_PRICE,
+        bid_volume=bid_volume,
+        diff_bid_vol=[0] * 5,
+        ask_price=ASK_PRICE,
+        ask_volume=[8, 12, 19, 9, 12],
+        diff_ask_vol=[0] * 5,
+        first_derived_bid_price=Decimal("0"),
+        first_derived_ask_price=Decimal("0"),
+        first_derived_bid_vol=0,
+        first_derived_ask_vol=0,
+        underlying_price=Decimal("0"),
+        simtrade=0,
+    )
+
+
+QUOTES = [bidask([2, 7, 7, 21, 9]), bidask([3, 7, 7, 21, 9])]
+
+
+def make(cls) -> ContractDashBoard:
+    contract = sj.contracts.Future(code="TXFJ1", symbol="TXF202110", name="TXF")
+    dashboard = cls("dashboard", contract, MagicMock())
+    quote = QUOTES[0]
+    dashboard.on_fop_v1_bidask(Exchange.TAIFEX, quote, *dashboard.prices.book(quote))
+    return dashboard
+
+
+def console() -> Console:
+    return Console(file=io.StringIO(), width=75, force_terminal=True)
+
+
+def frames(dashboard: ContractDashBoard, changed: bool, layout: bool = True):
+    """One frame per call: update a level (or nothing), render, lay out."""
+    out = console()
+    options = out.options.update_dimensions(75, 16)
+    i = 0
+
+    def frame():
+        nonlocal i
+        i += 1
+        if changed:
+            quote = QUOTES[i % 2]
+            bids, asks = dashboard.prices.book(quote)
+            dashboard.on_fop_v1_bidask(Exchange.TAIFEX, quote, bids, asks)
+        else:
+            dashboard.modify = True
+        table = dashboard.render()
+        if layout:
+            out.render_lines(table, options)
+
+    return frame
+
+
+def allocated_kib(frame, n: int = 50) -> float:
+    """Peak memory allocated inside one frame."""
+    frame()
+    peaks = []
+    for _ in range(n):
+        tracemalloc.start()
+        frame()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks) / 1024
+
+
+def bench(frame, number: int = 300) -> float:
+    return min(timeit.repeat(frame, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    old, new = make(RebuildDashBoard), make(ContractDashBoard)
+    for dashboard in (old, new):
+        dashboard.modify = True
+    outputs = []
+    for dashboard in (old, new):
+        out = console()
+        out.print(dashboard.render())
+        outputs.append(out.file.getvalue())
+    assert outputs[0] == outputs[1], "renders differ"
+
+    print(f"{'':36}{'rebuild':>10}{'incremental':>14}")
+    for changed in (True, False):
+        scenario = "1 level changed" if changed else "unchanged"
+        for layout in (False, True):
+            step = "frame" if layout else "render()"
+            old_frame = frames(old, changed, layout)
+            new_frame = frames(new, changed, layout)
+            for unit, measure in (("us", bench), ("alloc KiB", allocated_kib)):
+                name = f"{scenario} {step} ({unit})"
+                print(f"{name:36}{measure(old_frame):10.1f}{measure(new_frame):14.1f}")
+
+
+if __name__ == "__main__":
+    main()
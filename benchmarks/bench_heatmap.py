@@ -0,0 +1,107 @@
+"""Cost of `DepthHeatmap` per bid/ask quote and per frame.
+
+Quotes only write the newest column of the `DepthBuffer`, a frame draws
+the visible window from it. The stream walks the TXF book one tick at a
+time and changes a level volume on every quote.
+
+    python -m benchmarks.bench_heatmap
+"""
+
+import asyncio
+import io
+import random
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import shioaji as sj
+from rich.console import Console
+from shioaji.constant import Exchange
+
+from sjtop.heatmap import DepthHeatmap
+from sjtop.scheduler import RenderScheduler
+
+QUOTES_PER_SECOND = 200
+
+
+def bidask(dt: datetime, bid: int, volumes):
+    return sj.BidAskFOPv1(
+        code="TXFJ1",
+        datetime=dt,
+        bid_total_vol=sum(volumes[:5]),
+        ask_total_vol=sum(volumes[5:]),
+        bid_price=[Decimal(bid - i) for i in range(5)],
+        bid_volume=volumes[:5],
+        diff_bid_vol=[0] * 5,
+        ask_price=[Decimal(bid + 1 + i) for i in range(5)],
+        ask_volume=volumes[5:],
+        diff_ask_vol=[0] * 5,
+        first_derived_bid_price=Decimal("0"),
+        first_derived_ask_price=Decimal("0"),
+        first_derived_bid_vol=0,
+        first_derived_ask_vol=0,
+        underlying_price=Decimal("0"),
+        simtrade=0,
+    )
+
+
+def stream(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2021, 10, 4, 9)
+    bid = 16400
+    volumes = [rng.randint(1, 30) for _ in range(10)]
+    quotes = []
+    for i in range(n):
+        if rng.random() < 0.05:
+            bid += rng.choice((-1, 1))
+        volumes[rng.randrange(10)] = rng.randint(1, 30)
+        dt = start + timedelta(seconds=i / QUOTES_PER_SECOND)
+        quotes.append(bidask(dt, bid, list(volumes)))
+    return quotes
+
+
+def make() -> DepthHeatmap:
+    contract = sj.contracts.Future(code="TXFJ1", symbol="TXF202110", name="TXF")
+    # frames are never run, marking dirty costs what it does in the app
+    scheduler = RenderScheduler(asyncio.new_event_loop())
+    return DepthHeatmap("heatmap", contract, scheduler)
+
+
+def main():
+    quotes = stream(QUOTES_PER_SECOND * 600)
+    heatmap = make()
+    book = heatmap.prices.book
+    for quote in quotes:
+        heatmap.on_fop_v1_bidask(Exchange.TAIFEX, quote, *book(quote))
+    # converted up front, as `SJTop.dispatch_*` does once for every widget
+    books = [(quote, *(levels[:] for levels in book(quote))) for quote in quotes]
+    per_quote = (
+        min(
+            timeit.repeat(
+                lambda: [
+                    heatmap.on_fop_v1_bidask(Exchange.TAIFEX, *quote)
+                    for quote in books[:20000]
+                ],
+                number=1,
+                repeat=3,
+            )
+        )
+        / 20000
+        * 1e6
+    )
+    out = Console(file=io.StringIO(), width=80, force_terminal=True)
+    options = out.options.update_dimensions(80, 40)
+
+    def frame():
+        out.render_lines(heatmap.draw(80, 40), options)
+
+    draw = min(timeit.repeat(lambda: heatmap.draw(80, 40), number=20, repeat=3)) / 20
+    full = min(timeit.repeat(frame, number=20, repeat=3)) / 20
+    print(f"quote update       {per_quote:8.1f} us  ({1e6 / per_quote:,.0f} quotes/s)")
+    print(f"draw 80x40         {draw * 1e3:8.2f} ms")
+    print(f"frame 80x40        {full * 1e3:8.2f} ms  (draw + Rich layout)")
+    print(f"buffer             {heatmap.buffer.nbytes / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Cost of solving implied volatility and greeks of a TXO chain per frame.
+
+python -m benchmarks.bench_options
+python -m benchmarks.bench_options --strikes 200
+"""
+
+import argparse
+import timeit
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from shioaji.constant import OptionRight
+from shioaji.contracts import Option
+
+from sjtop.options import OptionChain, black_scholes
+
+SPOT = 16400
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strikes", type=int, default=100)
+    args = parser.parse_args()
+
+    strikes = [SPOT + (i - args.strikes // 2) * 50 for i in range(args.strikes)]
+    contracts = [
+        Option(
+            code=f"TXO{strike}{right.value}",
+            category="TXO",
+            delivery_month="202110",
+            delivery_date="2021/10/20",
+            strike_price=strike,
+            option_right=right,
+        )
+        for strike in strikes
+        for right in (OptionRight.Call, OptionRight.Put)
+    ]
+    chain = OptionChain(rate=0.01)
+    chain.reset(contracts)
+    now = datetime(2021, 10, 4, 9)
+    years = (datetime(2021, 10, 20, 8, 45) - now).total_seconds() / (365 * 86400)
+    quotes = []
+    for contract in contracts:
+        call = contract.option_right == OptionRight.Call
+        fair = black_scholes(SPOT, contract.strike_price, years, 0.18, 0.01, call)
+        mid = max(round(float(fair), 1), 0.1)
+        quotes.append(
+            SimpleNamespace(
+                code=contract.code,
+                datetime=now,
+                bid_price=[Decimal(str(max(mid - 0.5, 0.1)))],
+                ask_price=[Decimal(str(mid + 0.5))],
+                underlying_price=Decimal(SPOT),
+            )
+        )
+    for quote in quotes:
+        chain.on_bidask(quote)
+    chain.reprice()
+
+    def full():
+        chain.dirty[:] = True
+        chain.reprice()
+
+    def one_strike():
+        chain.on_bidask(quotes[len(quotes) // 2])
+        chain.reprice()
+
+    per_quote = min(
+        timeit.repeat(lambda: chain.on_bidask(quotes[0]), number=10_000, repeat=3)
+    )
+    full_us = min(timeit.repeat(full, number=100, repeat=3)) / 100 * 1e6
+    one_us = min(timeit.repeat(one_strike, number=1000, repeat=3)) / 1000 * 1e6
+    print(f"options            {len(contracts):8,d}")
+    print(f"quote update       {per_quote * 1e2:8.2f} us")
+    print(f"reprice chain      {full_us:8.1f} us  (new underlying)")
+    print(f"reprice 1 option   {one_us:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
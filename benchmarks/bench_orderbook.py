@@ -0,0 +1,115 @@
+"""Per-update and per-render cost of the dashboard order book.
+
+Compares `sjtop.orderbook.OrderBook` with the pandas DataFrame ladder
+`ContractDashBoard` used before it.
+
+    python -m benchmarks.bench_orderbook
+"""
+
+import timeit
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from sjtop.orderbook import OrderBook
+from sjtop.price import PriceScale, ScaledLevels
+
+BID_PRICE = [Decimal(p) for p in ("16411", "16410", "16409", "16408", "16407")]
+BID_VOLUME = [2, 7, 7, 21, 9]
+ASK_PRICE = [Decimal(p) for p in ("16413", "16414", "16415", "16416", "16417")]
+ASK_VOLUME = [8, 12, 19, 9, 12]
+
+
+class DataFrameBook:
+    def __init__(self) -> None:
+        self.df = pd.DataFrame(
+            np.zeros((10, 2)), columns=["BidAskVolume", "BidAskPrice"]
+        )
+
+    def update(self, bid_price, bid_volume, ask_price, ask_volume):
+        self.df.loc[0:4, "BidAskPrice"] = ask_price[::-1]
+        self.df.loc[0:4, "BidAskVolume"] = ask_volume[::-1]
+        self.df.loc[5:10, "BidAskPrice"] = bid_price
+        self.df.loc[5:10, "BidAskVolume"] = bid_volume
+
+    def render(self):
+        askcumvol = self.df.loc[4::-1, "BidAskVolume"].cumsum().loc[::-1]
+        bidcumvol = self.df.loc[5:10, "BidAskVolume"].cumsum()
+        barsize = max(askcumvol.max(), bidcumvol.max())
+        bidsum = self.df.loc[5:10, "BidAskVolume"].sum()
+        asksum = self.df.loc[0:4, "BidAskVolume"].sum()
+        rows = []
+        for idx in range(10):
+            begin = barsize - askcumvol.loc[idx] if idx < 5 else 0
+            end = barsize if idx < 5 else bidcumvol[idx]
+            rows.append((begin, end, *[str(v if v else "") for v in self.df.loc[idx]]))
+        return bidsum, asksum, rows
+
+
+class ScaledBook(OrderBook):
+    """`OrderBook` fed Decimal quotes the way `ContractDashBoard` feeds it."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.scale = PriceScale()
+        self.bid_levels = ScaledLevels(self.scale)
+        self.ask_levels = ScaledLevels(self.scale)
+
+    def update(self, bid_price, bid_volume, ask_price, ask_volume):
+        super().update(
+            self.bid_levels(bid_price),
+            bid_volume,
+            self.ask_levels(ask_price),
+            ask_volume,
+        )
+
+
+def render_orderbook(book: ScaledBook):
+    barsize = book.depth
+    rows = []
+    for idx in range(10):
+        begin = barsize - book.cumvol[idx] if idx < 5 else 0
+        end = barsize if idx < 5 else book.cumvol[idx]
+        rows.append(
+            (
+                begin,
+                end,
+                str(book.volume[idx] if book.volume[idx] else ""),
+                book.scale.text(book.price[idx]) if book.price[idx] else "",
+            )
+        )
+    return book.bid_total, book.ask_total, rows
+
+
+def bench(stmt, number: int) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    df_book = DataFrameBook()
+    book = ScaledBook()
+    args = (BID_PRICE, BID_VOLUME, ASK_PRICE, ASK_VOLUME)
+    df_book.update(*args)
+    book.update(*args)
+    assert df_book.render()[2][0][3] == render_orderbook(book)[2][0][3]
+
+    results = [
+        (
+            "update",
+            bench(lambda: df_book.update(*args), 500),
+            bench(lambda: book.update(*args), 50000),
+        ),
+        (
+            "render",
+            bench(df_book.render, 500),
+            bench(lambda: render_orderbook(book), 50000),
+        ),
+    ]
+    print(f"{'':8}{'DataFrame (us)':>16}{'OrderBook (us)':>16}{'speedup':>10}")
+    for name, old, new in results:
+        print(f"{name:8}{old:16.2f}{new:16.2f}{old / new:9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Sustained load through the quote-to-screen pipeline.
+
+Synthetic `TickFOPv1` / `BidAskFOPv1` quotes are pushed from a producer
+thread into the `SJTop` callbacks at `--rate` messages per second (0 means
+as fast as possible). They go through `QuoteIngest`, the dispatchers, the
+widgets and the `RenderScheduler`; every frame renders the dirty widgets
+headlessly to a Rich console.
+
+    python -m benchmarks.bench_pipeline --count 50000 --rate 0
+    python -m benchmarks.bench_pipeline --rate 20000 --callback-us 20
+    python -m benchmarks.bench_pipeline --history
+
+`--callback-us` spins that long in the producer before every callback,
+standing in for shioaji decoding the message on its thread.
+
+Each run appends one JSON line to `benchmarks/results/pipeline.jsonl`,
+which git ignores, the runs of one machine only compare with each other:
+throughput, render time p50/p99, and from a second, tracemalloc
+instrumented pass the peak traced memory and the memory blocks per
+message still allocated after the run. CPython keeps no count of the
+allocations made, `retained_blocks_per_msg` is what the messages leave
+behind (caches, history, leaks), not how often they allocate.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from rich.console import Console
+from shioaji.constant import Exchange
+from shioaji.contracts import Future
+
+from benchmarks.synthetic import BIDASK, TICK, Message, contract_codes, generate
+from sjtop.alerts import AlertEngine
+from sjtop.app import SJTop
+from sjtop.chart import CandleChart
+from sjtop.dashboard import ContractDashBoard
+from sjtop.flow import FlowPanel, TradeFlows
+from sjtop.heatmap import DepthHeatmap
+from sjtop.ingest import QuoteIngest
+from sjtop.metrics import Metrics
+from sjtop.options import OptionChainView
+from sjtop.price import QuotePrices
+from sjtop.scheduler import RenderScheduler
+from sjtop.spreads import SpreadPanel
+from sjtop.tick_cache import TickCache
+from sjtop.tick_view import TickViewer
+from sjtop.watchlist import Watchlist
+
+RESULTS = Path(__file__).parent / "results" / "pipeline.jsonl"
+
+# width, height of the widgets in a 120x40 terminal
+SIZES = {
+    "dashboard": (70, 16),
+    "tickviewer": (50, 17),
+    "watchlist": (120, 12),
+    "chart": (120, 16),
+}
+
+
+def feed(
+    handlers: Dict[str, Callable],
+    messages: List[Message],
+    rate: float,
+    callback_us: float,
+):
+    start = time.perf_counter()
+    spin = callback_us / 1e6
+    for i, (kind, quote) in enumerate(messages):
+        if rate:
+            ahead = start + i / rate - time.perf_counter()
+            if ahead > 0.001:
+                time.sleep(ahead)
+        if spin:
+            until = time.perf_counter() + spin
+            while time.perf_counter() < until:
+                pass
+        handlers[kind](Exchange.TAIFEX, quote)
+
+
+class Pipeline:
+    """`SJTop` wired like `on_mount` does, without a terminal."""
+
+    def __init__(
+        self,
+        codes: List[str],
+        fps: Optional[float],
+        metrics: bool = True,
+        callback_us: float = 0,
+    ) -> None:
+        self.codes = codes
+        self.callback_us = callback_us
+        self.loop = asyncio.new_event_loop()
+        self.console = Console(
+            file=io.StringIO(),
+            width=120,
+            height=40,
+            force_terminal=True,
+            color_system="truecolor",
+        )
+        self.render_times: Dict[str, List[float]] = {name: [] for name in SIZES}
+        app = self.app = SJTop()
+        app.loop = self.loop
+        app.journal = None
+        app.scheduler = RenderScheduler(self.loop, fps=fps)
+        app.ingest = QuoteIngest(self.loop)
+        app.metrics = Metrics(metrics)
+        app.tick_cache = TickCache()
+        app.contract = Future(code=codes[0], symbol=codes[0], name=codes[0])
+        app.prices = prices = QuotePrices()
+        app.watchlist = Watchlist("watchlist", codes, app.scheduler, prices)
+        app.dashbaord = ContractDashBoard(
+            "dashboard", app.contract, app.scheduler, prices
+        )
+        app.tick_viewer = TickViewer("tickviewer", app.contract, app.scheduler, prices)
+        app.chart = CandleChart("chart", app.contract, app.scheduler, prices)
+        app.flows = TradeFlows(prices=prices)
+        app.flows.track(app.contract.code)
+        app.alerts = AlertEngine(self.loop)
+        for code in codes:
+            app.alerts.track(code)
+        app.flow_panel = FlowPanel("flow", app.flows, app.scheduler)
+        app.heatmap = DepthHeatmap("heatmap", app.contract, app.scheduler, prices)
+        app.option_chain = OptionChainView("chain", app.scheduler)
+        app.spreads = SpreadPanel("spreads", [], app.scheduler, prices=prices)
+        for widget in (app.watchlist, app.dashbaord, app.tick_viewer, app.chart):
+            widget.refresh = self.painter(widget)
+        # hidden by default, Textual skips their frames
+        for widget in (app.flow_panel, app.heatmap, app.option_chain, app.spreads):
+            widget.refresh = lambda: None
+
+    def painter(self, widget):
+        width, height = SIZES[widget.name]
+        options = self.console.options.update_dimensions(width, height)
+
+        def paint():
+            start = time.perf_counter()
+            self.console.render_lines(widget.render(), options)
+            self.render_times[widget.name].append(time.perf_counter() - start)
+
+        return paint
+
+    async def drive(self, messages: List[Message], rate: float) -> float:
+        handlers = {TICK: self.app.on_fop_v1_tick, BIDASK: self.app.on_fop_v1_bidask}
+        producer = threading.Thread(
+            target=feed, args=(handlers, messages, rate, self.callback_us)
+        )
+        self.cpu = time.process_time()
+        start = time.perf_counter()
+        producer.start()
+        ingest, scheduler = self.app.ingest, self.app.scheduler
+        while producer.is_alive() or ingest.scheduled or scheduler.pending:
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - start
+        producer.join()
+        self.cpu = time.process_time() - self.cpu
+        return elapsed
+
+    def run(self, messages: List[Message], rate: float) -> float:
+        try:
+            return self.loop.run_until_complete(self.drive(messages, rate))
+        finally:
+            self.loop.close()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(args: argparse.Namespace) -> Dict:
+    codes = contract_codes(args.contracts)
+    messages = list(generate(codes, args.count, args.bidasks_per_tick, args.seed))
+
+    pipeline = Pipeline(codes, args.fps, args.metrics, args.callback_us)
+    elapsed = pipeline.run(messages, args.rate)
+    render_times = pipeline.render_times
+    render_us = np.concatenate([times for times in render_times.values()]) * 1e6
+    scheduler, ingest = pipeline.app.scheduler, pipeline.app.ingest
+
+    traced = Pipeline(codes, args.fps, args.metrics, args.callback_us)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    baseline = tracemalloc.get_traced_memory()[0]
+    traced.run(messages, args.rate)
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "params": {
+            "count": args.count,
+            "rate": args.rate,
+            "contracts": args.contracts,
+            "fps": args.fps,
+            "bidasks_per_tick": args.bidasks_per_tick,
+            "seed": args.seed,
+            "metrics": args.metrics,
+            "callback_us": args.callback_us,
+        },
+        "msgs_per_s": round(len(messages) / elapsed),
+        "cpu_us_per_msg": round(pipeline.cpu / len(messages) * 1e6, 2),
+        "frames": scheduler.frames,
+        "renders": len(render_us),
+        "render_p50_us": round(float(np.percentile(render_us, 50)), 1),
+        "render_p99_us": round(float(np.percentile(render_us, 99)), 1),
+        "widget_render_p50_us": {
+            name: round(float(np.median(times)) * 1e6, 1)
+            for name, times in render_times.items()
+            if times
+        },
+        "batches": ingest.batches,
+        "conflated": ingest.conflated,
+        "max_depth": ingest.max_depth,
+        "retained_blocks_per_msg": round(retained / len(messages), 3),
+        "peak_traced_kib": round((peak - baseline) / 1024),
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def history(path: Path):
+    columns = [
+        ("time", 20),
+        ("commit", 8),
+        ("msgs_per_s", 11),
+        ("render_p50_us", 14),
+        ("render_p99_us", 14),
+        ("retained_blocks_per_msg", 24),
+        ("peak_traced_kib", 16),
+    ]
+    print("".join(f"{name:>{width}}" for name, width in columns))
+    if not path.exists():
+        return
+    for line in path.read_text().splitlines():
+        result = json.loads(line)
+        print("".join(f"{str(result[name]):>{width}}" for name, width in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=50_000)
+    parser.add_argument("--rate", type=float, default=0, help="msgs/s, 0: max")
+    parser.add_argument("--contracts", type=int, default=20)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--bidasks-per-tick", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-metrics", dest="metrics", action="store_false", help="no Metrics"
+    )
+    parser.add_argument(
+        "--callback-us", type=float, default=0, help="producer work per message"
+    )
+    parser.add_argument("--output", type=Path, default=RESULTS)
+    parser.add_argument("--history", action="store_true", help="show past runs")
+    args = parser.parse_args()
+    if args.history:
+        history(args.output)
+        return
+    result = measure(args)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("a") as f:
+        f.write(json.dumps(result) + "\n")
+    print(json.dumps(result, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Cost of the `SpreadBook` per quote as the number of spreads grows.
+
+Every spread is a calendar-like pair of two contracts plus a basis of one
+against its underlying; a quote only corrects the running sums of the
+legs of its contract, whatever the number of spreads on the others.
+
+    python -m benchmarks.bench_spreads
+    python -m benchmarks.bench_spreads --contracts 50 --spreads 10 100 400
+"""
+
+import argparse
+import timeit
+
+from benchmarks.synthetic import TICK, contract_codes, generate
+from sjtop.price import QuotePrices
+from sjtop.spreads import SpreadBook, parse_spread
+
+
+def spreads_of(codes, count: int):
+    spreads = []
+    for i in range(count):
+        near, far = codes[i % len(codes)], codes[(i + 1) % len(codes)]
+        legs = f"{near} - {far}" if i % 2 else f"{near} - {near}.underlying"
+        spreads.append(parse_spread({"legs": legs}))
+    return spreads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contracts", type=int, default=50)
+    parser.add_argument("--spreads", type=int, nargs="+", default=[10, 50, 200])
+    args = parser.parse_args()
+
+    codes = contract_codes(args.contracts)
+    messages = list(generate(codes, 20_000, 3))
+    ticks = [quote for kind, quote in messages if kind == TICK]
+    bidasks = [quote for kind, quote in messages if kind != TICK]
+    # converted up front, as `SJTop.dispatch_*` does once for every widget
+    prices = QuotePrices()
+    ticks = [(tick, prices.trade(tick)) for tick in ticks]
+    bidasks = [
+        (quote, *(levels[:] for levels in prices.book(quote))) for quote in bidasks
+    ]
+    print(f"{'spreads':>8} {'legs/code':>10} {'tick us':>8} {'bidask us':>10}")
+    for count in args.spreads:
+        book = SpreadBook(spreads_of(codes, count), interval=1, prices=prices)
+
+        def per_quote(quotes, handler) -> float:
+            run = lambda: [handler(*quote) for quote in quotes]  # noqa: E731
+            return min(timeit.repeat(run, number=1, repeat=3)) / len(quotes) * 1e6
+
+        legs = len(book.ratios) / len(codes)
+        tick_us = per_quote(ticks, book.on_tick)
+        bidask_us = per_quote(bidasks, book.on_bidask)
+        print(f"{count:8d} {legs:10.1f} {tick_us:8.2f} {bidask_us:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
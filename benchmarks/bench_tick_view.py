@@ -0,0 +1,68 @@
+"""Cost of the `TickViewer` tape per tick and per frame with a full session.
+
+The tape keeps every tick in numpy columns and formats only the rows in
+the viewport, so neither cost grows with the session length.
+
+    python -m benchmarks.bench_tick_view
+"""
+
+import asyncio
+import io
+import timeit
+from datetime import time
+
+import shioaji as sj
+from rich.console import Console
+from shioaji.constant import Exchange
+
+from benchmarks.synthetic import TICK, generate
+from sjtop.scheduler import RenderScheduler
+from sjtop.tick_view import TickViewer
+
+SESSION_TICKS = 500_000
+ROWS = 40
+
+
+def main():
+    contract = sj.contracts.Future(code="TXFJ1", symbol="TXF202110", name="TXF")
+    # frames are never run, marking dirty costs what it does in the app
+    viewer = TickViewer("tape", contract, RenderScheduler(asyncio.new_event_loop()))
+    viewer.set_depth(ROWS)
+    ticks = [quote for kind, quote in generate(["TXFJ1"], 40_000, 1) if kind == TICK]
+    # converted up front, as `SJTop.dispatch_*` does once for every widget
+    ticks = [(tick, viewer.prices.trade(tick)) for tick in ticks]
+    on_tick = viewer.on_fop_v1_tick
+    while len(viewer.tape) < SESSION_TICKS:
+        for tick, close in ticks:
+            on_tick(Exchange.TAIFEX, tick, close)
+    per_tick = (
+        min(
+            timeit.repeat(
+                lambda: [on_tick(Exchange.TAIFEX, *tick) for tick in ticks],
+                number=1,
+                repeat=3,
+            )
+        )
+        / len(ticks)
+        * 1e6
+    )
+    out = Console(file=io.StringIO(), width=50, force_terminal=True)
+    options = out.options.update_dimensions(50, ROWS + 2)
+
+    def frame():
+        viewer.page(1)
+        out.render_lines(viewer.build_table(), options)
+
+    rows = min(timeit.repeat(lambda: viewer.rows, number=100, repeat=3)) / 100
+    full = min(timeit.repeat(frame, number=20, repeat=3)) / 20
+    jump = min(timeit.repeat(lambda: viewer.jump(time(9)), number=100, repeat=3))
+    print(f"ticks              {len(viewer.tape):8,d}")
+    print(f"tick append        {per_tick:8.1f} us  ({1e6 / per_tick:,.0f} ticks/s)")
+    print(f"viewport rows      {rows * 1e3:8.2f} ms  ({ROWS} rows formatted)")
+    print(f"page + frame       {full * 1e3:8.2f} ms  ({ROWS} rows, Rich layout)")
+    print(f"jump to time       {jump * 1e4:8.1f} us")
+    print(f"tape               {viewer.tape.nbytes / 1024 / 1024:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
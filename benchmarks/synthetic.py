@@ -0,0 +1,125 @@
+"""Synthetic TAIFEX quote streams for benchmarks.
+
+Prices random-walk by whole ticks around a start price, every trade is
+preceded by a few book updates of the same contract, like the real feed.
+"""
+
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterator, List, Tuple
+
+import shioaji as sj
+
+TICK = "tick"
+BIDASK = "bidask"
+
+Message = Tuple[str, object]
+
+
+class ContractWalk:
+    """Quote state of one synthetic contract."""
+
+    def __init__(self, code: str, price: int, rng: random.Random) -> None:
+        self.code = code
+        self.rng = rng
+        self.reference = price
+        self.price = price
+        self.open = self.high = self.low = price
+        self.total_volume = 0
+        self.total_amount = 0
+        self.bid_side_total_vol = 0
+        self.ask_side_total_vol = 0
+
+    def bidask(self, dt: datetime) -> sj.BidAskFOPv1:
+        rng = self.rng
+        bid_volume = [rng.randint(1, 30) for _ in range(5)]
+        ask_volume = [rng.randint(1, 30) for _ in range(5)]
+        return sj.BidAskFOPv1(
+            code=self.code,
+            datetime=dt,
+            bid_total_vol=sum(bid_volume),
+            ask_total_vol=sum(ask_volume),
+            bid_price=[Decimal(self.price - i) for i in range(5)],
+            bid_volume=bid_volume,
+            diff_bid_vol=[rng.randint(-3, 3) for _ in range(5)],
+            ask_price=[Decimal(self.price + 1 + i) for i in range(5)],
+            ask_volume=ask_volume,
+            diff_ask_vol=[rng.randint(-3, 3) for _ in range(5)],
+            first_derived_bid_price=Decimal("0"),
+            first_derived_ask_price=Decimal("0"),
+            first_derived_bid_vol=0,
+            first_derived_ask_vol=0,
+            underlying_price=Decimal(self.price),
+            simtrade=0,
+        )
+
+    def tick(self, dt: datetime) -> sj.TickFOPv1:
+        rng = self.rng
+        tick_type = rng.choice((1, 2))
+        self.price += rng.choice((-1, 0, 0, 1))
+        close = self.price + 1 if tick_type == 1 else self.price
+        volume = max(int(rng.expovariate(0.3)), 1)
+        self.high = max(self.high, close)
+        self.low = min(self.low, close)
+        self.total_volume += volume
+        self.total_amount += close * volume
+        if tick_type == 1:
+            self.bid_side_total_vol += volume
+        else:
+            self.ask_side_total_vol += volume
+        price_chg = close - self.reference
+        return sj.TickFOPv1(
+            code=self.code,
+            datetime=dt,
+            open=Decimal(self.open),
+            underlying_price=Decimal(self.price),
+            bid_side_total_vol=self.bid_side_total_vol,
+            ask_side_total_vol=self.ask_side_total_vol,
+            avg_price=Decimal(self.total_amount) / self.total_volume,
+            close=Decimal(close),
+            high=Decimal(self.high),
+            low=Decimal(self.low),
+            amount=Decimal(close),
+            total_amount=Decimal(self.total_amount),
+            volume=volume,
+            total_volume=self.total_volume,
+            tick_type=tick_type,
+            chg_type=2 if price_chg > 0 else 4 if price_chg < 0 else 3,
+            price_chg=Decimal(price_chg),
+            pct_chg=Decimal(price_chg) / self.reference * 100,
+            simtrade=0,
+        )
+
+
+def contract_codes(n: int) -> List[str]:
+    """`TXFJ1` first, then made up codes of the same shape."""
+    codes = ["TXFJ1"]
+    for i in range(1, n):
+        codes.append(f"{chr(65 + i // 26 % 26)}{chr(65 + i % 26)}FJ1")
+    return codes
+
+
+def generate(
+    codes: List[str],
+    count: int,
+    bidasks_per_tick: int = 3,
+    seed: int = 0,
+    start: datetime = datetime(2021, 10, 4, 8, 45),
+) -> Iterator[Message]:
+    """Yield `count` (kind, quote) messages spread over the contracts."""
+    rng = random.Random(seed)
+    walks = [ContractWalk(code, 16400 + 100 * i, rng) for i, code in enumerate(codes)]
+    dt = start
+    step = timedelta(microseconds=500)
+    sent = 0
+    while sent < count:
+        walk = rng.choice(walks)
+        for _ in range(min(bidasks_per_tick, count - sent)):
+            dt += step
+            yield BIDASK, walk.bidask(dt)
+            sent += 1
+        if sent < count:
+            dt += step
+            yield TICK, walk.tick(dt)
+            sent += 1
@@ -0,0 +1,2 @@
+# the entry point reads it before any heavy module is imported
+DEFAULT_SOCKET = "~/.cache/sjtop/sjtop.sock"
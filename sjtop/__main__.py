@@ -1,7 +1,34 @@
-from .app import SJTop
+import argparse
+
+from . import DEFAULT_SOCKET
 
 
 def main():
+    parser = argparse.ArgumentParser(prog="sjtop")
+    parser.add_argument(
+        "--server",
+        nargs="?",
+        const=DEFAULT_SOCKET,
+        metavar="SOCKET",
+        help="view the quotes of a running `sjtop serve`",
+    )
+    commands = parser.add_subparsers(dest="command")
+    serve_parser = commands.add_parser(
+        "serve", help="hold one shioaji session and serve local viewers"
+    )
+    serve_parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    serve_parser.add_argument("--config", default="sjtop.json")
+    args = parser.parse_args()
+    # shioaji and Textual load once the arguments are known, `--help` is instant
+    if args.command == "serve":
+        from .server import serve
+
+        serve(args.socket, args.config)
+        return
+    from .app import SJTop
+
+    if args.server:
+        SJTop.config_overrides = dict(server=args.server)
     SJTop.run(title="sjtop", log="sjtop.log")
 
 
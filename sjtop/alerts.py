@@ -0,0 +1,330 @@
+"""Alert rules over the quotes of every tracked contract.
+
+A rule compares a field of a contract with a number, a number of ticks or
+a multiple of another field:
+
+    close > 17000
+    volume >= 5 * mean_volume
+    spread > 2 ticks
+
+Rules are compiled into arrays, one entry per rule and contract, and
+evaluated together with numpy once per batch of quotes; a quote only
+writes the fields of its contract.
+"""
+
+import asyncio
+import re
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from sjtop.price import FACTOR
+from sjtop.protocol import from_us, to_us
+
+FIELDS = ("close", "volume", "mean_volume", "bid", "ask", "spread", "tick")
+CLOSE, VOLUME, MEAN_VOLUME, BID, ASK, SPREAD, TICK = range(len(FIELDS))
+# a column of ones, the right side of a rule against a number
+ONE = len(FIELDS)
+# any tracked contract
+ANY = "*"
+NAN = float("nan")
+
+RULE = re.compile(
+    r"^\s*(?P<field>\w+)\s*(?P<op>>=|<=|>|<)\s*"
+    r"(?:(?P<number>-?\d+(?:\.\d+)?)\s*(?:(?P<ticks>ticks?)|\*\s*(?P<times>\w+))?"
+    r"|(?P<other>\w+))\s*$"
+)
+
+
+class Rule(NamedTuple):
+    code: str
+    when: str
+    field: int
+    op: str
+    # the right side is `coef * column`
+    coef: float
+    column: int
+    cooldown: float
+    name: str
+
+    @property
+    def label(self) -> str:
+        return self.name or self.when
+
+
+def field_index(name: str, when: str) -> int:
+    try:
+        return FIELDS.index(name)
+    except ValueError:
+        raise ValueError(f"alert {when!r}: unknown field {name!r}") from None
+
+
+def parse_rule(config: dict, cooldown: float = 60.0) -> Rule:
+    """A `Rule` from a config entry like `{"code": "TXFJ1", "when": "close > 1"}`.
+
+    `code` defaults to every tracked contract, `cooldown` is in seconds of
+    quote time.
+    """
+    when = config.get("when", "")
+    match = RULE.match(when)
+    if not match:
+        raise ValueError(f"alert {when!r}: expected `field op value`")
+    if match["other"]:
+        coef, column = 1.0, field_index(match["other"], when)
+    elif match["ticks"]:
+        coef, column = float(match["number"]), TICK
+    elif match["times"]:
+        coef, column = float(match["number"]), field_index(match["times"], when)
+    else:
+        coef, column = float(match["number"]), ONE
+    return Rule(
+        code=config.get("code", ANY),
+        when=when,
+        field=field_index(match["field"], when),
+        op=match["op"],
+        coef=coef,
+        column=column,
+        cooldown=float(config.get("cooldown", cooldown)),
+        name=config.get("name", ""),
+    )
+
+
+class Alert(NamedTuple):
+    # quote time, microseconds since the epoch
+    ts: int
+    code: str
+    rule: Rule
+    value: float
+
+    @property
+    def text(self) -> str:
+        return f"{self.code} {self.rule.label} ({self.value:g})"
+
+
+class AlertEngine:
+    """Evaluate every rule on every tracked contract, batched per quote burst.
+
+    A quote writes the fields of its contract's row, plain floats; an
+    evaluation stacks the rows quoted since the last one into columns and
+    runs all their rules in one numpy pass. Between two evaluations a row
+    also keeps the high and low of every field it got, rules with `>` look
+    at the high and `<` at the low, so a cross inside a batch is not
+    missed. A rule fires when it turns true (edge triggered) and at least
+    its cooldown after it last fired; `mean_volume` is the mean of the last
+    `window` trades before the newest one.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        rules: Iterable[dict] = (),
+        window: int = 20,
+        cooldown: float = 60.0,
+        on_alert: Optional[Callable[[Alert], None]] = None,
+    ) -> None:
+        self.loop = loop
+        self.rules = [parse_rule(rule, cooldown) for rule in rules]
+        self.window = window
+        self.on_alert = on_alert
+        self.rows: Dict[str, int] = {}
+        self.codes: List[str] = []
+        self.last: List[List[float]] = []
+        self.hi: List[List[float]] = []
+        self.lo: List[List[float]] = []
+        self.volumes: List[Deque[int]] = []
+        self.volume_sums: List[int] = []
+        # (rule, contract) pairs, the pairs of a contract are contiguous
+        self.rule_of = np.empty(0, dtype=np.intp)
+        self.pairs: List[np.ndarray] = []
+        self.compiled = {
+            name: np.empty(0, dtype=dtype)
+            for name, dtype in (
+                ("field", np.intp),
+                ("column", np.intp),
+                ("coef", np.float64),
+                ("above", np.bool_),
+                ("inclusive", np.bool_),
+                ("cooldown", np.float64),
+            )
+        }
+        self.active = np.empty(0, dtype=np.bool_)
+        self.fired = np.empty(0, dtype=np.float64)
+        self.touched: Dict[int, None] = {}
+        self.now = 0
+        self.scheduled = False
+        self.evaluations = 0
+
+    @property
+    def watched_codes(self) -> List[str]:
+        """Codes named by the rules, in rule order."""
+        return list(dict.fromkeys(rule.code for rule in self.rules if rule.code != ANY))
+
+    def __len__(self) -> int:
+        return len(self.rule_of)
+
+    def track(self, code: str):
+        """Add a contract, with every rule for it or for any contract."""
+        if code in self.rows:
+            return
+        self.rows[code] = len(self.codes)
+        self.codes.append(code)
+        self.last.append([NAN] * ONE + [1.0])
+        self.hi.append([NAN] * (ONE + 1))
+        self.lo.append([NAN] * (ONE + 1))
+        self.volumes.append(deque(maxlen=self.window))
+        self.volume_sums.append(0)
+        rules = [i for i, rule in enumerate(self.rules) if rule.code in (code, ANY)]
+        start = len(self.rule_of)
+        self.pairs.append(np.arange(start, start + len(rules)))
+        self.rule_of = np.append(self.rule_of, np.array(rules, dtype=np.intp))
+        picked = [self.rules[i] for i in rules]
+        values = {
+            "field": [rule.field for rule in picked],
+            "column": [rule.column for rule in picked],
+            "coef": [rule.coef for rule in picked],
+            "above": [rule.op[0] == ">" for rule in picked],
+            "inclusive": [rule.op.endswith("=") for rule in picked],
+            "cooldown": [rule.cooldown * 1e6 for rule in picked],
+        }
+        for name, arr in self.compiled.items():
+            self.compiled[name] = np.append(arr, np.array(values[name], arr.dtype))
+        self.active = np.append(self.active, np.zeros(len(rules), dtype=np.bool_))
+        self.fired = np.append(self.fired, np.full(len(rules), -np.inf))
+
+    def untrack(self, code: str):
+        """Forget the quotes of `code`, its rules fire again on the next ones."""
+        row = self.rows.get(code)
+        if row is None:
+            return
+        self.last[row] = [NAN] * ONE + [1.0]
+        self.hi[row] = [NAN] * (ONE + 1)
+        self.lo[row] = [NAN] * (ONE + 1)
+        self.volumes[row].clear()
+        self.volume_sums[row] = 0
+        self.active[self.pairs[row]] = False
+        self.touched.pop(row, None)
+
+    def update(self, row: int, *values: Tuple[int, float]):
+        last, hi, lo = self.last[row], self.hi[row], self.lo[row]
+        for field, value in values:
+            last[field] = value
+            if value != value:
+                continue
+            # nan never compares, the first value replaces it
+            if not value <= hi[field]:
+                hi[field] = value
+            if not value >= lo[field]:
+                lo[field] = value
+
+    def touch(self, row: int, ts: int):
+        if ts > self.now:
+            self.now = ts
+        self.touched[row] = None
+        if not self.scheduled:
+            self.scheduled = True
+            self.loop.call_soon(self.evaluate)
+
+    def on_tick(self, tick, close: int):
+        row = self.rows.get(tick.code)
+        if row is None:
+            return
+        volumes, volume = self.volumes[row], tick.volume
+        total = self.volume_sums[row]
+        mean = total / len(volumes) if volumes else NAN
+        if len(volumes) == volumes.maxlen:
+            total -= volumes[0]
+        volumes.append(volume)
+        self.volume_sums[row] = total + volume
+        self.update(row, (MEAN_VOLUME, mean), (CLOSE, close / FACTOR), (VOLUME, volume))
+        self.touch(row, to_us(tick.datetime))
+
+    def on_bidask(self, quote, bids: array, asks: array):
+        row = self.rows.get(quote.code)
+        if row is None:
+            return
+        bid = bids[0] / FACTOR if bids[0] else NAN
+        ask = asks[0] / FACTOR if asks[0] else NAN
+        self.update(row, (BID, bid), (ASK, ask), (SPREAD, ask - bid))
+        levels = sorted({p for p in (*bids, *asks) if p})
+        if len(levels) > 1:
+            gap = min(b - a for a, b in zip(levels, levels[1:]))
+            self.last[row][TICK] = gap / FACTOR
+        self.touch(row, to_us(quote.datetime))
+
+    def evaluate(self) -> List[Alert]:
+        """Run the rules of the contracts quoted since the last evaluation."""
+        self.scheduled = False
+        rows, self.touched = list(self.touched), {}
+        if not rows:
+            return []
+        self.evaluations += 1
+        pairs = [self.pairs[row] for row in rows]
+        index = np.concatenate(pairs)
+        # the stacked row of every pair
+        local = np.repeat(np.arange(len(rows)), [len(p) for p in pairs])
+        last = np.array([self.last[row] for row in rows])
+        hi = np.array([self.hi[row] for row in rows])
+        lo = np.array([self.lo[row] for row in rows])
+        compiled = {name: arr[index] for name, arr in self.compiled.items()}
+        above, field = compiled["above"], compiled["field"]
+        value = last[local, field]
+        value = np.where(
+            above,
+            np.fmax(hi[local, field], value),
+            np.fmin(lo[local, field], value),
+        )
+        bound = compiled["coef"] * last[local, compiled["column"]]
+        with np.errstate(invalid="ignore"):
+            true = np.where(above, value > bound, value < bound)
+            true |= compiled["inclusive"] & (value == bound)
+        fire = true & ~self.active[index]
+        fire &= self.now - self.fired[index] >= compiled["cooldown"]
+        self.active[index] = true
+        for row in rows:
+            self.hi[row] = [NAN] * (ONE + 1)
+            self.lo[row] = [NAN] * (ONE + 1)
+        fired = np.flatnonzero(fire)
+        if not len(fired):
+            return []
+        self.fired[index[fired]] = self.now
+        alerts = [
+            Alert(
+                self.now,
+                self.codes[rows[local[i]]],
+                self.rules[self.rule_of[index[i]]],
+                float(value[i]),
+            )
+            for i in fired
+        ]
+        if self.on_alert:
+            for alert in alerts:
+                self.on_alert(alert)
+        return alerts
+
+
+class AlertLog:
+    """Append alerts to a text file, one line each."""
+
+    def __init__(self, path) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = self.path.open("a", buffering=1)
+
+    def write(self, alert: Alert):
+        at = from_us(alert.ts).isoformat(timespec="milliseconds")
+        self.file.write(f"{at} {alert.code} {alert.rule.when} {alert.value:g}\n")
+
+    def close(self):
+        self.file.close()
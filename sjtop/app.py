@@ -1,8 +1,12 @@
-from datetime import date, datetime, timedelta
+import asyncio
+from datetime import date
 import json
-import pandas as pd
+import pickle
+from functools import partial
+from importlib import import_module
 import shioaji as sj
 from pathlib import Path
+from typing import TYPE_CHECKING, Awaitable, Callable, List, NamedTuple, Optional, Set
 
 from shioaji.constant import (
     Exchange,
@@ -11,138 +15,761 @@ from shioaji.constant import (
     SecurityType,
     TicksQueryType,
 )
+from textual import events
 from textual.app import App
 from textual.widgets import ScrollView
+from sjtop.chart import CandleChart
 from sjtop.dashboard import ContractDashBoard
-from sjtop.side import ContractsTree, ContractClick
+from sjtop.flow import FlowPanel, TradeFlows
+from sjtop.ingest import QuoteIngest
+from sjtop.journal import JournalWriter, trading_day
+from sjtop.metrics import Metrics, MetricsPanel, exchange_now, instrumented
+from sjtop.price import QuotePrices
+from sjtop.scheduler import FrameStats, RenderScheduler
+from sjtop.side import ContractsScrollView, ContractsTree, ContractClick
+from sjtop.startup import PhaseTimer, find_contract, load_snapshot, save_snapshot
+from sjtop.tick_cache import TickCache, TickRecord, records_from_ticks
 
 from sjtop.status_panel import StatusPanel
-from sjtop.tick_view import TickViewer
+from sjtop.tick_view import TickViewer, parse_time
+from sjtop.watchlist import Watchlist
+
+# features import their modules on first use, not with the app
+if TYPE_CHECKING:
+    from textual.widget import Widget
+
+    from sjtop.alerts import Alert, AlertEngine, AlertLog
+    from sjtop.heatmap import DepthHeatmap
+    from sjtop.history import HistoryLoader, HistoryStore
+    from sjtop.options import OptionChainView
+    from sjtop.spreads import SpreadPanel
+
+# what the chart and the tick tape take from a history download
+HISTORY_COLUMNS = ["datetime", "close", "volume", "bid_price", "ask_price", "tick_type"]
+
+
+class Prompt(NamedTuple):
+    """A line typed at the status panel, digits and `separators`."""
+
+    label: str
+    separators: str
+    done: Callable[[str], Awaitable[None]]
 
 
 class SJTop(App):
     api: sj.Shioaji
     contract: sj.contracts.Contract
+    # settings from the command line, over the ones of sjtop.json
+    config_overrides: dict = {}
 
     async def on_load(self) -> None:
         """Sent before going in to application mode."""
 
         # Bind our basic keys
         await self.bind("b", "view.toggle('sidebar')", "Toggle sidebar")
+        await self.bind("w", "view.toggle('watchlist')", "Toggle watchlist")
+        await self.bind("a", "watch", "Add to watchlist")
+        await self.bind("d", "unwatch", "Remove from watchlist")
+        await self.bind("m", "view.toggle('metrics')", "Toggle metrics")
+        await self.bind("f", "view.toggle('flow')", "Toggle trade flow")
+        await self.bind("h", "heatmap", "Toggle depth heatmap")
+        await self.bind("o", "option_chain", "Toggle option chain")
+        await self.bind("s", "spreads", "Toggle spreads")
+        await self.bind("t", "timeframe", "Chart timeframe")
+        await self.bind("l", "history", "Load a day of history")
+        await self.bind("pageup", "page(-1)", "Newer ticks")
+        await self.bind("pagedown", "page(1)", "Older ticks")
+        await self.bind("home", "follow", "Newest ticks")
+        await self.bind("end", "oldest", "Oldest ticks")
+        await self.bind("g", "goto", "Jump to time")
         await self.bind("q", "quit", "Quit")
 
     async def on_mount(self) -> None:
         """Call after terminal goes in to application mode"""
-        config_file = Path("sjtop.json")
+        self.timer = PhaseTimer()
+        self.config_file = config_file = Path("sjtop.json")
         if config_file.exists():
             self.config = json.loads(config_file.read_text())
-            assert isinstance(
-                self.config.get("simulation"), bool
-            ), "simulation require bool"
-            assert isinstance(
-                self.config.get("person_id"), str
-            ), "person_id require str"
-            assert isinstance(self.config.get("password"), str), "password require str"
+            self.config.update(self.config_overrides)
+            if not (self.config.get("replay") or self.config.get("server")):
+                assert isinstance(
+                    self.config.get("simulation"), bool
+                ), "simulation require bool"
+                assert isinstance(
+                    self.config.get("person_id"), str
+                ), "person_id require str"
+                assert isinstance(
+                    self.config.get("password"), str
+                ), "password require str"
         else:
-            self.config = dict(simulation=True, person_id="PAPIUSER01", password="2222")
-        self.api = sj.Shioaji(simulation=self.config["simulation"])
-        self.status_panel = StatusPanel("status_panel", "logining...")
+            self.config = dict(
+                simulation=True,
+                person_id="PAPIUSER01",
+                password="2222",
+                **self.config_overrides,
+            )
+        self.loop = asyncio.get_event_loop()
+        self.scheduler = RenderScheduler(
+            self.loop,
+            fps=self.config.get("fps", 30),
+            on_frame=self.on_render_frame,
+        )
+        self.ingest = QuoteIngest(self.loop)
+        self.metrics = Metrics(self.config.get("metrics", True))
+        self.metrics.interval = self.scheduler.interval
+        self.subscribed: Set[str] = set()
+        self.contract: Optional[sj.contracts.Contract] = None
+        self.tick_cache = TickCache(self.config.get("tick_cache", 8))
+        # quotes are converted to integer prices once, in `dispatch_*`
+        self.prices = QuotePrices()
+        self.flows = TradeFlows(prices=self.prices)
+        self.alerts: Optional["AlertEngine"] = None
+        if self.config.get("alerts"):
+            from sjtop.alerts import AlertEngine
+
+            self.alerts = AlertEngine(
+                self.loop,
+                self.config["alerts"],
+                window=self.config.get("alert_window", 20),
+                on_alert=self.on_alert,
+            )
+        self.alert_log: Optional["AlertLog"] = None
+        if self.config.get("alert_log"):
+            from sjtop.alerts import AlertLog
+
+            self.alert_log = AlertLog(self.config["alert_log"])
+        self.history: Optional["HistoryLoader"] = None
+        self.switching: Optional[asyncio.Future] = None
+        self.loading: Optional[asyncio.Future] = None
+        # the line typed at the status panel, None when no prompt is open
+        self.prompt: Optional[Prompt] = None
+        self.typed = ""
+        self.journal: Optional[JournalWriter] = None
+        if self.config.get("journal"):
+            self.journal = JournalWriter(self.config["journal"])
+            self.journal.start()
+        with self.timer.phase("ui"):
+            self.status_panel = StatusPanel("status_panel", "logining...")
+            await self.view.dock(self.status_panel, edge="bottom", size=3)
+            self.watchlist = Watchlist(
+                "watchlist",
+                self.config.get("watchlist", []),
+                self.scheduler,
+                self.prices,
+            )
+            await self.view.dock(self.watchlist, edge="bottom", size=12)
+            # hidden panels are built when first shown, configured spreads
+            # take their quotes from the start
+            self.spreads: Optional["SpreadPanel"] = None
+            if self.config.get("spreads"):
+                self.spreads = self.build_spreads()
+                await self.view.dock(self.spreads, edge="bottom", size=10)
+            self.metrics_panel = MetricsPanel("metrics", self.metrics)
+            self.metrics_panel.visible = False
+            await self.view.dock(self.metrics_panel, edge="right", size=44)
+            self.flow_panel = FlowPanel("flow", self.flows, self.scheduler)
+            self.flow_panel.visible = False
+            await self.view.dock(self.flow_panel, edge="right", size=44)
+            self.heatmap: Optional["DepthHeatmap"] = None
+            self.option_chain: Optional["OptionChainView"] = None
+            empty_contract = sj.contracts.Stock(
+                exchange=Exchange.TSE, code="2330", symbol="TSE2330"
+            )
+            self.tree = ContractsTree(None, "contracts")
+            self.side = ContractsScrollView(self.tree, name="sidebar")
+            await self.view.dock(self.side, edge="left", size=25)
+            self.dashbaord = ContractDashBoard(
+                "dashboard", empty_contract, self.scheduler, self.prices
+            )
+            await self.view.dock(self.dashbaord, edge="right", size=75)
+            self.tick_viewer = TickViewer(
+                "tickviewer", empty_contract, self.scheduler, self.prices
+            )
+            await self.view.dock(self.tick_viewer, edge="left", size=50)
+            self.chart = CandleChart(
+                "chart", empty_contract, self.scheduler, self.prices
+            )
+            await self.view.dock(self.chart, edge="left")
+            # self.tick_viewer_scrollview = ScrollView(self.tick_viewer, name="svtick")
+        self.metrics.watch_render(self.watchlist)
+        self.metrics.watch_render(self.dashbaord)
+        self.metrics.watch_render(self.tick_viewer, shows_ticks=True)
+        self.metrics.watch_render(self.chart)
+        self.metrics_ticks = 0
+        self.set_interval(1.0, self.report_metrics)
+        self.startup = asyncio.ensure_future(self.start_session())
+
+    async def start_session(self) -> None:
+        """Log in, load contracts and the first ticks off the event loop."""
+        try:
+            await self.login()
+            self.status_panel.fit("Loading contracts tree ...")
+            with self.timer.phase("tree"):
+                await self.tree.set_contracts(self.api.Contracts)
+            self.contract = self.default_contract()
+            sources = [("watchlist", self.watchlist.codes)]
+            if self.alerts is not None:
+                sources.append(("alerts", self.alerts.watched_codes))
+            if self.spreads is not None:
+                sources.append(("spreads", self.spreads.codes))
+            for source, codes in sources:
+                for code in codes:
+                    contract = self.find_contract(code)
+                    if contract:
+                        self.subscribe(contract)
+                    else:
+                        self.log(f"{source}: contract {code} not found")
+            self.status_panel.fit(f"Loading ticks of {self.contract.code} ...")
+            with self.timer.phase("ticks"):
+                records = await self.loop.run_in_executor(
+                    None, self.fetch_ticks, self.contract
+                )
+            self.tick_cache.put(self.contract.code, records)
+            self.flows.track(self.contract.code, records)
+            self.dashbaord.change_contract(self.contract)
+            self.tick_viewer.change_contract(self.contract, records)
+            self.chart.change_contract(self.contract, records)
+            self.flow_panel.change_contract(self.contract)
+            self.subscribe()
+        except Exception as e:
+            self.status_panel.fit(f"Startup failed: {e!r}")
+            raise
+        self.log(self.timer.summary())
+        self.status_panel.fit(f"Ready in {self.timer.total:.2f}s")
+        # only history loads need pandas, import it now the screen is up
+        self.loop.run_in_executor(None, import_module, "pandas")
+
+    async def login(self) -> None:
+        if self.config.get("replay"):
+            from sjtop.replay import ReplayShioaji
+
+            with self.timer.phase("replay"):
+                self.api = ReplayShioaji(**self.config["replay"])
+                self.metrics.clock = self.api.quote.now
+        elif self.config.get("server"):
+            from sjtop.remote import RemoteShioaji
+
+            with self.timer.phase("connect"):
+                self.api = await self.loop.run_in_executor(
+                    None, RemoteShioaji, self.config["server"]
+                )
+        else:
+            with self.timer.phase("connect"):
+                self.api = await self.loop.run_in_executor(
+                    None, partial(sj.Shioaji, simulation=self.config["simulation"])
+                )
         self.api.quote.set_event_callback(self.on_api_session_event)
         self.api.quote.set_on_tick_fop_v1_callback(self.on_fop_v1_tick)
         self.api.quote.set_on_bidask_fop_v1_callback(self.on_fop_v1_bidask)
         self.api.quote.set_on_tick_stk_v1_callback(self.on_stk_v1_tick)
         self.api.quote.set_on_bidask_stk_v1_callback(self.on_stk_v1_bidask)
-        await self.view.dock(self.status_panel, edge="bottom", size=3)
-        # self.loop = asyncio.get_event_loop()
-        self.api.login(self.config["person_id"], self.config["password"])
-        self.tree = ContractsTree(self.api.Contracts, "contracts")
-        self.side = ScrollView(self.tree, name="sidebar")
-        await self.view.dock(self.side, edge="left", size=25)
-        empty_contract = sj.contracts.Stock(
-            exchange=Exchange.TSE, code="2330", symbol="TSE2330"
-        )
-        self.dashbaord = ContractDashBoard("dashboard", empty_contract)
-        await self.view.dock(self.dashbaord, edge="right", size=75)
-        self.tick_viewer = TickViewer("tickviewer", empty_contract)
-        await self.view.dock(self.tick_viewer, edge="left", size=50)
-        # self.tick_viewer_scrollview = ScrollView(self.tick_viewer, name="svtick")
-        self.contract = min(
-            [c for c in self.api.Contracts.Futures.TXF], key=lambda c: c.symbol
+        local = self.config.get("replay") or self.config.get("server")
+        snapshots = None if local else self.snapshot_dir()
+        day = trading_day(exchange_now())
+        contracts = None
+        if snapshots:
+            with self.timer.phase("snapshot"):
+                contracts = await self.loop.run_in_executor(
+                    None, load_snapshot, snapshots, day
+                )
+        self.status_panel.fit(
+            "Logging in ..."
+            if contracts
+            else "Logging in and downloading contracts ..."
         )
-        query_date = self.get_current_date(self.contract)
-        df_tick = self.get_last_tick(self.contract, query_date, self.tick_viewer.n)
-        self.dashbaord.change_contract(self.contract)
-        self.tick_viewer.change_contract(self.contract, df_tick)
-        self.subscribe()
+        with self.timer.phase("login"):
+            await self.loop.run_in_executor(
+                None,
+                partial(
+                    self.api.login,
+                    self.config.get("person_id"),
+                    self.config.get("password"),
+                    fetch_contract=contracts is None,
+                    contracts_timeout=self.config.get("contracts_timeout", 30000),
+                ),
+            )
+        if contracts:
+            self.api.Contracts = contracts
+        elif snapshots:
+            try:
+                await self.loop.run_in_executor(
+                    None, save_snapshot, snapshots, day, self.api.Contracts
+                )
+            except (OSError, pickle.PicklingError, TypeError) as e:
+                self.log(f"contracts snapshot not saved: {e!r}")
+
+    def snapshot_dir(self) -> Optional[Path]:
+        """`contracts_cache` of the config, `false` disables the snapshot."""
+        cache = self.config.get("contracts_cache", "~/.cache/sjtop")
+        return Path(cache).expanduser() if cache else None
+
+    def history_store(self) -> Optional["HistoryStore"]:
+        """`history_cache` of the config, `false` or no Parquet engine disables it."""
+        from sjtop.history import HistoryStore, parquet_supported
+
+        cache = self.config.get("history_cache", "~/.cache/sjtop/ticks")
+        if not cache or not parquet_supported():
+            return None
+        return HistoryStore(Path(cache).expanduser())
+
+    def default_contract(self) -> sj.contracts.Contract:
+        txf = self.api.Contracts.Futures.get("TXF")
+        if txf:
+            return min([c for c in txf], key=lambda c: c.symbol)
+        for _, product_contracts in self.api.Contracts:
+            for contracts in product_contracts:
+                for contract in contracts:
+                    return contract
 
     def get_last_tick(self, contract: sj.contracts.Contract, date: date, n: int = 15):
-        df_tick = pd.DataFrame(
-            {
-                **self.api.ticks(
-                    contract,
-                    date.strftime("%Y-%m-%d"),
-                    query_type=TicksQueryType.LastCount,
-                    last_cnt=n,
-                )
-            }
+        return self.api.ticks(
+            contract,
+            date.strftime("%Y-%m-%d"),
+            query_type=TicksQueryType.LastCount,
+            last_cnt=n,
         )
-        df_tick["datetime"] = pd.to_datetime(df_tick["ts"])
-        return df_tick
 
-    def get_current_date(self, contract: sj.contracts.Contract):
-        now = datetime.utcnow()
-        if contract.security_type == SecurityType.Future and now > now.replace(
-            hour=6, minute=45, second=0, microsecond=0
-        ):
+    def get_current_date(self, contract: sj.contracts.Contract) -> date:
+        """Trading day of `contract` now, by the exchange clock."""
+        night = contract.security_type in (SecurityType.Future, SecurityType.Option)
+        return trading_day(exchange_now(), night)
 
-            query_date = (now + timedelta(days=1)).date()
-        else:
-            query_date = now.date()
-        return query_date
+    def find_contract(self, code: str) -> Optional[sj.contracts.Contract]:
+        return find_contract(self.api.Contracts, code)
+
+    def fetch_ticks(self, contract: sj.contracts.Contract) -> List[TickRecord]:
+        """Blocking `api.ticks` query, run it in an executor."""
+        query_date = self.get_current_date(contract)
+        ticks = self.get_last_tick(contract, query_date, self.tick_cache.depth)
+        return records_from_ticks(ticks)
 
     def change_contract(self, contract: sj.contracts.Contract):
-        self.unsubscribe()
+        """Switch in the background, a newer switch cancels a pending one."""
+        if self.switching and not self.switching.done():
+            self.switching.cancel()
+        if self.loading and not self.loading.done():
+            self.loading.cancel()
+        self.switching = asyncio.ensure_future(self.switch_contract(contract))
+
+    async def switch_contract(self, contract: sj.contracts.Contract):
+        evicted: List[str] = []
+        records = self.tick_cache.get(contract.code)
+        if records is None:
+            self.status_panel.fit(f"Loading ticks of {contract.code} ...")
+            try:
+                fetched = await self.loop.run_in_executor(
+                    None, self.fetch_ticks, contract
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.status_panel.fit(f"Loading ticks of {contract.code} failed: {e!r}")
+                return
+            evicted = self.tick_cache.put(contract.code, fetched)
+            records = self.tick_cache.get(contract.code)
+            self.status_panel.fit(f"{contract.code} loaded")
+        if self.contract:
+            self.flows.untrack(self.contract.code)
         self.contract = contract
-        query_date = self.get_current_date(self.contract)
-        df_tick = self.get_last_tick(self.contract, query_date, self.tick_viewer.n)
+        self.flows.track(contract.code, records)
         self.dashbaord.change_contract(self.contract)
-        self.tick_viewer.change_contract(self.contract, df_tick)
+        self.tick_viewer.change_contract(self.contract, records)
+        self.chart.change_contract(self.contract, records)
+        self.flow_panel.change_contract(self.contract)
+        if self.heatmap is not None:
+            self.heatmap.change_contract(self.contract)
         self.subscribe()
+        for code in evicted:
+            self.release(code)
 
-    def subscribe(self):
-        self.api.quote.subscribe(
-            self.contract, QuoteType.BidAsk, version=QuoteVersion.v1
-        )
-        self.api.quote.subscribe(self.contract, QuoteType.Tick, version=QuoteVersion.v1)
+    def pinned_codes(self) -> Set[str]:
+        """Contracts a feature needs the quotes of, whatever the tick cache."""
+        pinned = {self.contract.code, *self.watchlist.codes}
+        if self.alerts is not None:
+            pinned.update(self.alerts.watched_codes)
+        if self.spreads is not None:
+            pinned.update(self.spreads.codes)
+        if self.option_chain is not None and self.option_chain.visible:
+            pinned.update(self.option_chain.codes)
+        return pinned
+
+    def release(self, code: str):
+        """Unsubscribe a contract evicted from the tick cache if unused."""
+        if code in self.pinned_codes():
+            return
+        contract = self.find_contract(code)
+        if contract:
+            self.unsubscribe(contract)
+
+    def subscribe(self, contract: Optional[sj.contracts.Contract] = None):
+        contract = contract or self.contract
+        if contract.code in self.subscribed:
+            return
+        self.subscribed.add(contract.code)
+        if self.alerts is not None:
+            self.alerts.track(contract.code)
+        self.api.quote.subscribe(contract, QuoteType.BidAsk, version=QuoteVersion.v1)
+        self.api.quote.subscribe(contract, QuoteType.Tick, version=QuoteVersion.v1)
+
+    def unsubscribe(self, contract: Optional[sj.contracts.Contract] = None):
+        contract = contract or self.contract
+        if contract.code not in self.subscribed:
+            return
+        self.subscribed.discard(contract.code)
+        if self.alerts is not None:
+            self.alerts.untrack(contract.code)
+        self.api.quote.unsubscribe(contract, QuoteType.BidAsk, version=QuoteVersion.v1)
+        self.api.quote.unsubscribe(contract, QuoteType.Tick, version=QuoteVersion.v1)
+
+    def save_watchlist(self):
+        self.config["watchlist"] = list(self.watchlist.codes)
+        config = {
+            key: value
+            for key, value in self.config.items()
+            if key not in self.config_overrides
+        }
+        self.config_file.write_text(json.dumps(config, indent=4))
+
+    async def action_watch(self) -> None:
+        if self.contract and self.contract.code not in self.watchlist.store:
+            self.watchlist.add(self.contract.code)
+            self.save_watchlist()
 
-    def unsubscribe(self):
-        self.api.quote.unsubscribe(
-            self.contract, QuoteType.BidAsk, version=QuoteVersion.v1
+    def chain_contracts(self) -> List[sj.contracts.Option]:
+        """The expiry of the shown option, else the nearest of `option_chain`."""
+        contract, month = self.contract, None
+        if contract and contract.security_type == SecurityType.Option:
+            category, month = contract.category, contract.delivery_month
+        else:
+            category = self.config.get("option_chain", "TXO")
+        options = self.api.Contracts.Options.get(category)
+        if not options:
+            return []
+        from sjtop.options import chain_of
+
+        return chain_of(options, month)
+
+    async def dock_panel(self, panel: "Widget", edge: str, size: int, before: "Widget"):
+        """Dock a panel built on first use where `on_mount` would have, ahead
+        of the dock of `before`, so it takes its space from the same side."""
+        await self.view.dock(panel, edge=edge, size=size)
+        docks = self.view.layout.docks
+        dock = docks.pop()
+        docks.insert(next(i for i, d in enumerate(docks) if before in d.widgets), dock)
+        await self.view.refresh_layout()
+
+    def build_spreads(self) -> "SpreadPanel":
+        from sjtop.spreads import SpreadPanel, parse_spread
+
+        panel = SpreadPanel(
+            "spreads",
+            [parse_spread(spread) for spread in self.config.get("spreads", [])],
+            self.scheduler,
+            interval=self.config.get("spread_interval", 10),
+            prices=self.prices,
         )
-        self.api.quote.unsubscribe(
-            self.contract, QuoteType.Tick, version=QuoteVersion.v1
+        panel.visible = False
+        self.metrics.watch_render(panel)
+        return panel
+
+    async def action_spreads(self) -> None:
+        if self.spreads is None:
+            self.spreads = self.build_spreads()
+            await self.dock_panel(self.spreads, "bottom", 10, self.metrics_panel)
+        await self.view.action_toggle("spreads")
+
+    async def action_heatmap(self) -> None:
+        if self.heatmap is None:
+            if not self.contract:
+                return
+            from sjtop.heatmap import DepthHeatmap
+
+            self.heatmap = DepthHeatmap(
+                "heatmap", self.contract, self.scheduler, self.prices
+            )
+            self.heatmap.visible = False
+            self.metrics.watch_render(self.heatmap)
+            await self.dock_panel(self.heatmap, "right", 60, self.side)
+        await self.view.action_toggle("heatmap")
+
+    async def action_option_chain(self) -> None:
+        if self.option_chain is None:
+            from sjtop.options import OptionChainView
+
+            self.option_chain = OptionChainView(
+                "chain", self.scheduler, rate=self.config.get("option_rate", 0.0)
+            )
+            self.option_chain.visible = False
+            self.metrics.watch_render(self.option_chain)
+            await self.dock_panel(self.option_chain, "right", 100, self.side)
+        chain = self.option_chain
+        if chain.visible:
+            codes = chain.codes
+            # an emptied chain pins none of its codes
+            chain.change_chain([])
+            for code in codes:
+                if code not in self.tick_cache:
+                    self.release(code)
+        else:
+            contracts = self.chain_contracts()
+            if not contracts:
+                self.status_panel.fit("No option chain to show")
+                return
+            chain.change_chain(contracts)
+            for contract in contracts:
+                self.subscribe(contract)
+        await self.view.action_toggle("chain")
+
+    async def action_timeframe(self) -> None:
+        self.chart.next_timeframe()
+
+    async def action_history(self) -> None:
+        if self.contract and not (self.loading and not self.loading.done()):
+            self.open_prompt(
+                Prompt("History day (YYYY-MM-DD, empty for today)", "-", self.pick_day)
+            )
+
+    async def pick_day(self, typed: str) -> None:
+        from sjtop.history import parse_day
+
+        contract = self.contract
+        today = self.get_current_date(contract)
+        day = parse_day(typed, today)
+        if day is None:
+            self.status_panel.fit(f"Invalid day {typed!r}")
+        elif day > today:
+            self.status_panel.fit(f"No history after {today}")
+        elif not (self.loading and not self.loading.done()):
+            self.loading = asyncio.ensure_future(self.load_history(contract, day))
+
+    async def load_history(self, contract: sj.contracts.Contract, day: date):
+        """Stream the ticks of `contract` on `day` into the chart chunk by chunk."""
+        if self.history is None:
+            from sjtop.history import HistoryLoader
+
+            self.history = HistoryLoader(self.api, self.history_store())
+        chunks = self.history.chunks(contract, day, HISTORY_COLUMNS)
+        self.chart.begin_history()
+        self.tick_viewer.begin_history()
+        loaded = 0
+        try:
+            while True:
+                chunk = await self.loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                self.chart.add_history(chunk)
+                self.tick_viewer.add_history(chunk)
+                loaded += len(chunk)
+                self.status_panel.fit(
+                    f"History of {contract.code} on {day}: {loaded} ticks"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.status_panel.fit(f"Loading history of {contract.code} failed: {e!r}")
+            self.chart.history = None
+            self.tick_viewer.history = None
+            return
+        self.chart.end_history()
+        self.tick_viewer.end_history()
+        self.status_panel.fit(
+            f"History of {contract.code} on {day} loaded: {loaded} ticks"
         )
 
+    async def action_page(self, pages: int) -> None:
+        self.tick_viewer.page(pages)
+
+    async def action_follow(self) -> None:
+        self.tick_viewer.follow()
+
+    async def action_oldest(self) -> None:
+        self.tick_viewer.oldest()
+
+    async def action_goto(self) -> None:
+        self.open_prompt(Prompt("Jump to time (HH:MM[:SS])", ":", self.jump_to))
+
+    async def jump_to(self, typed: str) -> None:
+        at = parse_time(typed)
+        if at is None:
+            self.status_panel.fit(f"Invalid time {typed!r}")
+        else:
+            self.tick_viewer.jump(at)
+            self.status_panel.fit(f"Jumped to {at}")
+
+    def open_prompt(self, prompt: Prompt):
+        self.prompt, self.typed = prompt, ""
+        self.status_panel.fit(f"{prompt.label}: ")
+
+    async def on_key(self, event: events.Key) -> None:
+        """Keys type into the open prompt, else go to the bindings."""
+        prompt = self.prompt
+        if prompt is None:
+            await super().on_key(event)
+            return
+        key = event.key
+        if key == "enter":
+            self.prompt = None
+            await prompt.done(self.typed)
+            return
+        if key == "escape":
+            self.prompt = None
+            self.status_panel.fit("")
+            return
+        if key == "ctrl+h":
+            self.typed = self.typed[:-1]
+        elif len(key) == 1 and (key.isdigit() or key in prompt.separators):
+            self.typed += key
+        self.status_panel.fit(f"{prompt.label}: {self.typed}")
+
+    async def action_unwatch(self) -> None:
+        if self.contract and self.contract.code in self.watchlist.store:
+            self.watchlist.remove(self.contract.code)
+            self.save_watchlist()
+
     def on_api_session_event(self, resp_code, event_code, info, event):
-        self.status_panel.fit(
-            f"Response Code: {resp_code} | Event Code: {event_code} | Info: {info} | Event: {event}"
+        self.loop.call_soon_threadsafe(
+            self.status_panel.fit,
+            f"Response Code: {resp_code} | Event Code: {event_code} | Info: {info} | Event: {event}",
         )
 
+    def report_metrics(self):
+        """Every second: roll the rates, refresh the panel, log now and then."""
+        if not self.metrics.enabled:
+            return
+        self.metrics.roll()
+        if self.metrics_panel.visible:
+            self.metrics_panel.refresh()
+        self.metrics_ticks += 1
+        if self.metrics_ticks % self.config.get("metrics_log_interval", 10) == 0:
+            self.log(self.metrics.summary())
+
+    def on_render_frame(self, stats: FrameStats):
+        if self.metrics.enabled:
+            self.metrics.on_frame(stats)
+        self.log(
+            f"frame {stats.frame}: {stats.requests} requests -> "
+            f"{stats.widgets} widgets ({stats.collapsed} collapsed)",
+            verbosity=2,
+        )
+
+    def on_alert(self, alert: "Alert"):
+        self.status_panel.fit(f"Alert: {alert.text}")
+        if self.alert_log:
+            self.alert_log.write(alert)
+
     def on_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1):
-        self.dashbaord.on_stk_v1_tick(exchange, tick)
-        self.tick_viewer.on_stk_v1_tick(exchange, tick)
+        if self.journal:
+            self.journal.record_tick(tick)
+        self.ingest.push_tick(self.dispatch_stk_v1_tick, exchange, tick)
 
     def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1):
-        self.dashbaord.on_fop_v1_tick(exchange, tick)
-        self.tick_viewer.on_fop_v1_tick(exchange, tick)
+        if self.journal:
+            self.journal.record_tick(tick)
+        self.ingest.push_tick(self.dispatch_fop_v1_tick, exchange, tick)
 
     def on_stk_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskSTKv1):
-        self.dashbaord.on_stk_v1_bidask(exchange, quote)
-        self.tick_viewer.on_stk_v1_bidask(exchange, quote)
+        if self.journal:
+            self.journal.record_bidask(quote)
+        self.ingest.push_bidask(self.dispatch_stk_v1_bidask, exchange, quote)
 
     def on_fop_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskFOPv1):
-        self.dashbaord.on_fop_v1_bidask(exchange, quote)
-        self.tick_viewer.on_fop_v1_bidask(exchange, quote)
+        if self.journal:
+            self.journal.record_bidask(quote)
+        self.ingest.push_bidask(self.dispatch_fop_v1_bidask, exchange, quote)
+
+    @instrumented
+    def dispatch_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1):
+        close = self.prices.trade(tick)
+        self.tick_cache.on_tick(tick)
+        self.flows.on_tick(tick, close)
+        if self.alerts is not None:
+            self.alerts.on_tick(tick, close)
+        self.watchlist.on_tick(exchange, tick, close)
+        if self.spreads is not None:
+            self.spreads.on_tick(exchange, tick, close)
+        if tick.code != self.contract.code:
+            return
+        if self.metrics.enabled:
+            self.metrics.on_shown_tick(tick.datetime)
+        self.dashbaord.on_stk_v1_tick(exchange, tick, close)
+        self.tick_viewer.on_stk_v1_tick(exchange, tick, close)
+        self.chart.on_stk_v1_tick(exchange, tick, close)
+        self.flow_panel.on_tick(exchange, tick)
+        if self.heatmap is not None:
+            self.heatmap.on_stk_v1_tick(exchange, tick, close)
+
+    @instrumented
+    def dispatch_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1):
+        close = self.prices.trade(tick)
+        self.tick_cache.on_tick(tick)
+        self.flows.on_tick(tick, close)
+        if self.alerts is not None:
+            self.alerts.on_tick(tick, close)
+        self.watchlist.on_tick(exchange, tick, close)
+        if self.spreads is not None:
+            self.spreads.on_tick(exchange, tick, close)
+        if self.option_chain is not None:
+            self.option_chain.on_fop_v1_tick(exchange, tick)
+        if tick.code != self.contract.code:
+            return
+        if self.metrics.enabled:
+            self.metrics.on_shown_tick(tick.datetime)
+        self.dashbaord.on_fop_v1_tick(exchange, tick, close)
+        self.tick_viewer.on_fop_v1_tick(exchange, tick, close)
+        self.chart.on_fop_v1_tick(exchange, tick, close)
+        self.flow_panel.on_tick(exchange, tick)
+        if self.heatmap is not None:
+            self.heatmap.on_fop_v1_tick(exchange, tick, close)
+
+    @instrumented
+    def dispatch_stk_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskSTKv1):
+        bids, asks = self.prices.book(quote)
+        self.tick_cache.on_bidask(quote)
+        self.flows.on_bidask(quote)
+        if self.alerts is not None:
+            self.alerts.on_bidask(quote, bids, asks)
+        self.watchlist.on_bidask(exchange, quote, bids, asks)
+        if self.spreads is not None:
+            self.spreads.on_bidask(exchange, quote, bids, asks)
+        if quote.code != self.contract.code:
+            return
+        self.dashbaord.on_stk_v1_bidask(exchange, quote, bids, asks)
+        self.tick_viewer.on_stk_v1_bidask(exchange, quote, bids, asks)
+        self.flow_panel.on_bidask(exchange, quote)
+        if self.heatmap is not None:
+            self.heatmap.on_stk_v1_bidask(exchange, quote, bids, asks)
+
+    @instrumented
+    def dispatch_fop_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskFOPv1):
+        bids, asks = self.prices.book(quote)
+        self.tick_cache.on_bidask(quote)
+        self.flows.on_bidask(quote)
+        if self.alerts is not None:
+            self.alerts.on_bidask(quote, bids, asks)
+        self.watchlist.on_bidask(exchange, quote, bids, asks)
+        if self.spreads is not None:
+            self.spreads.on_bidask(exchange, quote, bids, asks)
+        if self.option_chain is not None:
+            self.option_chain.on_fop_v1_bidask(exchange, quote)
+        if quote.code != self.contract.code:
+            return
+        self.dashbaord.on_fop_v1_bidask(exchange, quote, bids, asks)
+        self.tick_viewer.on_fop_v1_bidask(exchange, quote, bids, asks)
+        self.flow_panel.on_bidask(exchange, quote)
+        if self.heatmap is not None:
+            self.heatmap.on_fop_v1_bidask(exchange, quote, bids, asks)
+
+    async def shutdown(self):
+        self.startup.cancel()
+        if self.switching:
+            self.switching.cancel()
+        if self.loading:
+            self.loading.cancel()
+        if self.journal:
+            self.journal.close()
+        if self.alert_log:
+            self.alert_log.close()
+        await super().shutdown()
 
     async def handle_contract_click(self, message: ContractClick) -> None:
         """A message sent by the contract tree when a contract is clicked."""
@@ -0,0 +1,131 @@
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+# chart timeframes in seconds
+TIMEFRAMES = (1, 5, 60, 300)
+
+BAR_DTYPE = np.dtype(
+    [
+        ("start", "i8"),
+        ("open", "i8"),
+        ("high", "i8"),
+        ("low", "i8"),
+        ("close", "i8"),
+        ("volume", "i8"),
+    ]
+)
+
+
+def seconds_of(dt: datetime) -> int:
+    """Seconds since 0001-01-01 of a naive exchange timestamp."""
+    return dt.toordinal() * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+EPOCH_SECONDS = seconds_of(datetime(1970, 1, 1))
+
+
+def timeframe_label(seconds: int) -> str:
+    return f"{seconds // 60}m" if seconds >= 60 else f"{seconds}s"
+
+
+class CandleBuffer:
+    """The last `size` OHLCV bars of `seconds` each.
+
+    Closed bars live in a preallocated numpy ring buffer. The forming bar is
+    a plain list `[start, open, high, low, close, volume]`: a trade updates
+    it in O(1) and it is written to the ring when the next bar opens.
+    """
+
+    def __init__(self, seconds: int, size: int = 512) -> None:
+        self.seconds = seconds
+        self.size = size
+        self.bars = np.zeros(size, dtype=BAR_DTYPE)
+        self.index = 0
+        # bars closed since the buffer was created
+        self.closed = 0
+        self.current: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return min(self.closed, self.size)
+
+    def on_trade(self, ts: int, price: int, volume: int) -> bool:
+        """Add a trade at `ts` (seconds), True when it opened a new bar."""
+        start = ts - ts % self.seconds
+        bar = self.current
+        # a late trade joins the forming bar
+        if bar is not None and start <= bar[0]:
+            if price > bar[2]:
+                bar[2] = price
+            elif price < bar[3]:
+                bar[3] = price
+            bar[4] = price
+            bar[5] += volume
+            return False
+        if bar is not None:
+            self.push(bar)
+        self.current = [start, price, price, price, price, volume]
+        return True
+
+    def push(self, bar) -> None:
+        self.bars[self.index] = tuple(bar)
+        self.index = self.index + 1 if self.index + 1 < self.size else 0
+        self.closed += 1
+
+    def window(self, n: int) -> np.ndarray:
+        """The last `n` closed bars, oldest first."""
+        n = min(n, len(self))
+        return self.bars[(np.arange(self.index - n, self.index)) % self.size]
+
+    @classmethod
+    def resample(cls, base: "CandleBuffer", seconds: int, size: int = 512):
+        """Bars of `seconds` aggregated from the bars of `base`."""
+        buffer = cls(seconds, size)
+        rows = base.window(base.size)
+        if base.current is not None:
+            current = np.array([tuple(base.current)], dtype=BAR_DTYPE)
+            rows = np.concatenate([rows, current])
+        if not len(rows):
+            return buffer
+        starts = rows["start"] - rows["start"] % seconds
+        edges = np.flatnonzero(np.diff(starts)) + 1
+        begin = np.concatenate([[0], edges])
+        end = np.concatenate([edges, [len(rows)]]) - 1
+        bars = np.zeros(len(begin), dtype=BAR_DTYPE)
+        bars["start"] = starts[begin]
+        bars["open"] = rows["open"][begin]
+        bars["high"] = np.maximum.reduceat(rows["high"], begin)
+        bars["low"] = np.minimum.reduceat(rows["low"], begin)
+        bars["close"] = rows["close"][end]
+        bars["volume"] = np.add.reduceat(rows["volume"], begin)
+        closed = bars[:-1][-size:]
+        buffer.bars[: len(closed)] = closed
+        buffer.index = len(closed) % size
+        buffer.closed = len(bars) - 1
+        buffer.current = [int(v) for v in bars[-1]]
+        return buffer
+
+
+class CandleSeries:
+    """1s base bars of a contract and the bars of the shown timeframe.
+
+    Trades update both in O(1); switching timeframe resamples the base bars
+    instead of scanning the ticks again.
+    """
+
+    def __init__(self, base_size: int = 16384, size: int = 512) -> None:
+        self.size = size
+        self.base = CandleBuffer(1, base_size)
+        self.view = self.base
+
+    def on_trade(self, ts: int, price: int, volume: int) -> None:
+        self.base.on_trade(ts, price, volume)
+        if self.view is not self.base:
+            self.view.on_trade(ts, price, volume)
+
+    def set_timeframe(self, seconds: int) -> None:
+        if seconds == self.base.seconds:
+            self.view = self.base
+        else:
+            self.view = CandleBuffer.resample(self.base, seconds, self.size)
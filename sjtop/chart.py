@@ -0,0 +1,236 @@
+from datetime import timedelta
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+import numpy as np
+import shioaji as sj
+from rich.console import Group
+from rich.text import Text
+from textual import events
+from textual.widget import Widget
+
+from sjtop.candles import (
+    EPOCH_SECONDS,
+    TIMEFRAMES,
+    CandleSeries,
+    seconds_of,
+    timeframe_label,
+)
+from sjtop.price import QuotePrices
+from sjtop.scheduler import RenderScheduler
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# blank, wick, body
+GLYPHS = np.array([" ", "│", "┃"])
+
+
+def bar_color(open_: int, close: int) -> str:
+    return "red" if close > open_ else "green" if close < open_ else ""
+
+
+def plot_rows(prices, lo: int, hi: int, rows: int):
+    """Row of `prices` on a plot of `rows` rows, 0 is the top row at `hi`."""
+    return (hi - prices) * (rows - 1) // max(hi - lo, 1)
+
+
+def column(bar: List[int], lo: int, hi: int, rows: int) -> List[str]:
+    """Glyphs of one bar from the top row down."""
+    _, open_, high, low, close, _ = bar
+    wick_top, wick_bottom = plot_rows(high, lo, hi, rows), plot_rows(low, lo, hi, rows)
+    body_top = plot_rows(max(open_, close), lo, hi, rows)
+    body_bottom = plot_rows(min(open_, close), lo, hi, rows)
+    glyphs = []
+    for row in range(rows):
+        if body_top <= row <= body_bottom:
+            glyphs.append("┃")
+        elif wick_top <= row <= wick_bottom:
+            glyphs.append("│")
+        else:
+            glyphs.append(" ")
+    return glyphs
+
+
+class CandleChart(Widget):
+    """OHLCV candles of the shown contract, one column per bar.
+
+    Closed bars are drawn once into `closed_rows`; while none closes and the
+    price range holds, a frame only redraws the forming bar's column.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        contract: sj.contracts.Contract,
+        scheduler: RenderScheduler,
+        prices: Optional[QuotePrices] = None,
+    ) -> None:
+        self.contract = contract
+        self.scheduler = scheduler
+        self.prices = prices or QuotePrices()
+        self.scale = self.prices.scale(contract.code)
+        self.series = CandleSeries()
+        self.timeframe = TIMEFRAMES[0]
+        self.modify = False
+        # what `closed_rows` was drawn for
+        self.drawn: Optional[Tuple] = None
+        self.closed_rows: List[Text] = []
+        self.chart = Group()
+        # bars built from a history download, shown once it completes
+        self.history: Optional[CandleSeries] = None
+        self.live: List[Tuple[int, int, int]] = []
+        super().__init__(name=name)
+
+    def change_contract(self, contract: sj.contracts.Contract, ticks: Iterable):
+        """Build the bars of `contract` from `ticks` (oldest first)."""
+        self.contract = contract
+        self.scale = self.prices.scale(contract.code)
+        self.series = CandleSeries()
+        self.history = None
+        for row in ticks:
+            self.series.on_trade(
+                seconds_of(row.datetime), self.scale.to_int(row.close), row.volume
+            )
+        self.series.set_timeframe(self.timeframe)
+        self.drawn = None
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def next_timeframe(self):
+        idx = TIMEFRAMES.index(self.timeframe)
+        self.timeframe = TIMEFRAMES[(idx + 1) % len(TIMEFRAMES)]
+        self.series.set_timeframe(self.timeframe)
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def begin_history(self):
+        self.history = CandleSeries()
+        self.live = []
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def add_history(self, ticks: "pd.DataFrame"):
+        """Add a chunk of `datetime` / `close` / `volume` history, oldest first."""
+        if self.history is None:
+            return
+        # datetime64 columns are not always in ns since pandas 2
+        seconds = (
+            ticks["datetime"].values.astype("datetime64[s]").view("i8") + EPOCH_SECONDS
+        )
+        prices = np.rint(ticks["close"].values * self.scale.factor).astype("i8")
+        on_trade = self.history.base.on_trade
+        for ts, price, volume in zip(
+            seconds.tolist(), prices.tolist(), ticks["volume"].tolist()
+        ):
+            on_trade(ts, price, volume)
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def end_history(self):
+        """Show the history bars, with the trades streamed since past them."""
+        history, self.history = self.history, None
+        if history is None:
+            return
+        current = history.base.current
+        last = current[0] if current else -1
+        for ts, price, volume in self.live:
+            if ts > last:
+                history.on_trade(ts, price, volume)
+        self.live = []
+        history.set_timeframe(self.timeframe)
+        self.series = history
+        self.drawn = None
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def on_trade(self, tick, price: int):
+        ts = seconds_of(tick.datetime)
+        self.series.on_trade(ts, price, tick.volume)
+        if self.history is not None:
+            self.live.append((ts, price, tick.volume))
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1, close: int):
+        self.on_trade(tick, close)
+
+    def on_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1, close: int):
+        self.on_trade(tick, close)
+
+    async def on_resize(self, event: events.Resize) -> None:
+        self.modify = True
+        await super().on_resize(event)
+
+    def header(self) -> Text:
+        label = f"{self.contract.code} {timeframe_label(self.timeframe)}"
+        if self.history is not None:
+            current = self.history.base.current
+            loaded = timedelta(seconds=current[0] % 86400) if current else timedelta(0)
+            label = f"{label} (loading history {loaded})"
+        bar = self.series.view.current
+        if bar is None:
+            return Text(label)
+        text = self.scale.text
+        return Text(
+            f"{label}  O {text(bar[1])} H {text(bar[2])} "
+            f"L {text(bar[3])} C {text(bar[4])} V {bar[5]}",
+            no_wrap=True,
+        )
+
+    def draw_closed(self, bars: np.ndarray, lo: int, hi: int, rows: int):
+        """Draw the closed bars, one `Text` per plot row."""
+        opens, closes = bars["open"], bars["close"]
+        wick_top = plot_rows(bars["high"], lo, hi, rows)
+        wick_bottom = plot_rows(bars["low"], lo, hi, rows)
+        body_top = plot_rows(np.maximum(opens, closes), lo, hi, rows)
+        body_bottom = plot_rows(np.minimum(opens, closes), lo, hi, rows)
+        row = np.arange(rows)[:, None]
+        glyphs = np.where(
+            (body_top <= row) & (row <= body_bottom),
+            2,
+            np.where((wick_top <= row) & (row <= wick_bottom), 1, 0),
+        )
+        # runs of bars with the same color, styled once per row
+        colors = [bar_color(o, c) for o, c in zip(opens.tolist(), closes.tolist())]
+        runs = []
+        for idx, color in enumerate(colors):
+            if runs and runs[-1][2] == color:
+                runs[-1][1] = idx + 1
+            else:
+                runs.append([idx, idx + 1, color])
+        self.closed_rows = []
+        for glyph_row in glyphs:
+            text = Text("".join(GLYPHS[glyph_row]), no_wrap=True, overflow="crop")
+            for start, end, color in runs:
+                if color:
+                    text.stylize(color, start, end)
+            self.closed_rows.append(text)
+
+    def draw(self, width: int, height: int) -> Group:
+        view = self.series.view
+        bar = view.current
+        rows = height - 1
+        if bar is None or rows <= 0 or width <= 0:
+            return Group(self.header())
+        closed = view.window(width - 1)
+        lo, hi = bar[3], bar[2]
+        if len(closed):
+            lo = min(lo, int(closed["low"].min()))
+            hi = max(hi, int(closed["high"].max()))
+        drawn = (view, view.closed, width, rows, lo, hi)
+        if drawn != self.drawn:
+            self.drawn = drawn
+            self.draw_closed(closed, lo, hi, rows)
+        color = bar_color(bar[1], bar[4])
+        lines = []
+        for closed_row, glyph in zip(self.closed_rows, column(bar, lo, hi, rows)):
+            line = closed_row.copy()
+            line.append(glyph, style=color or None)
+            lines.append(line)
+        return Group(self.header(), *lines)
+
+    def render(self):
+        if self.modify:
+            self.modify = False
+            self.chart = self.draw(self.size.width, self.size.height)
+        return self.chart
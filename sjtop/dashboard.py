@@ -1,9 +1,8 @@
-import asyncio
 import shioaji as sj
-import pandas as pd
-import numpy as np
 from datetime import datetime
 from decimal import Decimal
+from array import array
+from typing import List, Optional, Tuple
 
 from shioaji.constant import QuoteVersion, QuoteType
 from textual.widget import Widget
@@ -12,12 +11,22 @@ from rich.bar import Bar
 from rich.text import Text
 from rich.console import Group
 
+from sjtop.orderbook import OrderBook
+from sjtop.price import QuotePrices
+from sjtop.scheduler import RenderScheduler
+
 
 class ContractDashBoard(Widget):
     def __init__(
-        self, name: str, contract: sj.contracts.Contract
+        self,
+        name: str,
+        contract: sj.contracts.Contract,
+        scheduler: RenderScheduler,
+        prices: Optional[QuotePrices] = None,
     ) -> None:
         self.contract = contract
+        self.scheduler = scheduler
+        self.prices = prices or QuotePrices()
         self.modify: bool = False
         self.table = Table(
             title=self.contract.symbol,
@@ -25,23 +34,48 @@ class ContractDashBoard(Widget):
             show_edge=False,
             pad_edge=False,
         )
-        self.df = pd.DataFrame(
-            np.zeros((10, 2)),
-            columns=[
-                "BidAskVolume",
-                "BidAskPrice",
-                # "TickPrice",
-                # "TickVolume",
-            ],
-        )
+        self.book = OrderBook()
+        # scaled close of `cur_tick`
+        self.close = 0
+        self.set_scale()
         self.table.add_column("")
-        for col in self.df.columns:
+        for col in ["BidAskVolume", "BidAskPrice"]:
             self.table.add_column(col)
         self.bars = [
             Bar(100, 0, 0, color="green" if i < 5 else "red") for i in range(10)
         ]
         self.total_bar = Bar(100, 0, 50, color="red", bgcolor="green")
         self.deal_side_bar = Bar(1, 0.0, 0.5, color="red", bgcolor="green", width=20)
+        # rows and cells are built once, render only rewrites changed texts
+        self.shown: List[Tuple[int, int]] = [(0, 0)] * 10
+        self.volume_texts = [
+            Text("", justify="right" if i < 5 else "left") for i in range(10)
+        ]
+        self.price_texts = [
+            Text("", justify="right" if i < 5 else "left") for i in range(10)
+        ]
+        for idx in range(10):
+            self.table.add_row(
+                self.bars[idx],
+                self.volume_texts[idx],
+                self.price_texts[idx],
+                style="green" if idx < 5 else "red",
+            )
+        self.ask_sum_text = Text("0", style="green", justify="right")
+        self.bid_sum_text = Text("0", style="red", justify="left")
+        self.close_text = Text("")
+        self.deal_text = Text("")
+        self.deal_side_text = Text("", justify="center")
+        self.table.add_row(
+            self.total_bar,
+            Group(self.ask_sum_text, self.bid_sum_text),
+            Group(
+                self.close_text,
+                self.deal_text,
+                self.deal_side_bar,
+                self.deal_side_text,
+            ),
+        )
 
         self.cur_tick = sj.TickFOPv1(
             code=self.contract.code,
@@ -66,102 +100,89 @@ class ContractDashBoard(Widget):
         )
         super().__init__(name=name)
 
+    def set_scale(self):
+        self.scale = self.prices.scale(self.contract.code)
+
+    def update_book(self, quote, bids: array, asks: array):
+        self.book.update(bids, quote.bid_volume, asks, quote.ask_volume)
+
     def change_contract(self, contract: sj.contracts.Contract):
         self.contract = contract
+        self.set_scale()
         self.table.title = self.contract.symbol
         self.modify = True
+        self.scheduler.mark_dirty(self)
 
-    def on_mount(self):
-        self.loop = asyncio.get_event_loop()
-        # self.set_interval(0.0075, self.refresh)
-
-    def on_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1):
+    def on_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1, close: int):
         self.cur_tick = tick
+        self.close = close
         self.modify = True
-        self.loop.call_soon_threadsafe(self.refresh)
+        self.scheduler.mark_dirty(self)
 
-    def on_stk_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskSTKv1):
-        self.df.loc[0:4, "BidAskPrice"] = quote.ask_price[::-1]
-        self.df.loc[0:4, "BidAskVolume"] = quote.ask_volume[::-1]
-        self.df.loc[5:10, "BidAskPrice"] = quote.bid_price
-        self.df.loc[5:10, "BidAskVolume"] = quote.bid_volume
+    def on_stk_v1_bidask(
+        self, exchange: sj.Exchange, quote: sj.BidAskSTKv1, bids: array, asks: array
+    ):
+        self.update_book(quote, bids, asks)
         self.modify = True
-        self.loop.call_soon_threadsafe(self.refresh)
+        self.scheduler.mark_dirty(self)
 
-    def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1):
+    def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1, close: int):
         self.cur_tick = tick
+        self.close = close
         self.modify = True
-        self.loop.call_soon_threadsafe(self.refresh)
+        self.scheduler.mark_dirty(self)
 
-    def on_fop_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskFOPv1):
-        self.df.loc[0:4, "BidAskPrice"] = quote.ask_price[::-1]
-        self.df.loc[0:4, "BidAskVolume"] = quote.ask_volume[::-1]
-        self.df.loc[5:10, "BidAskPrice"] = quote.bid_price
-        self.df.loc[5:10, "BidAskVolume"] = quote.bid_volume
+    def on_fop_v1_bidask(
+        self, exchange: sj.Exchange, quote: sj.BidAskFOPv1, bids: array, asks: array
+    ):
+        self.update_book(quote, bids, asks)
         self.modify = True
-        self.loop.call_soon_threadsafe(self.refresh)
+        self.scheduler.mark_dirty(self)
 
     def render(self):
         if self.modify:
             self.modify = False
-            for col in self.table.columns:
-                col._cells = []
-            self.table.rows = []
-            askcumvol = self.df.loc[4::-1, "BidAskVolume"].cumsum().loc[::-1]
-            bidcumvol = self.df.loc[5:10, "BidAskVolume"].cumsum()
-            barsize = max(askcumvol.max(), bidcumvol.max())
-            bidsum = self.df.loc[5:10, "BidAskVolume"].sum()
-            asksum = self.df.loc[0:4, "BidAskVolume"].sum()
+            book = self.book
+            barsize = book.depth
+            bidsum = book.bid_total
+            asksum = book.ask_total
             self.total_bar.size = bidsum + asksum
             self.total_bar.end = bidsum
 
+            shown = self.shown
+            scale = self.scale
             for idx in range(10):
                 bar = self.bars[idx]
                 bar.size = barsize
-                bar.begin = barsize - askcumvol.loc[idx] if idx < 5 else 0
-                bar.end = barsize if idx < 5 else bidcumvol[idx]
-                row_color = "green" if idx < 5 else "red"
-                row_justify = "right" if idx < 5 else "left"
-                self.table.add_row(
-                    *[
-                        bar,
-                        *[
-                            Text(str(v if v else ""), justify=row_justify)
-                            for v in self.df.loc[idx]
-                        ],
-                    ],
-                    style=row_color,
-                )
-            row_color = "red" if self.cur_tick.tick_type == 1 else "green"
-            row_justify = "right" if self.cur_tick.tick_type == 1 else "left"
-            self.deal_side_bar.end = self.cur_tick.bid_side_total_vol / (
-                self.cur_tick.ask_side_total_vol + self.cur_tick.bid_side_total_vol
-            )
-            self.table.add_row(
-                *[
-                    self.total_bar,
-                    Group(
-                        Text(str(asksum), style="green", justify="right"),
-                        Text(str(bidsum), style="red", justify="left"),
-                    ),
-                    Group(
-                        Text(
-                            str(self.cur_tick.close),
-                            style=row_color,
-                            justify=row_justify,
-                        ),
-                        Text(
-                            str(self.cur_tick.volume),
-                            style=row_color,
-                            justify=row_justify,
-                        ),
-                        self.deal_side_bar,
-                        Text(
-                            f"{self.deal_side_bar.end * 100:.4f}%",
-                            style=row_color,
-                            justify="center",
-                        ),
-                    ),
-                ],
+                bar.begin = barsize - book.cumvol[idx] if idx < 5 else 0
+                bar.end = barsize if idx < 5 else book.cumvol[idx]
+                volume, price = book.volume[idx], book.price[idx]
+                if shown[idx] != (volume, price):
+                    shown[idx] = (volume, price)
+                    self.volume_texts[idx].plain = str(volume if volume else "")
+                    self.price_texts[idx].plain = scale.text(price) if price else ""
+
+            tick = self.cur_tick
+            set_text(self.ask_sum_text, str(asksum))
+            set_text(self.bid_sum_text, str(bidsum))
+            row_color = "red" if tick.tick_type == 1 else "green"
+            row_justify = "right" if tick.tick_type == 1 else "left"
+            for text, value in (
+                (self.close_text, scale.text(self.close)),
+                (self.deal_text, str(tick.volume)),
+            ):
+                set_text(text, value)
+                text.style = row_color
+                text.justify = row_justify
+            self.deal_side_bar.end = tick.bid_side_total_vol / (
+                tick.ask_side_total_vol + tick.bid_side_total_vol
             )
+            set_text(self.deal_side_text, f"{self.deal_side_bar.end * 100:.4f}%")
+            self.deal_side_text.style = row_color
         return self.table
+
+
+def set_text(text: Text, plain: str):
+    """Replace the content of a kept `Text`, skipped when it is unchanged."""
+    if text.plain != plain:
+        text.plain = plain
@@ -0,0 +1,230 @@
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterable, Optional, Sequence, Tuple
+
+import shioaji as sj
+from rich import box
+from rich.table import Table
+from rich.text import Text
+from textual.widget import Widget
+
+from sjtop.candles import seconds_of
+from sjtop.price import QuotePrices
+from sjtop.scheduler import RenderScheduler
+
+# shioaji tick_type of trades at the ask / at the bid
+BUY, SELL = 1, 2
+
+# (seconds, trades) of the default windows
+WINDOWS = ((10, None), (60, None), (None, 100))
+
+# time, price * volume, volume, buy volume, sell volume
+Trade = Tuple[float, int, int, int, int]
+
+
+def trade_time(dt: datetime) -> float:
+    return seconds_of(dt) + dt.microsecond * 1e-6
+
+
+class FlowWindow:
+    """Running sums over the trades of the last `seconds` or last `trades`.
+
+    Adding a trade and evicting expired ones only adjust the sums, so every
+    stat is O(1) whatever the window holds. Time windows advance with the
+    trade clock, `expire` catches them up with the feed between trades.
+    """
+
+    def __init__(
+        self, seconds: Optional[float] = None, trades: Optional[int] = None
+    ) -> None:
+        assert seconds or trades, "a window needs seconds or trades"
+        self.seconds = seconds
+        self.trades = trades
+        self.entries: Deque[Trade] = deque()
+        self.amount = 0
+        self.volume = 0
+        self.buy = 0
+        self.sell = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def label(self) -> str:
+        return f"{self.seconds}s" if self.seconds else f"{self.trades}t"
+
+    def add(self, ts: float, price: int, volume: int, side: int):
+        buy = volume if side == BUY else 0
+        sell = volume if side == SELL else 0
+        self.entries.append((ts, price * volume, volume, buy, sell))
+        self.amount += price * volume
+        self.volume += volume
+        self.buy += buy
+        self.sell += sell
+        if self.trades and len(self.entries) > self.trades:
+            self.pop()
+        if self.seconds:
+            self.expire(ts)
+
+    def expire(self, now: float):
+        if not self.seconds:
+            return
+        cutoff = now - self.seconds
+        entries = self.entries
+        while entries and entries[0][0] <= cutoff:
+            self.pop()
+
+    def pop(self):
+        _, amount, volume, buy, sell = self.entries.popleft()
+        self.amount -= amount
+        self.volume -= volume
+        self.buy -= buy
+        self.sell -= sell
+
+    @property
+    def vwap(self) -> Optional[float]:
+        """Volume weighted price, scaled like `sjtop.price.PriceScale`."""
+        return self.amount / self.volume if self.volume else None
+
+    @property
+    def imbalance(self) -> float:
+        """(buy - sell) / (buy + sell) aggressor volume, in [-1, 1]."""
+        total = self.buy + self.sell
+        return (self.buy - self.sell) / total if total else 0.0
+
+    @property
+    def rate(self) -> float:
+        """Volume per second."""
+        if self.seconds:
+            return self.volume / self.seconds
+        if len(self.entries) < 2:
+            return 0.0
+        span = self.entries[-1][0] - self.entries[0][0]
+        return self.volume / span if span else 0.0
+
+
+class TradeFlow:
+    """The flow windows of one contract."""
+
+    def __init__(self, windows: Sequence = WINDOWS) -> None:
+        self.windows = [FlowWindow(seconds, trades) for seconds, trades in windows]
+
+    def __getitem__(self, label: str) -> FlowWindow:
+        for window in self.windows:
+            if window.label == label:
+                return window
+        raise KeyError(label)
+
+    def on_trade(self, ts: float, price: int, volume: int, side: int):
+        for window in self.windows:
+            window.add(ts, price, volume, side)
+
+    def expire(self, now: float):
+        for window in self.windows:
+            window.expire(now)
+
+
+class TradeFlows:
+    """Flow stats of the tracked contracts, updated once per trade.
+
+    Widgets query the `TradeFlow` of a code instead of keeping their own.
+    `now` is the exchange time of the last quote of any contract, the clock
+    the time windows expire against when their contract stops trading.
+    """
+
+    def __init__(
+        self, windows: Sequence = WINDOWS, prices: Optional[QuotePrices] = None
+    ) -> None:
+        self.windows = windows
+        self.prices = prices or QuotePrices()
+        self.flows: Dict[str, TradeFlow] = {}
+        self.now: Optional[datetime] = None
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.flows
+
+    def get(self, code: str) -> Optional[TradeFlow]:
+        return self.flows.get(code)
+
+    def track(self, code: str, ticks: Iterable = ()) -> TradeFlow:
+        """Track `code`, seeded with `ticks` (oldest first, like `TickRecord`)."""
+        flow = self.flows.get(code)
+        if flow is None:
+            flow = self.flows[code] = TradeFlow(self.windows)
+            scale = self.prices.scale(code)
+            for row in ticks:
+                flow.on_trade(
+                    trade_time(row.datetime),
+                    scale.to_int(row.close),
+                    row.volume,
+                    row.tick_type,
+                )
+        return flow
+
+    def untrack(self, code: str):
+        self.flows.pop(code, None)
+
+    def on_tick(self, tick, close: int):
+        self.now = tick.datetime
+        flow = self.flows.get(tick.code)
+        if flow is not None:
+            flow.on_trade(
+                trade_time(tick.datetime),
+                close,
+                tick.volume,
+                tick.tick_type,
+            )
+
+    def on_bidask(self, quote):
+        self.now = quote.datetime
+
+
+class FlowPanel(Widget):
+    def __init__(
+        self, name: str, flows: TradeFlows, scheduler: RenderScheduler
+    ) -> None:
+        self.flows = flows
+        self.scheduler = scheduler
+        self.code: Optional[str] = None
+        super().__init__(name=name)
+
+    def change_contract(self, contract: sj.contracts.Contract):
+        self.code = contract.code
+        self.scheduler.mark_dirty(self)
+
+    def on_tick(self, exchange: sj.Exchange, tick):
+        if self.visible:
+            self.scheduler.mark_dirty(self)
+
+    def on_bidask(self, exchange: sj.Exchange, quote):
+        # quotes move the feed clock, the time windows shrink without trades
+        if self.visible:
+            self.scheduler.mark_dirty(self)
+
+    def render(self):
+        flow = self.flows.get(self.code) if self.code else None
+        if flow is None:
+            return Text("no trades")
+        if self.flows.now is not None:
+            flow.expire(trade_time(self.flows.now))
+        text = self.flows.prices.scale(self.code).text
+        table = Table(
+            title=f"{self.code} flow",
+            show_edge=False,
+            pad_edge=False,
+            box=box.MINIMAL,
+        )
+        for col in ("Window", "VWAP", "Imb", "Vol/s", "N"):
+            table.add_column(col, justify="left" if col == "Window" else "right")
+        for window in flow.windows:
+            vwap = window.vwap
+            imbalance = window.imbalance
+            color = "red" if imbalance > 0 else "green" if imbalance < 0 else ""
+            table.add_row(
+                window.label,
+                text(round(vwap)) if vwap is not None else "-",
+                Text(f"{imbalance:+.0%}", style=color),
+                f"{window.rate:.1f}",
+                str(len(window)),
+            )
+        return table
@@ -0,0 +1,324 @@
+from array import array
+from typing import List, Optional, Sequence
+
+import numpy as np
+import shioaji as sj
+from rich.console import Group
+from rich.text import Text
+from textual import events
+from textual.widget import Widget
+
+from sjtop.candles import seconds_of
+from sjtop.flow import BUY, SELL
+from sjtop.price import FACTOR, QuotePrices
+from sjtop.scheduler import RenderScheduler
+
+# background of a cell by resting volume, empty cells keep the terminal's
+SHADES = [
+    "",
+    "on #1b2a49",
+    "on #233d6b",
+    "on #2f5f8a",
+    "on #3a86a8",
+    "on #58b09c",
+    "on #a4c96a",
+    "on #f2d64b",
+]
+# trade marker of a cell: none, mostly bought, mostly sold
+TRADE_GLYPHS = (" ", "●", "●")
+TRADE_COLORS = ("", "red", "green")
+STYLES = [
+    f"{color} {shade}".strip() or None for shade in SHADES for color in TRADE_COLORS
+]
+
+
+def tick_of(prices: Sequence[int], default: int = FACTOR) -> int:
+    """Smallest gap between the quoted levels, the row height."""
+    levels = sorted({price for price in prices if price > 0})
+    gaps = [high - low for low, high in zip(levels, levels[1:])]
+    return min(gaps) if gaps else default
+
+
+class DepthBuffer:
+    """Resting volume by price row and time slot, in a fixed size ring.
+
+    Row `r` holds the price `base + r * tick`, the column of a time slot is
+    `slot % slots`; a new slot clears the column it reuses, nothing is ever
+    shifted. A cell keeps the largest volume that rested at its price during
+    the slot, so liquidity flashing between frames still shows. Prices out
+    of the rows recenter them on the book, the one case that moves data.
+    """
+
+    def __init__(self, rows: int = 256, slots: int = 600, seconds: int = 1) -> None:
+        self.rows = rows
+        self.slots = slots
+        self.seconds = seconds
+        self.resting = np.zeros((slots, rows), dtype=np.int32)
+        self.traded = np.zeros((slots, rows), dtype=np.int32)
+        self.bought = np.zeros((slots, rows), dtype=np.int32)
+        self.base: Optional[int] = None
+        self.tick = FACTOR
+        # absolute slot of the newest column, and of the oldest kept
+        self.slot = -1
+        self.first = -1
+        self.column = memoryview(self.resting[0])
+
+    @property
+    def nbytes(self) -> int:
+        return self.resting.nbytes + self.traded.nbytes + self.bought.nbytes
+
+    def advance(self, ts: int) -> int:
+        """Column of the slot of `ts` (seconds), late quotes join the newest."""
+        slot = ts // self.seconds
+        if slot > self.slot:
+            if self.slot < 0 or slot - self.slot >= self.slots:
+                self.clear()
+                self.first = slot
+            else:
+                cols = np.arange(self.slot + 1, slot + 1) % self.slots
+                self.resting[cols] = 0
+                self.traded[cols] = 0
+                self.bought[cols] = 0
+                self.first = max(self.first, slot - self.slots + 1)
+            self.slot = slot
+            self.column = memoryview(self.resting[slot % self.slots])
+        return self.slot % self.slots
+
+    def clear(self):
+        self.resting[:] = 0
+        self.traded[:] = 0
+        self.bought[:] = 0
+
+    def recenter(self, price: int):
+        """Put `price` on the middle row, keeping the rows still in range."""
+        base = price - self.rows // 2 * self.tick
+        if self.base is None:
+            self.base = base
+            return
+        shift = (base - self.base) // self.tick
+        self.base += shift * self.tick
+        for data in (self.resting, self.traded, self.bought):
+            if abs(shift) >= self.rows:
+                data[:] = 0
+            elif shift > 0:
+                data[:, :-shift] = data[:, shift:]
+                data[:, -shift:] = 0
+            elif shift < 0:
+                data[:, -shift:] = data[:, :shift]
+                data[:, :-shift] = 0
+
+    def row_of(self, price: int) -> int:
+        return (price - self.base) // self.tick
+
+    def on_book(
+        self,
+        ts: int,
+        bid_prices: Sequence[int],
+        bid_volumes: Sequence[int],
+        ask_prices: Sequence[int],
+        ask_volumes: Sequence[int],
+    ):
+        self.advance(ts)
+        if self.base is None:
+            self.tick = tick_of([*bid_prices, *ask_prices])
+        rows = self.rows
+        mid = bid_prices[0] or ask_prices[0]
+        if not mid:
+            return
+        if (
+            self.base is None
+            or not 0 <= self.row_of(bid_prices[0] or mid) < rows
+            or not 0 <= self.row_of(ask_prices[0] or mid) < rows
+        ):
+            self.recenter(mid)
+        column, base, tick = self.column, self.base, self.tick
+        for prices, volumes in ((bid_prices, bid_volumes), (ask_prices, ask_volumes)):
+            for price, volume in zip(prices, volumes):
+                if price:
+                    row = (price - base) // tick
+                    if 0 <= row < rows and column[row] < volume:
+                        column[row] = volume
+
+    def on_trade(self, ts: int, price: int, volume: int, side: int):
+        col = self.advance(ts)
+        if self.base is None:
+            self.recenter(price)
+        row = self.row_of(price)
+        if not 0 <= row < self.rows:
+            self.recenter(price)
+            row = self.row_of(price)
+        self.traded[col, row] += volume
+        if side == BUY:
+            self.bought[col, row] += volume
+        elif side != SELL:
+            # unknown side counts half each way
+            self.bought[col, row] += volume // 2
+
+    def window(self, first_row: int, rows: int, cols: int):
+        """(resting, traded, bought) by (slot, row), zero outside the data.
+
+        The last `cols` slots oldest first, `rows` rows from `first_row` up.
+        """
+        shape = (cols, rows)
+        out = [np.zeros(shape, np.int32) for _ in range(3)]
+        if self.slot < 0:
+            return out
+        start = max(self.slot - cols + 1, self.first)
+        slots = np.arange(start, self.slot + 1)
+        lo, hi = max(first_row, 0), min(first_row + rows, self.rows)
+        if hi <= lo:
+            return out
+        idx = slots % self.slots
+        dst_cols = slots - (self.slot - cols + 1)
+        for dst, src in zip(out, (self.resting, self.traded, self.bought)):
+            dst[dst_cols, lo - first_row : hi - first_row] = src[idx, lo:hi]
+        return out
+
+
+class DepthHeatmap(Widget):
+    """Resting volume of the shown contract by price (rows) and time (columns).
+
+    Quotes only update the `DepthBuffer`; the grid is drawn from it at most
+    once per frame while the widget is shown.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        contract: sj.contracts.Contract,
+        scheduler: RenderScheduler,
+        prices: Optional[QuotePrices] = None,
+        rows: int = 256,
+        slots: int = 600,
+        seconds: int = 1,
+    ) -> None:
+        self.contract = contract
+        self.scheduler = scheduler
+        self.prices = prices or QuotePrices()
+        self.shape = (rows, slots, seconds)
+        self.reset()
+        self.modify = False
+        self.heatmap = Group()
+        super().__init__(name=name)
+
+    def reset(self):
+        self.buffer = DepthBuffer(*self.shape)
+        self.scale = self.prices.scale(self.contract.code)
+        # best bid / ask of the last quote
+        self.touch = (0, 0)
+        # price on the middle row of the view, follows the book with slack
+        self.center: Optional[int] = None
+
+    def change_contract(self, contract: sj.contracts.Contract):
+        self.contract = contract
+        self.reset()
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def changed(self):
+        self.modify = True
+        if self.visible:
+            self.scheduler.mark_dirty(self)
+
+    def on_bidask(self, quote, bids: array, asks: array):
+        self.buffer.on_book(
+            seconds_of(quote.datetime), bids, quote.bid_volume, asks, quote.ask_volume
+        )
+        self.touch = (bids[0], asks[0])
+        self.changed()
+
+    def on_trade(self, tick, close: int):
+        self.buffer.on_trade(
+            seconds_of(tick.datetime),
+            close,
+            tick.volume,
+            tick.tick_type,
+        )
+        self.changed()
+
+    def on_fop_v1_bidask(
+        self, exchange: sj.Exchange, quote: sj.BidAskFOPv1, bids: array, asks: array
+    ):
+        self.on_bidask(quote, bids, asks)
+
+    def on_stk_v1_bidask(
+        self, exchange: sj.Exchange, quote: sj.BidAskSTKv1, bids: array, asks: array
+    ):
+        self.on_bidask(quote, bids, asks)
+
+    def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1, close: int):
+        self.on_trade(tick, close)
+
+    def on_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1, close: int):
+        self.on_trade(tick, close)
+
+    async def on_resize(self, event: events.Resize) -> None:
+        self.modify = True
+        await super().on_resize(event)
+
+    def follow(self, rows: int) -> int:
+        """Middle row of the view, moved once the book nears an edge."""
+        buffer = self.buffer
+        mid = self.touch[0] or self.touch[1]
+        if mid and (
+            self.center is None
+            or abs(buffer.row_of(mid) - buffer.row_of(self.center)) > rows // 4
+        ):
+            self.center = mid
+        if self.center is None:
+            return buffer.rows // 2
+        return buffer.row_of(self.center)
+
+    def draw(self, width: int, height: int) -> Group:
+        buffer = self.buffer
+        rows = height - 1
+        header = Text(
+            f"{self.contract.code} depth  {buffer.seconds}s/col", no_wrap=True
+        )
+        if buffer.base is None or rows <= 0:
+            return Group(header)
+        first_row = self.follow(rows) - rows // 2
+        prices = [
+            self.scale.text(buffer.base + (first_row + row) * buffer.tick)
+            for row in range(rows)
+        ]
+        label_width = max(map(len, prices)) + 1
+        cols = width - label_width
+        if cols <= 0:
+            return Group(header)
+        resting, traded, bought = buffer.window(first_row, rows, cols)
+        top = int(resting.max())
+        header.append(f"  max {top}", style="dim")
+        shades = len(SHADES) - 1
+        level = (resting.astype(np.int64) * shades + top - 1) // max(top, 1)
+        side = np.where(traded > 0, np.where(bought * 2 >= traded, 1, 2), 0)
+        # top row is the highest price
+        codes = (level * len(TRADE_COLORS) + side).T[::-1]
+        glyphs = np.array(TRADE_GLYPHS)[side.T[::-1]]
+        lines: List[Text] = []
+        bid, ask = self.touch
+        for row, (code_row, glyph_row) in enumerate(zip(codes, glyphs)):
+            price = buffer.base + (first_row + rows - 1 - row) * buffer.tick
+            label_style = "green" if price == ask else "red" if price == bid else "dim"
+            line = Text(
+                prices[rows - 1 - row].rjust(label_width - 1) + " ",
+                style=label_style,
+                no_wrap=True,
+                overflow="crop",
+            )
+            # runs of cells with the same look, styled once
+            ends = np.flatnonzero(np.diff(code_row)) + 1
+            starts = [0, *ends.tolist()]
+            stops = [*ends.tolist(), len(code_row)]
+            for start, stop in zip(starts, stops):
+                line.append(
+                    "".join(glyph_row[start:stop]), style=STYLES[code_row[start]]
+                )
+            lines.append(line)
+        return Group(header, *lines)
+
+    def render(self):
+        if self.modify:
+            self.modify = False
+            self.heatmap = self.draw(self.size.width, self.size.height)
+        return self.heatmap
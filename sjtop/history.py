@@ -0,0 +1,243 @@
+import importlib.util
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+import shioaji as sj
+from shioaji.constant import SecurityType, TicksQueryType
+
+from sjtop.metrics import exchange_now
+
+# pandas loads with the first history, not with the app
+if TYPE_CHECKING:
+    import pandas as pd
+
+COLUMN_DTYPES = {
+    "ts": "i8",
+    "close": "f8",
+    "volume": "i8",
+    "bid_price": "f8",
+    "bid_volume": "i8",
+    "ask_price": "f8",
+    "ask_volume": "i8",
+    "tick_type": "i1",
+}
+# derived from `ts`, not stored
+DATETIME = "datetime"
+
+
+def parquet_supported() -> bool:
+    return any(
+        importlib.util.find_spec(engine) for engine in ("pyarrow", "fastparquet")
+    )
+
+
+def with_datetime(
+    df: "pd.DataFrame", columns: Optional[Sequence[str]]
+) -> "pd.DataFrame":
+    """Add `datetime` from the ns `ts` at once and keep the asked columns."""
+    if columns is None or DATETIME in columns:
+        df[DATETIME] = df["ts"].values.view("M8[ns]")
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def ticks_frame(ticks, columns: Optional[Sequence[str]] = None) -> "pd.DataFrame":
+    """`api.ticks()` columns as typed arrays, the whole chunk converted at once."""
+    import pandas as pd
+
+    ticks = {**ticks}
+    size = len(ticks.get("ts", ()))
+    df = pd.DataFrame(
+        {
+            name: (
+                np.asarray(ticks[name], dtype=dtype)
+                if name in ticks
+                else np.zeros(size, dtype=dtype)
+            )
+            for name, dtype in COLUMN_DTYPES.items()
+        }
+    )
+    return with_datetime(df, columns)
+
+
+def stored_columns(columns: Optional[Sequence[str]]) -> Optional[List[str]]:
+    if columns is None:
+        return None
+    stored = [name for name in columns if name != DATETIME]
+    if DATETIME in columns and "ts" not in stored:
+        stored.append("ts")
+    return stored
+
+
+class HistoryStore:
+    """Ticks of finished days as `<root>/code=<code>/date=<day>/ticks.parquet`.
+
+    The layout is the Hive partitioning pyarrow datasets read; a file is
+    only written once its day is over and never changes afterwards.
+    """
+
+    def __init__(self, root: Union[str, Path]) -> None:
+        self.root = Path(root)
+
+    def path(self, code: str, day: date) -> Path:
+        return self.root / f"code={code}" / f"date={day.isoformat()}" / "ticks.parquet"
+
+    def __contains__(self, key: Tuple[str, date]) -> bool:
+        return self.path(*key).exists()
+
+    def read(
+        self, code: str, day: date, columns: Optional[Sequence[str]] = None
+    ) -> "pd.DataFrame":
+        """Load only the asked columns of the day."""
+        import pandas as pd
+
+        df = pd.read_parquet(self.path(code, day), columns=stored_columns(columns))
+        return with_datetime(df, columns)
+
+    def write(self, code: str, day: date, df: "pd.DataFrame") -> Path:
+        path = self.path(code, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        df[list(COLUMN_DTYPES)].to_parquet(tmp, index=False)
+        tmp.replace(path)
+        return path
+
+
+# minutes traded on a day, both ends included, in session order; futures
+# and options days open with the night session of the eve, split at
+# midnight as range queries never wrap
+NIGHT_SESSIONS = (
+    (time(15), time(23, 59)),
+    (time(0), time(5)),
+    (time(8, 45), time(13, 45)),
+)
+# the regular session and the after-hours fixed price trading
+STOCK_SESSIONS = ((time(9), time(14, 30)),)
+MINUTE = timedelta(minutes=1)
+
+
+def night_session(contract: sj.contracts.Contract) -> bool:
+    return contract.security_type in (SecurityType.Future, SecurityType.Option)
+
+
+def sessions(contract: sj.contracts.Contract) -> Sequence[Tuple[time, time]]:
+    return NIGHT_SESSIONS if night_session(contract) else STOCK_SESSIONS
+
+
+def session_close(contract: sj.contracts.Contract, day: date) -> datetime:
+    """Exchange time the last session of `day` is over."""
+    return datetime.combine(day, sessions(contract)[-1][1]) + MINUTE
+
+
+def time_ranges(
+    spans: Iterable[Tuple[time, time]], chunk: timedelta
+) -> Iterator[Tuple[time, time]]:
+    """Inclusive time ranges of at most `chunk` covering the minutes of `spans`."""
+    for first, last in spans:
+        lo = datetime.combine(date.min, first)
+        end = datetime.combine(date.min, last) + MINUTE
+        while lo < end:
+            hi = min(lo + chunk, end)
+            yield lo.time(), (hi - timedelta(microseconds=1)).time()
+            lo = hi
+
+
+def parse_day(text: str, today: date) -> Optional[date]:
+    """`YYYY-MM-DD` or the same digits without the dashes, `today` if empty."""
+    if not text:
+        return today
+    if "-" not in text and len(text) == 8:
+        text = f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+class HistoryLoader:
+    """Ticks of a contract and day, from the store or `api.ticks` chunks.
+
+    `chunks` yields the ticks as they come, oldest first, so a consumer
+    can use a day before it is downloaded; only the trading hours are
+    queried. Days whose sessions are over by the exchange `clock` are saved
+    to the store, later loads read only the asked columns from disk.
+    """
+
+    def __init__(
+        self,
+        api: sj.Shioaji,
+        store: Optional[HistoryStore] = None,
+        chunk: timedelta = timedelta(hours=1),
+        clock: Callable[[], datetime] = exchange_now,
+    ) -> None:
+        self.api = api
+        self.store = store
+        self.chunk = chunk
+        self.clock = clock
+
+    def finished(self, contract: sj.contracts.Contract, day: date) -> bool:
+        return self.clock() >= session_close(contract, day)
+
+    def fetch(self, contract: sj.contracts.Contract, day: date, lo: time, hi: time):
+        """One blocking `api.ticks` range query."""
+        return ticks_frame(
+            self.api.ticks(
+                contract,
+                day.strftime("%Y-%m-%d"),
+                query_type=TicksQueryType.RangeTime,
+                time_start=lo,
+                time_end=hi,
+            )
+        )
+
+    def chunks(
+        self,
+        contract: sj.contracts.Contract,
+        day: date,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Iterator["pd.DataFrame"]:
+        store = self.store
+        if store is not None and (contract.code, day) in store:
+            yield store.read(contract.code, day, columns)
+            return
+        frames = []
+        for lo, hi in time_ranges(sessions(contract), self.chunk):
+            df = self.fetch(contract, day, lo, hi)
+            if not len(df):
+                continue
+            df = df.sort_values("ts", kind="mergesort").reset_index(drop=True)
+            frames.append(df)
+            yield df if columns is None else df[list(columns)]
+        if store is not None and self.finished(contract, day):
+            import pandas as pd
+
+            day_ticks = (
+                pd.concat(frames, ignore_index=True) if frames else ticks_frame({})
+            )
+            store.write(contract.code, day, day_ticks)
+
+    def load(
+        self,
+        contract: sj.contracts.Contract,
+        day: date,
+        columns: Optional[Sequence[str]] = None,
+    ) -> "pd.DataFrame":
+        import pandas as pd
+
+        frames = list(self.chunks(contract, day, columns))
+        if not frames:
+            return ticks_frame({}, columns)
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+import shioaji as sj
+
+QuoteHandler = Callable[[sj.Exchange, Any], None]
+Entry = Tuple[QuoteHandler, sj.Exchange, Any]
+
+
+class QuoteIngest:
+    """Hand quotes from shioaji's network thread to the event loop in batches.
+
+    Callbacks push quotes with the handler that should process them, the
+    event loop is woken once per batch and runs the handlers in arrival
+    order. A bid/ask quote replaces the pending one of the same contract
+    (latest wins) until a trade of that contract is queued after it, so
+    conflation never reorders quotes against trades. Trade ticks are never
+    conflated nor dropped, the queue is unbounded: pending bid/asks are at
+    most one per contract plus one per queued trade.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.pending: List[Entry] = []
+        self.bidask_slot: Dict[str, int] = {}
+        self.scheduled = False
+        self.received = 0
+        self.conflated = 0
+        self.batches = 0
+        self.last_batch = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self.pending)
+
+    def push_tick(self, handler: QuoteHandler, exchange: sj.Exchange, tick) -> None:
+        with self.lock:
+            self.received += 1
+            self.bidask_slot.pop(tick.code, None)
+            if not self.append((handler, exchange, tick)):
+                return
+        self.loop.call_soon_threadsafe(self.drain)
+
+    def push_bidask(self, handler: QuoteHandler, exchange: sj.Exchange, quote) -> None:
+        with self.lock:
+            self.received += 1
+            slot = self.bidask_slot.get(quote.code)
+            if slot is not None:
+                self.pending[slot] = (handler, exchange, quote)
+                self.conflated += 1
+                return
+            self.bidask_slot[quote.code] = len(self.pending)
+            if not self.append((handler, exchange, quote)):
+                return
+        self.loop.call_soon_threadsafe(self.drain)
+
+    def append(self, entry: Entry) -> bool:
+        """Queue an entry, return True when the loop needs to be woken.
+
+        Must be called with the lock held.
+        """
+        depth = len(self.pending)
+        self.pending.append(entry)
+        if depth >= self.max_depth:
+            self.max_depth = depth + 1
+        if self.scheduled:
+            return False
+        self.scheduled = True
+        return True
+
+    def drain(self) -> None:
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.bidask_slot = {}
+            self.scheduled = False
+        self.batches += 1
+        self.last_batch = len(batch)
+        for handler, exchange, quote in batch:
+            handler(exchange, quote)
@@ -0,0 +1,328 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+TICK = "tick"
+BIDASK = "bidask"
+
+TICK_DTYPE = np.dtype(
+    [
+        ("ts", "M8[us]"),
+        ("open", "f8"),
+        ("high", "f8"),
+        ("low", "f8"),
+        ("close", "f8"),
+        ("avg_price", "f8"),
+        ("price_chg", "f8"),
+        ("underlying_price", "f8"),
+        ("volume", "i4"),
+        ("total_volume", "i4"),
+        ("bid_side_total_vol", "i4"),
+        ("ask_side_total_vol", "i4"),
+        ("tick_type", "i1"),
+        ("chg_type", "i1"),
+        ("simtrade", "i1"),
+    ]
+)
+
+BIDASK_DTYPE = np.dtype(
+    [
+        ("ts", "M8[us]"),
+        ("bid_price", "f8", (5,)),
+        ("bid_volume", "i4", (5,)),
+        ("ask_price", "f8", (5,)),
+        ("ask_volume", "i4", (5,)),
+        ("underlying_price", "f8"),
+        ("simtrade", "i1"),
+    ]
+)
+
+DTYPES = {TICK: TICK_DTYPE, BIDASK: BIDASK_DTYPE}
+INDEX_DTYPE = np.dtype([("ts", "M8[us]"), ("record", "i8")])
+# one sparse index entry every INDEX_STRIDE records
+INDEX_STRIDE = 1024
+
+logger = logging.getLogger(__name__)
+
+
+def trading_day(dt: datetime, night_session: bool = True) -> date:
+    """Trading day of an exchange time.
+
+    With `night_session` (futures and options) quotes from 15:00 belong to
+    the next trading day, and those of a weekend, the tail of Friday's
+    night session, to Monday. Exchange holidays are not known here.
+    """
+    day = dt.date()
+    if not night_session:
+        return day
+    if dt.hour >= 15:
+        day += timedelta(days=1)
+    if day.weekday() >= 5:
+        day += timedelta(days=7 - day.weekday())
+    return day
+
+
+def tick_record(tick) -> tuple:
+    return (
+        tick.datetime,
+        tick.open,
+        tick.high,
+        tick.low,
+        tick.close,
+        tick.avg_price,
+        tick.price_chg,
+        getattr(tick, "underlying_price", 0),
+        tick.volume,
+        tick.total_volume,
+        tick.bid_side_total_vol,
+        tick.ask_side_total_vol,
+        tick.tick_type,
+        tick.chg_type,
+        tick.simtrade,
+    )
+
+
+def bidask_record(quote) -> tuple:
+    return (
+        quote.datetime,
+        quote.bid_price,
+        quote.bid_volume,
+        quote.ask_price,
+        quote.ask_volume,
+        getattr(quote, "underlying_price", 0),
+        quote.simtrade,
+    )
+
+
+RECORDS = {TICK: tick_record, BIDASK: bidask_record}
+
+
+class JournalFile:
+    """Append-only fixed-width record file with its sparse time index.
+
+    Index entries are written once the records they point to are flushed,
+    so the index never runs ahead of the data. Reopening after a crash
+    drops a partly written last record and the index entries past the
+    records kept.
+    """
+
+    def __init__(self, path: Path, dtype: np.dtype) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.dtype = dtype
+        self.count = 0
+        if path.exists():
+            self.count = path.stat().st_size // dtype.itemsize
+            os.truncate(str(path), self.count * dtype.itemsize)
+            self.trim_index()
+        self.file: BinaryIO = open(path, "ab", buffering=1 << 20)
+        self.index: BinaryIO = open(index_path(path), "ab")
+        self.pending: List[bytes] = []
+
+    def trim_index(self):
+        path = index_path(self.path)
+        if not path.exists():
+            return
+        data = path.read_bytes()
+        whole = len(data) // INDEX_DTYPE.itemsize * INDEX_DTYPE.itemsize
+        entries = np.frombuffer(data[:whole], dtype=INDEX_DTYPE)
+        kept = entries[entries["record"] < self.count]
+        if len(kept) * INDEX_DTYPE.itemsize != len(data):
+            path.write_bytes(kept.tobytes())
+
+    def append(self, records: np.ndarray):
+        first = -self.count % INDEX_STRIDE
+        if first < len(records):
+            marks = np.arange(first, len(records), INDEX_STRIDE)
+            entries = np.empty(len(marks), dtype=INDEX_DTYPE)
+            entries["ts"] = records["ts"][marks]
+            entries["record"] = marks + self.count
+            self.pending.append(entries.tobytes())
+        self.file.write(records.tobytes())
+        self.count += len(records)
+
+    def flush(self):
+        self.file.flush()
+        if self.pending:
+            self.index.write(b"".join(self.pending))
+            self.pending = []
+        self.index.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".idx")
+
+
+class JournalWriter:
+    """Record every tick and bid/ask quote to `root/<trading day>/<code>.<kind>`.
+
+    `record_tick` and `record_bidask` only put the quote object on an
+    unbounded queue, so they never block shioaji's callback thread. A
+    background thread converts queued quotes in batches and appends them
+    to buffered files. Should it fail, the error is logged and kept in
+    `error`, and quotes are no longer queued.
+    """
+
+    def __init__(self, root: Union[str, Path], flush_interval: float = 1.0) -> None:
+        self.root = Path(root)
+        self.flush_interval = flush_interval
+        self.queue: "queue.SimpleQueue[Optional[Tuple[str, object]]]" = (
+            queue.SimpleQueue()
+        )
+        self.files: Dict[Tuple[date, str, str], JournalFile] = {}
+        self.thread = threading.Thread(
+            target=self.run, name="sjtop-journal", daemon=True
+        )
+        self.recorded = 0
+        self.running = True
+        self.error: Optional[BaseException] = None
+
+    def start(self):
+        self.thread.start()
+
+    def record_tick(self, tick):
+        if self.running:
+            self.queue.put((TICK, tick))
+
+    def record_bidask(self, quote):
+        if self.running:
+            self.queue.put((BIDASK, quote))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        try:
+            self.record()
+        except Exception as e:
+            logger.exception("journal writer stopped")
+            self.error = e
+        finally:
+            self.running = False
+            # what was queued meanwhile would never be written
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            for journal_file in self.files.values():
+                try:
+                    journal_file.close()
+                except OSError:
+                    pass
+            self.files = {}
+
+    def record(self):
+        running = True
+        last_flush = time.monotonic()
+        while running:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch and batch[-1] is None:
+                batch.pop()
+                running = False
+            if batch:
+                self.write(batch)
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = now
+
+    def write(self, batch: List[Tuple[str, object]]):
+        groups: Dict[Tuple[date, str, str], list] = {}
+        for kind, quote in batch:
+            # only futures and option quotes carry an underlying price
+            night = hasattr(quote, "underlying_price")
+            key = (trading_day(quote.datetime, night), quote.code, kind)
+            groups.setdefault(key, []).append(RECORDS[kind](quote))
+        for key, rows in groups.items():
+            journal_file = self.files.get(key)
+            if journal_file is None:
+                day, code, kind = key
+                journal_file = self.files[key] = JournalFile(
+                    journal_path(self.root, day, code, kind), DTYPES[kind]
+                )
+            journal_file.append(np.array(rows, dtype=journal_file.dtype))
+            self.recorded += len(rows)
+
+    def flush(self):
+        for journal_file in self.files.values():
+            journal_file.flush()
+
+
+def journal_path(root: Path, day: date, code: str, kind: str) -> Path:
+    return root / day.strftime("%Y%m%d") / f"{code}.{kind}"
+
+
+class JournalReader:
+    def __init__(self, root: Union[str, Path]) -> None:
+        self.root = Path(root)
+
+    def days(self) -> List[date]:
+        return sorted(
+            datetime.strptime(p.name, "%Y%m%d").date()
+            for p in self.root.iterdir()
+            if p.is_dir()
+        )
+
+    def codes(self, day: date) -> List[str]:
+        folder = self.root / day.strftime("%Y%m%d")
+        return sorted({p.stem for kind in DTYPES for p in folder.glob(f"*.{kind}")})
+
+    def read(
+        self,
+        code: str,
+        day: date,
+        kind: str = TICK,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> np.ndarray:
+        """Records with `start <= ts < end`, as a structured array."""
+        dtype = DTYPES[kind]
+        path = journal_path(self.root, day, code, kind)
+        if not path.exists():
+            return np.empty(0, dtype=dtype)
+        count = path.stat().st_size // dtype.itemsize
+        if not count:
+            return np.empty(0, dtype=dtype)
+        lo, hi = 0, count
+        index = np.fromfile(str(index_path(path)), dtype=INDEX_DTYPE)
+        if len(index):
+            if start is not None:
+                block = np.searchsorted(index["ts"], np.datetime64(start), "left")
+                lo = index["record"][max(block - 1, 0)]
+            if end is not None:
+                block = np.searchsorted(index["ts"], np.datetime64(end), "left")
+                if block < len(index):
+                    hi = index["record"][block]
+        records = np.memmap(str(path), dtype=dtype, mode="r", shape=(count,))[lo:hi]
+        ts = records["ts"]
+        first = np.searchsorted(ts, np.datetime64(start), "left") if start else 0
+        last = np.searchsorted(ts, np.datetime64(end), "left") if end else len(ts)
+        return np.array(records[first:last])
+
+    def read_ticks(self, code: str, day: date, start=None, end=None) -> np.ndarray:
+        return self.read(code, day, TICK, start, end)
+
+    def read_bidasks(self, code: str, day: date, start=None, end=None) -> np.ndarray:
+        return self.read(code, day, BIDASK, start, end)
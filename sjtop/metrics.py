@@ -0,0 +1,222 @@
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from rich import box
+from rich.console import Group
+from rich.table import Table
+from rich.text import Text
+from textual.widget import Widget
+
+from sjtop.scheduler import FrameStats
+
+# shioaji timestamps are naive exchange time, Taiwan keeps UTC+8 all year
+TAIPEI = timezone(timedelta(hours=8), "Asia/Taipei")
+
+
+def exchange_now() -> datetime:
+    """Now in the naive Taipei time of quote timestamps, whatever the host zone."""
+    return datetime.now(TAIPEI).replace(tzinfo=None)
+
+
+class LatencyStats:
+    """Latest `size` samples (seconds) in a ring buffer.
+
+    A list, storing a float in it is several times cheaper than in a numpy
+    array; percentiles convert the window when asked.
+    """
+
+    __slots__ = ("size", "samples", "index", "count")
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self.samples = [0.0] * size
+        self.index = 0
+        self.count = 0
+
+    def record(self, value: float):
+        self.samples[self.index] = value
+        self.index = self.index + 1 if self.index + 1 < self.size else 0
+        self.count += 1
+
+    def window(self) -> np.ndarray:
+        return np.array(self.samples[: min(self.count, self.size)])
+
+    def percentiles(self, *q: float) -> List[float]:
+        window = self.window()
+        if not len(window):
+            return [0.0] * len(q)
+        return list(np.percentile(window, q))
+
+
+class Metrics:
+    """Hot path measurements.
+
+    Handlers count every message but only one call in `sample_every` is
+    timed, which keeps the cost to a few percent of the handlers. All of it
+    is recorded and read on the event loop, shioaji's thread never touches
+    it. With
+    `enabled` False nothing is recorded and no widget is wrapped. `clock`
+    tells the exchange time of now, the lag of a trade is measured against
+    it; a replay passes its playback position.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        sample_every: int = 8,
+        clock: Callable[[], datetime] = exchange_now,
+    ) -> None:
+        self.enabled = enabled
+        self.sample_every = sample_every
+        self.clock = clock
+        self.calls = 0
+        self.callbacks: Dict[str, LatencyStats] = {}
+        self.renders: Dict[str, LatencyStats] = {}
+        # exchange timestamp of the trade to the end of its render
+        self.lag = LatencyStats()
+        self.pending_ts: Optional[datetime] = None
+        self.messages: Counter = Counter()
+        self.frames = 0
+        self.skipped = 0
+        self.interval = 0.0
+        self.since = time.monotonic()
+        self.window_frames = 0
+        self.window_messages: Counter = Counter()
+        self.fps = 0.0
+        self.rates: Dict[str, float] = {}
+
+    def on_callback(self, name: str, start: float):
+        elapsed = time.perf_counter() - start
+        stats = self.callbacks.get(name)
+        if stats is None:
+            stats = self.callbacks.setdefault(name, LatencyStats())
+        stats.record(elapsed)
+
+    def on_shown_tick(self, ts: datetime):
+        """A trade of the shown contract waits for the next render."""
+        if self.pending_ts is None:
+            self.pending_ts = ts
+
+    def on_frame(self, stats: FrameStats):
+        self.frames += 1
+        if self.interval and stats.late > self.interval:
+            self.skipped += int(stats.late // self.interval)
+
+    def watch_render(self, widget: Widget, shows_ticks: bool = False):
+        """Time `widget.render_lines`, where Textual lays out and renders it."""
+        if not self.enabled:
+            return
+        stats = self.renders.setdefault(widget.name, LatencyStats())
+        render_lines = widget.render_lines
+
+        def timed_render_lines() -> None:
+            start = time.perf_counter()
+            render_lines()
+            stats.record(time.perf_counter() - start)
+            if shows_ticks and self.pending_ts is not None:
+                self.lag.record((self.clock() - self.pending_ts).total_seconds())
+                self.pending_ts = None
+
+        widget.render_lines = timed_render_lines
+
+    def roll(self):
+        """Close the rate window, rates are per second since the last roll."""
+        now = time.monotonic()
+        elapsed = max(now - self.since, 1e-9)
+        self.fps = (self.frames - self.window_frames) / elapsed
+        self.rates = {
+            code: (count - self.window_messages[code]) / elapsed
+            for code, count in self.messages.items()
+        }
+        self.since = now
+        self.window_frames = self.frames
+        self.window_messages = self.messages.copy()
+
+    def top_rates(self, n: int = 5) -> List[Tuple[str, float]]:
+        return sorted(self.rates.items(), key=lambda item: -item[1])[:n]
+
+    def summary(self) -> str:
+        lag50, lag99 = self.lag.percentiles(50, 99)
+        parts = [
+            f"fps {self.fps:.1f} skipped {self.skipped}",
+            f"lag p50 {lag50 * 1e3:.1f}ms p99 {lag99 * 1e3:.1f}ms",
+        ]
+        for name, stats in sorted(self.callbacks.items()):
+            p50, p99 = stats.percentiles(50, 99)
+            parts.append(f"{name} p50 {p50 * 1e6:.1f}us p99 {p99 * 1e6:.1f}us")
+        for name, stats in sorted(self.renders.items()):
+            p50, p99 = stats.percentiles(50, 99)
+            parts.append(f"render {name} p50 {p50 * 1e3:.2f}ms p99 {p99 * 1e3:.2f}ms")
+        parts.extend(f"{code} {rate:.0f}/s" for code, rate in self.top_rates())
+        return " | ".join(parts)
+
+
+def instrumented(handler: Callable) -> Callable:
+    """Time a `(self, exchange, quote)` handler into `self.metrics`.
+
+    Quote dispatchers (`dispatch_*`) also count the messages of each
+    contract. Only wrap handlers that run on the event loop, `Metrics.roll`
+    reads the counts there.
+    """
+    name = handler.__name__
+    counts = name.startswith("dispatch_")
+
+    @wraps(handler)
+    def wrapper(self, exchange, quote):
+        metrics = self.metrics
+        if not metrics.enabled:
+            return handler(self, exchange, quote)
+        if counts:
+            metrics.messages[quote.code] += 1
+        metrics.calls += 1
+        if metrics.calls % metrics.sample_every:
+            return handler(self, exchange, quote)
+        start = time.perf_counter()
+        handler(self, exchange, quote)
+        metrics.on_callback(name, start)
+
+    return wrapper
+
+
+class MetricsPanel(Widget):
+    def __init__(self, name: str, metrics: Metrics) -> None:
+        self.metrics = metrics
+        super().__init__(name=name)
+
+    def render(self):
+        metrics = self.metrics
+        if not metrics.enabled:
+            return Text("metrics disabled")
+        lag50, lag99 = metrics.lag.percentiles(50, 99)
+        header = Text(
+            f"{metrics.fps:.1f} fps  {metrics.skipped} skipped  "
+            f"lag {lag50 * 1e3:.1f} / {lag99 * 1e3:.1f} ms"
+        )
+        timings = Table(box=box.MINIMAL, show_edge=False, pad_edge=False)
+        timings.add_column("Handler")
+        timings.add_column("n", justify="right")
+        timings.add_column("p50", justify="right")
+        timings.add_column("p99", justify="right")
+        for name, stats in sorted(metrics.callbacks.items()):
+            p50, p99 = stats.percentiles(50, 99)
+            timings.add_row(
+                name, str(stats.count), f"{p50 * 1e6:.1f}us", f"{p99 * 1e6:.1f}us"
+            )
+        for name, stats in sorted(metrics.renders.items()):
+            p50, p99 = stats.percentiles(50, 99)
+            timings.add_row(
+                f"render {name}",
+                str(stats.count),
+                f"{p50 * 1e3:.2f}ms",
+                f"{p99 * 1e3:.2f}ms",
+            )
+        rates = Table(box=box.MINIMAL, show_edge=False, pad_edge=False)
+        rates.add_column("Code")
+        rates.add_column("msg/s", justify="right")
+        for code, rate in metrics.top_rates():
+            rates.add_row(code, f"{rate:.0f}")
+        return Group(header, timings, rates)
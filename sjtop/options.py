@@ -0,0 +1,330 @@
+"""Option chain of one expiry with implied volatility and greeks.
+
+Prices and greeks are Black-Scholes on the `underlying_price` the TAIFEX
+option quotes carry, computed for the whole chain at once with numpy.
+"""
+
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shioaji as sj
+from rich import box
+from rich.table import Table
+from rich.text import Text
+from shioaji.constant import OptionRight
+from textual import events
+from textual.widget import Widget
+
+from sjtop.scheduler import RenderScheduler
+
+CALL, PUT = 0, 1
+YEAR_SECONDS = 365 * 86400
+# TXO settles on the opening of the delivery day, the chain ages until then
+SETTLEMENT = (8, 45)
+# numpy has no erfc, a ufunc of `math.erfc` beats a polynomial fit on the
+# few options a frame reprices
+ERFC = np.frompyfunc(math.erfc, 1, 1)
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    return 0.5 * np.asarray(ERFC(np.asarray(x) * -math.sqrt(0.5)), dtype=float)
+
+
+def d1_of(spot, strike, years, vol, rate) -> np.ndarray:
+    return (np.log(spot / strike) + (rate + 0.5 * vol * vol) * years) / (
+        vol * np.sqrt(years)
+    )
+
+
+def price_from_d1(d1, spot, strike, years, vol, rate, call) -> np.ndarray:
+    discounted = strike * np.exp(-rate * years)
+    price = spot * norm_cdf(d1) - discounted * norm_cdf(d1 - vol * np.sqrt(years))
+    # puts by the put-call parity
+    return np.where(call, price, price - spot + discounted)
+
+
+def black_scholes(spot, strike, years, vol, rate, call) -> np.ndarray:
+    """Option prices, `call` is a boolean array, the rest broadcast."""
+    d1 = d1_of(spot, strike, years, vol, rate)
+    return price_from_d1(d1, spot, strike, years, vol, rate, call)
+
+
+def greeks(spot, strike, years, vol, rate, call) -> Tuple[np.ndarray, ...]:
+    """Delta, gamma and vega, vega for one point of volatility."""
+    d1 = d1_of(spot, strike, years, vol, rate)
+    pdf = norm_pdf(d1)
+    delta = np.where(call, norm_cdf(d1), norm_cdf(d1) - 1)
+    gamma = pdf / (spot * vol * np.sqrt(years))
+    vega = spot * pdf * np.sqrt(years) / 100
+    return tuple(np.broadcast_arrays(delta, gamma, vega))
+
+
+def implied_vol(
+    price, spot, strike, years, rate, call, tol: float = 1e-6, iterations: int = 50
+) -> np.ndarray:
+    """Volatilities matching `price`, nan where no volatility does.
+
+    Newton steps from the Brenner-Subrahmanyam guess, kept inside a
+    bisection bracket so deep in or out of the money options converge too.
+    """
+    price, spot, strike, years, call = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (price, spot, strike, years, call))
+    )
+    call = call.astype(bool)
+    discounted = strike * np.exp(-rate * years)
+    intrinsic = np.where(
+        call, np.maximum(spot - discounted, 0), np.maximum(discounted - spot, 0)
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valid = (price > intrinsic) & (price < np.where(call, spot, discounted))
+        valid &= years > 0
+        vol = np.sqrt(2 * np.pi / years) * price / spot
+        vol = np.where(valid, np.clip(vol, 0.05, 2.0), np.nan)
+        lo, hi = np.full(vol.shape, 1e-4), np.full(vol.shape, 5.0)
+        for _ in range(iterations):
+            d1 = d1_of(spot, strike, years, vol, rate)
+            diff = price_from_d1(d1, spot, strike, years, vol, rate, call) - price
+            if not np.any(np.abs(diff[valid]) > tol):
+                break
+            hi = np.where(diff > 0, vol, hi)
+            lo = np.where(diff < 0, vol, lo)
+            vega = spot * norm_pdf(d1) * np.sqrt(years)
+            step = vol - diff / vega
+            inside = (step > lo) & (step < hi)
+            vol = np.where(inside, step, 0.5 * (lo + hi))
+    return np.where(valid, vol, np.nan)
+
+
+def chain_of(
+    options: Iterable[sj.contracts.Option], month: Optional[str] = None
+) -> List[sj.contracts.Option]:
+    """Contracts of the expiry `month`, the nearest one if None, by strike."""
+    options = list(options)
+    if month is None and options:
+        month = min(options, key=lambda c: c.delivery_date).delivery_month
+    chain = [c for c in options if c.delivery_month == month]
+    return sorted(
+        chain, key=lambda c: (c.strike_price, c.option_right != OptionRight.Call)
+    )
+
+
+def expiry_of(contract: sj.contracts.Option) -> datetime:
+    day = datetime.strptime(contract.delivery_date, "%Y/%m/%d")
+    return day.replace(hour=SETTLEMENT[0], minute=SETTLEMENT[1])
+
+
+class OptionChain:
+    """Quotes and greeks of one expiry, a (call/put, strike) cell each.
+
+    A quote writes its cell and marks it dirty, a new underlying price
+    marks every cell; `reprice` solves only the dirty cells, in one numpy
+    pass. The option price is the mid of the touch, or the last trade
+    while one side is missing.
+    """
+
+    def __init__(self, rate: float = 0.0) -> None:
+        self.rate = rate
+        self.reset([])
+
+    def __len__(self) -> int:
+        return len(self.strikes)
+
+    def reset(self, contracts: Sequence[sj.contracts.Option]):
+        self.contracts = list(contracts)
+        self.month = self.contracts[0].delivery_month if self.contracts else ""
+        self.expiry = expiry_of(self.contracts[0]) if self.contracts else None
+        strikes = sorted({float(c.strike_price) for c in self.contracts})
+        self.strikes = np.array(strikes)
+        rows = {strike: row for row, strike in enumerate(strikes)}
+        self.cells: Dict[str, Tuple[int, int]] = {
+            c.code: (
+                CALL if c.option_right == OptionRight.Call else PUT,
+                rows[float(c.strike_price)],
+            )
+            for c in self.contracts
+        }
+        shape = (2, len(strikes))
+        for name in ("bid", "ask", "last", "iv", "delta", "gamma", "vega"):
+            setattr(self, name, np.full(shape, np.nan))
+        self.texts = {
+            name: [["-"] * len(strikes) for _ in range(2)]
+            for name in ("bid", "ask", "last")
+        }
+        self.dirty = np.zeros(shape, dtype=bool)
+        self.spot = np.nan
+        self.now: Optional[datetime] = None
+        self.repriced = 0
+
+    @property
+    def years(self) -> float:
+        if self.expiry is None or self.now is None:
+            return np.nan
+        # a minute at least, the last minutes would blow up the greeks
+        return max((self.expiry - self.now).total_seconds(), 60) / YEAR_SECONDS
+
+    def set_price(self, name: str, cell: Tuple[int, int], price):
+        getattr(self, name)[cell] = float(price) if price else np.nan
+        self.texts[name][cell[0]][cell[1]] = str(price) if price else "-"
+
+    def set_spot(self, price, now: datetime):
+        if self.now is None or now > self.now:
+            self.now = now
+        spot = float(price) if price else np.nan
+        if spot == spot and spot != self.spot:
+            self.spot = spot
+            self.dirty[:] = True
+
+    def on_tick(self, tick) -> bool:
+        cell = self.cells.get(tick.code)
+        if cell is None:
+            return False
+        self.set_price("last", cell, tick.close)
+        self.dirty[cell] = True
+        self.set_spot(tick.underlying_price, tick.datetime)
+        return True
+
+    def on_bidask(self, quote) -> bool:
+        cell = self.cells.get(quote.code)
+        if cell is None:
+            return False
+        self.set_price("bid", cell, quote.bid_price[0])
+        self.set_price("ask", cell, quote.ask_price[0])
+        self.dirty[cell] = True
+        self.set_spot(quote.underlying_price, quote.datetime)
+        return True
+
+    def reprice(self) -> int:
+        """Solve the dirty cells, return how many."""
+        sides, rows = np.nonzero(self.dirty)
+        if not len(rows):
+            return 0
+        self.dirty[:] = False
+        bid, ask = self.bid[sides, rows], self.ask[sides, rows]
+        price = np.where(
+            np.isnan(bid) | np.isnan(ask), self.last[sides, rows], 0.5 * (bid + ask)
+        )
+        strike, call, years = self.strikes[rows], sides == CALL, self.years
+        vol = implied_vol(price, self.spot, strike, years, self.rate, call)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta, gamma, vega = greeks(self.spot, strike, years, vol, self.rate, call)
+        self.iv[sides, rows] = vol
+        self.delta[sides, rows] = delta
+        self.gamma[sides, rows] = gamma
+        self.vega[sides, rows] = vega
+        self.repriced += len(rows)
+        return len(rows)
+
+    def atm_row(self) -> int:
+        """Row of the strike nearest the underlying, the middle one without it."""
+        if not len(self.strikes):
+            return 0
+        if self.spot != self.spot:
+            return len(self.strikes) // 2
+        return int(np.argmin(np.abs(self.strikes - self.spot)))
+
+
+def greek_text(value: float, fmt: str) -> str:
+    return "-" if value != value else format(value, fmt)
+
+
+class OptionChainView(Widget):
+    """Calls on the left, puts on the right, the strikes around the money.
+
+    Quotes only update the chain; the greeks are solved when a frame
+    renders, so at most once per frame and only for the changed cells.
+    """
+
+    def __init__(
+        self, name: str, scheduler: RenderScheduler, rate: float = 0.0
+    ) -> None:
+        self.chain = OptionChain(rate)
+        self.scheduler = scheduler
+        self.n = 15
+        self.modify = False
+        self.table = self.build_table()
+        super().__init__(name=name)
+
+    @property
+    def codes(self) -> List[str]:
+        return list(self.chain.cells)
+
+    def changed(self):
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def change_chain(self, contracts: Sequence[sj.contracts.Option]):
+        self.chain.reset(contracts)
+        self.changed()
+
+    def set_depth(self, n: int):
+        n = max(n, 1)
+        if n != self.n:
+            self.n = n
+            self.changed()
+
+    async def on_resize(self, event: events.Resize) -> None:
+        # title, header line and the header separator of box.MINIMAL
+        self.set_depth(event.height - 3)
+        await super().on_resize(event)
+
+    def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1):
+        if self.chain.on_tick(tick):
+            self.changed()
+
+    def on_fop_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskFOPv1):
+        if self.chain.on_bidask(quote):
+            self.changed()
+
+    def build_table(self) -> Table:
+        chain = self.chain
+        title = f"{chain.month or 'No chain'}"
+        if chain.spot == chain.spot:
+            title += f"  underlying {chain.spot:,.2f}"
+        table = Table(
+            title=title,
+            show_header=True,
+            show_edge=False,
+            pad_edge=False,
+            box=box.MINIMAL,
+        )
+        for col in ("Vega", "Γ", "Δ", "IV", "Bid", "Ask", "Last"):
+            table.add_column(col, justify="right")
+        table.add_column("Strike", justify="center", style="bold")
+        for col in ("Bid", "Ask", "Last", "IV", "Δ", "Γ", "Vega"):
+            table.add_column(col, justify="right")
+        start = max(min(chain.atm_row() - self.n // 2, len(chain) - self.n), 0)
+        texts = chain.texts
+        for row in range(start, min(start + self.n, len(chain))):
+            call = [
+                greek_text(chain.vega[CALL, row], ".2f"),
+                greek_text(chain.gamma[CALL, row], ".4f"),
+                greek_text(chain.delta[CALL, row], ".2f"),
+                greek_text(chain.iv[CALL, row] * 100, ".1f"),
+                Text(texts["bid"][CALL][row], style="green"),
+                Text(texts["ask"][CALL][row], style="red"),
+                texts["last"][CALL][row],
+            ]
+            put = [
+                Text(texts["bid"][PUT][row], style="green"),
+                Text(texts["ask"][PUT][row], style="red"),
+                texts["last"][PUT][row],
+                greek_text(chain.iv[PUT, row] * 100, ".1f"),
+                greek_text(chain.delta[PUT, row], ".2f"),
+                greek_text(chain.gamma[PUT, row], ".4f"),
+                greek_text(chain.vega[PUT, row], ".2f"),
+            ]
+            table.add_row(*call, f"{chain.strikes[row]:g}", *put)
+        return table
+
+    def render(self):
+        if self.modify:
+            self.modify = False
+            self.chain.reprice()
+            self.table = self.build_table()
+        return self.table
@@ -0,0 +1,50 @@
+from array import array
+from itertools import accumulate
+from typing import Sequence
+
+
+class OrderBook:
+    """Fixed-size bid/ask ladder shared by the STK and FOP bid/ask paths.
+
+    Rows are laid out like the dashboard table: asks from the deepest level
+    down to the best ask, then bids from the best bid outward. `cumvol` keeps
+    the cumulative depth of every row counted from the touch. Prices are
+    integers, see `sjtop.price.PriceScale`.
+    """
+
+    def __init__(self, levels: int = 5) -> None:
+        self.levels = levels
+        self.price = array("q", [0] * (levels * 2))
+        self.volume = array("q", [0] * (levels * 2))
+        self.cumvol = array("q", [0] * (levels * 2))
+
+    def __len__(self) -> int:
+        return self.levels * 2
+
+    def update(
+        self,
+        bid_price: Sequence[int],
+        bid_volume: Sequence[int],
+        ask_price: Sequence[int],
+        ask_volume: Sequence[int],
+    ) -> None:
+        n = self.levels
+        self.price[n - 1 :: -1] = array("q", ask_price)
+        self.price[n:] = array("q", bid_price)
+        self.volume[n - 1 :: -1] = array("q", ask_volume)
+        self.volume[n:] = array("q", bid_volume)
+        self.cumvol[n - 1 :: -1] = array("q", accumulate(ask_volume))
+        self.cumvol[n:] = array("q", accumulate(bid_volume))
+
+    @property
+    def ask_total(self) -> int:
+        return self.cumvol[0]
+
+    @property
+    def bid_total(self) -> int:
+        return self.cumvol[-1]
+
+    @property
+    def depth(self) -> int:
+        """Largest cumulative volume on either side, used to scale the bars."""
+        return max(self.cumvol[0], self.cumvol[-1])
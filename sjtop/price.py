@@ -0,0 +1,114 @@
+from array import array
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# the finest tick on TWSE and TAIFEX is 0.01
+DECIMALS = 2
+FACTOR = 10**DECIMALS
+
+
+def to_int(price) -> int:
+    """`price` in units of the finest tick, floats of `api.ticks` rounded."""
+    return round(price * FACTOR)
+
+
+def decimals_of(price: Decimal) -> int:
+    return max(-price.as_tuple().exponent, 0) if isinstance(price, Decimal) else 0
+
+
+class PriceScale:
+    """Prices of one contract as integers in units of `10 ** -decimals`.
+
+    Quotes carry `Decimal` prices, widgets convert each one once and work on
+    the integers. `text` formats an integer back exactly as `str` showed the
+    first Decimal converted to it; values never seen in the feed, like
+    derived stats, use the decimal places of the feed.
+    """
+
+    def __init__(self, decimals: int = DECIMALS) -> None:
+        self.decimals = decimals
+        self.factor = 10**decimals
+        # display precision of the feed, -1 until the first price
+        self.shown_decimals = -1
+        self.texts: Dict[int, str] = {}
+
+    def to_int(self, price) -> int:
+        scaled = round(price * self.factor)
+        # floats of `api.ticks` tell nothing about the feed's text
+        if scaled not in self.texts and isinstance(price, Decimal):
+            if self.shown_decimals < 0 and price:
+                self.shown_decimals = decimals_of(price)
+            self.texts[scaled] = str(price)
+        return scaled
+
+    def text(self, scaled: int) -> str:
+        text = self.texts.get(scaled)
+        if text is None:
+            text = self.format(scaled)
+            if self.shown_decimals >= 0:
+                self.texts[scaled] = text
+        return text
+
+    def format(self, scaled: int) -> str:
+        if self.shown_decimals < 0:
+            # no Decimal seen yet, drop the zeros `str` would not show
+            text = f"{scaled / self.factor:.{self.decimals}f}"
+            return text.rstrip("0").rstrip(".") if "." in text else text
+        return f"{scaled / self.factor:.{self.shown_decimals}f}"
+
+
+class ScaledLevels:
+    """Converts the price levels of successive quotes of one contract.
+
+    Levels rarely all move between two quotes; comparing a Decimal with the
+    previous one of its level is several times cheaper than converting it.
+    `prices` are compared as a whole first, pass lists like shioaji does.
+    """
+
+    def __init__(self, scale: PriceScale, levels: int = 5) -> None:
+        self.scale = scale
+        self.prices: List[Optional[Decimal]] = [None] * levels
+        self.scaled = array("q", [0] * levels)
+
+    def __call__(self, prices: Sequence) -> array:
+        seen = self.prices
+        if prices == seen:
+            return self.scaled
+        for idx, price in enumerate(prices):
+            if price != seen[idx]:
+                seen[idx] = price
+                self.scaled[idx] = self.scale.to_int(price)
+        return self.scaled
+
+
+class QuotePrices:
+    """Prices of every contract's quotes, converted once when dispatched.
+
+    Each contract has one `PriceScale`, shared by the widgets that show it.
+    `book` returns the scaled bid and ask levels of a quote in arrays that
+    the next quote of the contract overwrites; copy what has to outlive it.
+    """
+
+    def __init__(self) -> None:
+        self.scales: Dict[str, PriceScale] = {}
+        self.levels: Dict[str, Tuple[ScaledLevels, ScaledLevels]] = {}
+
+    def scale(self, code: str) -> PriceScale:
+        scale = self.scales.get(code)
+        if scale is None:
+            scale = self.scales[code] = PriceScale()
+        return scale
+
+    def trade(self, tick) -> int:
+        return self.scale(tick.code).to_int(tick.close)
+
+    def book(self, quote) -> Tuple[array, array]:
+        levels = self.levels.get(quote.code)
+        if levels is None:
+            scale = self.scale(quote.code)
+            levels = self.levels[quote.code] = (
+                ScaledLevels(scale),
+                ScaledLevels(scale),
+            )
+        bids, asks = levels
+        return bids(quote.bid_price), asks(quote.ask_price)
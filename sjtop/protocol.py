@@ -0,0 +1,314 @@
+"""Wire format between `sjtop serve` and its viewers.
+
+A frame is a `HEADER` (payload length, message type) and its payload.
+Quotes travel as records of the journal dtypes, extended with what the
+viewers need to rebuild the exact Decimals: the decimal places of every
+price. A TICK / BIDASK payload holds the exchange, the security kind,
+the code and a delta: a bit mask of the record fields that changed since
+the previous record of that code and kind sent to the client, followed
+by the bytes of those fields. The first record after a subscription has
+every bit set, it is the snapshot. A history request carries an id its
+answer starts with, so a viewer can drop the late answer of a request
+it gave up on.
+"""
+
+import asyncio
+import struct
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import shioaji as sj
+from shioaji.constant import Exchange
+
+from sjtop.candles import EPOCH_SECONDS, seconds_of
+from sjtop.journal import BIDASK_DTYPE, TICK_DTYPE
+from sjtop.price import decimals_of
+
+HEADER = struct.Struct("<IB")
+
+# server -> viewer
+CONTRACTS = 1
+HISTORY = 2
+TICK = 3
+BIDASK = 4
+HISTORY_ERROR = 5
+# viewer -> server
+SUBSCRIBE = 10
+UNSUBSCRIBE = 11
+HISTORY_REQUEST = 12
+
+EXCHANGES = list(Exchange)
+# exchange, stock, code length
+QUOTE_HEADER = struct.Struct("<BBB")
+# request id, last count, query date, time range in microseconds of the day
+# (-1 for none)
+HISTORY_HEADER = struct.Struct("<II10sqq")
+# first in a HISTORY / HISTORY_ERROR payload, the id of the request answered
+REQUEST_ID = struct.Struct("<I")
+MASK = struct.Struct("<Q")
+
+# decimal places kept for a price, enough for every tick size
+MAX_PLACES = 6
+TICK_PRICES = (
+    "open",
+    "high",
+    "low",
+    "close",
+    "avg_price",
+    "price_chg",
+    "underlying_price",
+)
+TICK_WIRE_DTYPE = np.dtype(
+    TICK_DTYPE.descr + [("pct_chg", "f8"), ("places", "i1", (len(TICK_PRICES),))]
+)
+# bid prices, ask prices, underlying price
+BIDASK_WIRE_DTYPE = np.dtype(BIDASK_DTYPE.descr + [("places", "i1", (11,))])
+# same layouts, packing a record with struct is much cheaper than numpy
+TICK_STRUCT = struct.Struct("<q7d4i3bd7b")
+BIDASK_STRUCT = struct.Struct("<q5d5i5d5idb11b")
+
+# columns of `api.ticks()`, prices are floats there
+HISTORY_DTYPE = np.dtype(
+    [
+        ("ts", "i8"),
+        ("close", "f8"),
+        ("volume", "i8"),
+        ("bid_price", "f8"),
+        ("bid_volume", "i8"),
+        ("ask_price", "f8"),
+        ("ask_volume", "i8"),
+        ("tick_type", "i1"),
+    ]
+)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def frame(kind: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(len(payload), kind) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    size, kind = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(size)
+
+
+def to_us(dt: datetime) -> int:
+    return (seconds_of(dt) - EPOCH_SECONDS) * 1_000_000 + dt.microsecond
+
+
+def from_us(us: int) -> datetime:
+    return EPOCH + timedelta(microseconds=us)
+
+
+def time_to_us(value: Optional[Union[str, time]]) -> int:
+    if value is None:
+        return -1
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return (
+        value.hour * 3600 + value.minute * 60 + value.second
+    ) * 1_000_000 + value.microsecond
+
+
+def time_from_us(us: int) -> Optional[time]:
+    if us < 0:
+        return None
+    return (datetime.min + timedelta(microseconds=us)).time()
+
+
+def places(price) -> int:
+    return min(decimals_of(price), MAX_PLACES)
+
+
+def tick_wire(tick) -> bytes:
+    prices = [getattr(tick, name, 0) for name in TICK_PRICES]
+    return TICK_STRUCT.pack(
+        to_us(tick.datetime),
+        *map(float, prices),
+        tick.volume,
+        tick.total_volume,
+        tick.bid_side_total_vol,
+        tick.ask_side_total_vol,
+        tick.tick_type,
+        tick.chg_type,
+        tick.simtrade,
+        float(tick.pct_chg),
+        *map(places, prices),
+    )
+
+
+def bidask_wire(quote) -> bytes:
+    underlying_price = getattr(quote, "underlying_price", 0)
+    return BIDASK_STRUCT.pack(
+        to_us(quote.datetime),
+        *map(float, quote.bid_price),
+        *quote.bid_volume,
+        *map(float, quote.ask_price),
+        *quote.ask_volume,
+        float(underlying_price),
+        quote.simtrade,
+        *map(places, quote.bid_price),
+        *map(places, quote.ask_price),
+        places(underlying_price),
+    )
+
+
+class RecordDelta:
+    """Encode records of a structured dtype as changed fields only.
+
+    Every element of an array field is a field of its own, a new price on
+    one book level costs its 8 bytes.
+    """
+
+    def __init__(self, dtype: np.dtype) -> None:
+        self.dtype = dtype
+        self.spans = []
+        for name in dtype.names:
+            field, offset = dtype.fields[name][:2]
+            size = field.base.itemsize
+            for start in range(offset, offset + field.itemsize, size):
+                self.spans.append((start, start + size))
+        assert len(self.spans) <= MASK.size * 8
+        self.full = (1 << len(self.spans)) - 1
+
+    def encode(self, previous: Optional[bytes], record: bytes) -> bytes:
+        if previous is None:
+            return MASK.pack(self.full) + record
+        mask = 0
+        parts = []
+        for idx, (start, end) in enumerate(self.spans):
+            field = record[start:end]
+            if field != previous[start:end]:
+                mask |= 1 << idx
+                parts.append(field)
+        return MASK.pack(mask) + b"".join(parts)
+
+    def decode(self, previous: Optional[bytes], delta: bytes) -> bytes:
+        (mask,) = MASK.unpack_from(delta)
+        if mask == self.full:
+            return delta[MASK.size :]
+        assert previous is not None, "delta without a snapshot"
+        record = bytearray(previous)
+        pos = MASK.size
+        for idx, (start, end) in enumerate(self.spans):
+            if mask & (1 << idx):
+                record[start:end] = delta[pos : pos + end - start]
+                pos += end - start
+        return bytes(record)
+
+
+DELTAS = {TICK: RecordDelta(TICK_WIRE_DTYPE), BIDASK: RecordDelta(BIDASK_WIRE_DTYPE)}
+
+
+def quote_prefix(exchange: Exchange, stock: bool, code: str) -> bytes:
+    """Start of the TICK / BIDASK payloads of `code`, the delta follows."""
+    name = code.encode()
+    return QUOTE_HEADER.pack(EXCHANGES.index(exchange), stock, len(name)) + name
+
+
+def parse_quote(payload: bytes) -> Tuple[Exchange, bool, str, bytes]:
+    exchange, stock, size = QUOTE_HEADER.unpack_from(payload)
+    start = QUOTE_HEADER.size
+    code = payload[start : start + size].decode()
+    return EXCHANGES[exchange], bool(stock), code, payload[start + size :]
+
+
+class QuoteDecoder:
+    """Rebuild shioaji quotes from wire records, Decimals equal to the sent ones."""
+
+    def __init__(self) -> None:
+        self.decimals: Dict[Tuple[float, int], Decimal] = {}
+
+    def decimal(self, value: float, places: int) -> Decimal:
+        price = self.decimals.get((value, places))
+        if price is None:
+            price = self.decimals[(value, places)] = Decimal(f"{value:.{places}f}")
+        return price
+
+    def prices(self, values, places) -> List[Decimal]:
+        return [self.decimal(v, p) for v, p in zip(values, places)]
+
+    def tick(self, code: str, stock: bool, record: bytes):
+        values = TICK_STRUCT.unpack(record)
+        ts = values[0]
+        prices = self.prices(values[1:8], values[16:23])
+        open_, high, low, close, avg_price, price_chg, underlying_price = prices
+        volume, total_volume, bid_side_total_vol, ask_side_total_vol = values[8:12]
+        tick_type, chg_type, simtrade, pct_chg = values[12:16]
+        fields = dict(
+            code=code,
+            datetime=from_us(ts),
+            open=open_,
+            avg_price=avg_price,
+            close=close,
+            high=high,
+            low=low,
+            amount=close * volume if stock else close,
+            total_amount=Decimal("0"),
+            volume=volume,
+            total_volume=total_volume,
+            tick_type=tick_type,
+            chg_type=chg_type,
+            price_chg=price_chg,
+            pct_chg=Decimal(f"{pct_chg:.2f}"),
+            bid_side_total_vol=bid_side_total_vol,
+            ask_side_total_vol=ask_side_total_vol,
+            simtrade=simtrade,
+        )
+        if stock:
+            return sj.TickSTKv1(
+                **fields,
+                bid_side_total_cnt=0,
+                ask_side_total_cnt=0,
+                closing_oddlot_shares=0,
+                fixed_trade_vol=0,
+                suspend=False,
+                intraday_odd=False,
+            )
+        return sj.TickFOPv1(**fields, underlying_price=underlying_price)
+
+    def bidask(self, code: str, stock: bool, record: bytes):
+        values = BIDASK_STRUCT.unpack(record)
+        bid_volume, ask_volume = list(values[6:11]), list(values[16:21])
+        fields = dict(
+            code=code,
+            datetime=from_us(values[0]),
+            bid_price=self.prices(values[1:6], values[23:28]),
+            bid_volume=bid_volume,
+            diff_bid_vol=[0] * 5,
+            ask_price=self.prices(values[11:16], values[28:33]),
+            ask_volume=ask_volume,
+            diff_ask_vol=[0] * 5,
+            simtrade=values[22],
+        )
+        if stock:
+            return sj.BidAskSTKv1(**fields, suspend=False, intraday_odd=False)
+        return sj.BidAskFOPv1(
+            **fields,
+            bid_total_vol=sum(bid_volume),
+            ask_total_vol=sum(ask_volume),
+            first_derived_bid_price=Decimal("0"),
+            first_derived_ask_price=Decimal("0"),
+            first_derived_bid_vol=0,
+            first_derived_ask_vol=0,
+            underlying_price=self.decimal(values[21], values[33]),
+        )
+
+
+def history_payload(code: str, ticks) -> bytes:
+    """`api.ticks()` columns of `code` as HISTORY_DTYPE records."""
+    records = np.zeros(len(ticks["ts"]), dtype=HISTORY_DTYPE)
+    for name in HISTORY_DTYPE.names:
+        records[name] = ticks[name]
+    name = code.encode()
+    return bytes([len(name)]) + name + records.tobytes()
+
+
+def parse_history(payload: bytes) -> Tuple[str, Dict[str, list]]:
+    size = payload[0]
+    code = payload[1 : 1 + size].decode()
+    records = np.frombuffer(payload[1 + size :], dtype=HISTORY_DTYPE)
+    return code, {name: records[name].tolist() for name in HISTORY_DTYPE.names}
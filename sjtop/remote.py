@@ -0,0 +1,180 @@
+import pickle
+import queue
+import socket
+import threading
+import time
+from itertools import count
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import shioaji as sj
+from shioaji.constant import QuoteType, QuoteVersion
+from shioaji.contracts import Contracts
+
+from sjtop.protocol import (
+    BIDASK,
+    CONTRACTS,
+    DELTAS,
+    HEADER,
+    HISTORY,
+    HISTORY_ERROR,
+    HISTORY_HEADER,
+    HISTORY_REQUEST,
+    REQUEST_ID,
+    SUBSCRIBE,
+    TICK,
+    UNSUBSCRIBE,
+    QuoteDecoder,
+    frame,
+    parse_history,
+    parse_quote,
+    time_to_us,
+)
+
+
+class RemoteQuote:
+    """Stand-in for `api.quote` fed by a `sjtop serve` connection.
+
+    Quotes are decoded on the reader thread and handed to the v1 callbacks
+    from there, like shioaji's network thread does.
+    """
+
+    def __init__(self, api: "RemoteShioaji") -> None:
+        self.api = api
+        self.decoder = QuoteDecoder()
+        self.records: Dict[Tuple[int, str], bytes] = {}
+        self.on_event: Optional[Callable] = None
+        self.on_tick_stk_v1: Optional[Callable] = None
+        self.on_tick_fop_v1: Optional[Callable] = None
+        self.on_bidask_stk_v1: Optional[Callable] = None
+        self.on_bidask_fop_v1: Optional[Callable] = None
+
+    def set_event_callback(self, func: Callable):
+        self.on_event = func
+
+    def set_on_tick_stk_v1_callback(self, func: Callable):
+        self.on_tick_stk_v1 = func
+
+    def set_on_tick_fop_v1_callback(self, func: Callable):
+        self.on_tick_fop_v1 = func
+
+    def set_on_bidask_stk_v1_callback(self, func: Callable):
+        self.on_bidask_stk_v1 = func
+
+    def set_on_bidask_fop_v1_callback(self, func: Callable):
+        self.on_bidask_fop_v1 = func
+
+    def subscribe(
+        self,
+        contract: sj.contracts.Contract,
+        quote_type: QuoteType = QuoteType.Tick,
+        version: QuoteVersion = QuoteVersion.v1,
+    ):
+        kind = TICK if quote_type == QuoteType.Tick else BIDASK
+        self.api.send(SUBSCRIBE, bytes([kind]) + contract.code.encode())
+
+    def unsubscribe(
+        self,
+        contract: sj.contracts.Contract,
+        quote_type: QuoteType = QuoteType.Tick,
+        version: QuoteVersion = QuoteVersion.v1,
+    ):
+        kind = TICK if quote_type == QuoteType.Tick else BIDASK
+        self.api.send(UNSUBSCRIBE, bytes([kind]) + contract.code.encode())
+
+    def event(self, info: str, event: str):
+        if self.on_event:
+            self.on_event(0, 0, info, event)
+
+    def dispatch(self, kind: int, payload: bytes):
+        exchange, stock, code, delta = parse_quote(payload)
+        key = (kind, code)
+        record = self.records[key] = DELTAS[kind].decode(self.records.get(key), delta)
+        if kind == TICK:
+            callback = self.on_tick_stk_v1 if stock else self.on_tick_fop_v1
+            if callback:
+                callback(exchange, self.decoder.tick(code, stock, record))
+        else:
+            callback = self.on_bidask_stk_v1 if stock else self.on_bidask_fop_v1
+            if callback:
+                callback(exchange, self.decoder.bidask(code, stock, record))
+
+
+class RemoteShioaji:
+    """`sj.Shioaji` replacement sharing the session of a `sjtop serve`."""
+
+    def __init__(self, path: Union[str, Path], timeout: float = 30.0) -> None:
+        self.path = Path(path).expanduser()
+        self.timeout = timeout
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(self.path))
+        self.rfile = self.sock.makefile("rb")
+        self.send_lock = threading.Lock()
+        self.history_lock = threading.Lock()
+        self.history: "queue.Queue[Tuple[int, bytes]]" = queue.Queue()
+        self.request_ids = count(1)
+        self.quote = RemoteQuote(self)
+        kind, payload = self.recv()
+        assert kind == CONTRACTS, f"unexpected first frame {kind}"
+        self.Contracts: Contracts = pickle.loads(payload)
+        for _, product_contracts in self.Contracts:
+            product_contracts.set_status_fetched()
+        self.thread = threading.Thread(
+            target=self.run, name="sjtop-remote", daemon=True
+        )
+        self.thread.start()
+
+    def login(self, *args, **kwargs):
+        return []
+
+    def send(self, kind: int, payload: bytes):
+        with self.send_lock:
+            self.sock.sendall(frame(kind, payload))
+
+    def recv(self) -> Tuple[int, bytes]:
+        header = self.rfile.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise EOFError("server closed the connection")
+        size, kind = HEADER.unpack(header)
+        return kind, self.rfile.read(size)
+
+    def run(self):
+        try:
+            while True:
+                kind, payload = self.recv()
+                if kind == TICK or kind == BIDASK:
+                    self.quote.dispatch(kind, payload)
+                elif kind == HISTORY or kind == HISTORY_ERROR:
+                    self.history.put((kind, payload))
+        except (EOFError, OSError):
+            self.quote.event(str(self.path), "Server disconnected")
+
+    def close(self):
+        self.sock.close()
+
+    def ticks(self, contract: sj.contracts.Contract, date=None, *args, **kwargs):
+        """`api.ticks` answered by the server, one query at a time.
+
+        Answers of earlier requests that timed out are dropped.
+        """
+        with self.history_lock:
+            request_id = next(self.request_ids) % 2**32
+            request = HISTORY_HEADER.pack(
+                request_id,
+                kwargs.get("last_cnt", 0),
+                (date or "").encode(),
+                time_to_us(kwargs.get("time_start")),
+                time_to_us(kwargs.get("time_end")),
+            )
+            self.send(HISTORY_REQUEST, request + contract.code.encode())
+            deadline = time.monotonic() + self.timeout
+            while True:
+                timeout = max(deadline - time.monotonic(), 0)
+                kind, payload = self.history.get(timeout=timeout)
+                if REQUEST_ID.unpack_from(payload)[0] == request_id:
+                    break
+        payload = payload[REQUEST_ID.size :]
+        if kind == HISTORY_ERROR:
+            raise RuntimeError(payload.decode())
+        _, ticks = parse_history(payload)
+        return ticks
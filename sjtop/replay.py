@@ -0,0 +1,401 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from datetime import time as dtime
+from decimal import Decimal
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import shioaji as sj
+from shioaji.constant import (
+    Exchange,
+    QuoteType,
+    QuoteVersion,
+    SecurityType,
+    TicksQueryType,
+)
+from shioaji.contracts import Contracts
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# columns of `api.ticks()`
+TICK_COLUMNS = [
+    "ts",
+    "close",
+    "volume",
+    "bid_price",
+    "bid_volume",
+    "ask_price",
+    "ask_volume",
+    "tick_type",
+]
+
+
+def load_ticks(path: Union[str, Path]) -> Dict[str, "pd.DataFrame"]:
+    """Load `<code>.csv` / `<code>.parquet` files shaped like `api.ticks()`.
+
+    Several files of one contract (`<code>_<date>.csv`) are concatenated.
+    """
+    import pandas as pd
+
+    frames: Dict[str, List[pd.DataFrame]] = {}
+    for file in sorted(Path(path).iterdir()):
+        if file.suffix == ".csv":
+            df = pd.read_csv(file)
+        elif file.suffix == ".parquet":
+            df = pd.read_parquet(file)
+        else:
+            continue
+        frames.setdefault(file.stem.split("_")[0], []).append(df)
+    feeds = {}
+    for code, dfs in frames.items():
+        df = pd.concat(dfs, ignore_index=True)
+        df["datetime"] = pd.to_datetime(df["ts"])
+        feeds[code] = df.sort_values("datetime", kind="mergesort").reset_index(
+            drop=True
+        )
+    return feeds
+
+
+def security_type_of(code: str) -> SecurityType:
+    """Stocks start with a digit, futures are `TXFJ1`-like, the rest options."""
+    if code[0].isdigit():
+        return SecurityType.Stock
+    if len(code) == 5:
+        return SecurityType.Future
+    return SecurityType.Option
+
+
+def build_contracts(codes: List[str]) -> Contracts:
+    products: Dict[str, list] = {"Stocks": [], "Futures": [], "Options": []}
+    for code in sorted(codes):
+        security_type = security_type_of(code)
+        if security_type == SecurityType.Stock:
+            exchange, symbol, category = Exchange.TSE, f"TSE{code}", ""
+        else:
+            exchange, symbol, category = Exchange.TAIFEX, code, code[:3]
+        products[f"{security_type.name}s"].append(
+            dict(
+                security_type=security_type,
+                exchange=exchange,
+                code=code,
+                symbol=symbol,
+                name=code,
+                category=category,
+            )
+        )
+    contracts = Contracts(**products)
+    for _, product_contracts in contracts:
+        product_contracts.set_status_fetched()
+    return contracts
+
+
+@dataclass
+class SessionState:
+    """Running session figures a tick carries besides the trade itself."""
+
+    reference: Decimal = Decimal("0")
+    open: Decimal = Decimal("0")
+    high: Decimal = Decimal("0")
+    low: Decimal = Decimal("0")
+    total_volume: int = 0
+    total_amount: Decimal = Decimal("0")
+    bid_side_total_vol: int = 0
+    ask_side_total_vol: int = 0
+    bid_side_total_cnt: int = 0
+    ask_side_total_cnt: int = 0
+
+    def update(self, close: Decimal, volume: int, tick_type: int):
+        if not self.total_volume:
+            self.reference = self.open = self.high = self.low = close
+        self.high = max(self.high, close)
+        self.low = min(self.low, close)
+        self.total_volume += volume
+        self.total_amount += close * volume
+        if tick_type == 1:
+            self.bid_side_total_vol += volume
+            self.bid_side_total_cnt += 1
+        elif tick_type == 2:
+            self.ask_side_total_vol += volume
+            self.ask_side_total_cnt += 1
+
+
+def to_decimal(value) -> Decimal:
+    return Decimal(str(value))
+
+
+def to_time(value: Union[str, dtime]) -> dtime:
+    return dtime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class ReplayQuote:
+    """Stand-in for `api.quote` that plays tick files through the v1 callbacks.
+
+    Rows of all contracts are merged in timestamp order and played from a
+    background thread, like shioaji's network thread. `speed` 1 plays in
+    real time, 10 ten times faster, `None` (or 0) as fast as possible.
+    Every row emits the bid/ask it was traded against, then the trade.
+    """
+
+    def __init__(
+        self, feeds: Dict[str, "pd.DataFrame"], speed: Optional[float] = 1.0
+    ) -> None:
+        self.feeds = feeds
+        self.rows = {
+            code: list(df.itertuples(index=False)) for code, df in feeds.items()
+        }
+        self.speed = speed
+        self.tick_codes: Set[str] = set()
+        self.bidask_codes: Set[str] = set()
+        self.played: Dict[str, int] = {code: 0 for code in feeds}
+        self.sessions = {code: SessionState() for code in feeds}
+        self.stocks = {
+            code for code in feeds if security_type_of(code) == SecurityType.Stock
+        }
+        self.on_event: Optional[Callable] = None
+        self.on_tick_stk_v1: Optional[Callable] = None
+        self.on_tick_fop_v1: Optional[Callable] = None
+        self.on_bidask_stk_v1: Optional[Callable] = None
+        self.on_bidask_fop_v1: Optional[Callable] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+        self.reanchor = False
+        # monotonic time and timestamp of the row playback is timed from
+        self.anchor: Optional[Tuple[float, datetime]] = None
+        self.last_ts: Optional[datetime] = None
+
+    def set_event_callback(self, func: Callable):
+        self.on_event = func
+
+    def set_on_tick_stk_v1_callback(self, func: Callable):
+        self.on_tick_stk_v1 = func
+
+    def set_on_tick_fop_v1_callback(self, func: Callable):
+        self.on_tick_fop_v1 = func
+
+    def set_on_bidask_stk_v1_callback(self, func: Callable):
+        self.on_bidask_stk_v1 = func
+
+    def set_on_bidask_fop_v1_callback(self, func: Callable):
+        self.on_bidask_fop_v1 = func
+
+    def subscribe(
+        self,
+        contract: sj.contracts.Contract,
+        quote_type: QuoteType = QuoteType.Tick,
+        version: QuoteVersion = QuoteVersion.v1,
+    ):
+        if quote_type == QuoteType.Tick:
+            self.tick_codes.add(contract.code)
+        else:
+            self.bidask_codes.add(contract.code)
+        self.start()
+
+    def start(self):
+        """Playback starts with the first subscription."""
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, name="sjtop-replay", daemon=True
+            )
+            self.thread.start()
+
+    def unsubscribe(
+        self,
+        contract: sj.contracts.Contract,
+        quote_type: QuoteType = QuoteType.Tick,
+        version: QuoteVersion = QuoteVersion.v1,
+    ):
+        if quote_type == QuoteType.Tick:
+            self.tick_codes.discard(contract.code)
+        else:
+            self.bidask_codes.discard(contract.code)
+
+    def set_speed(self, speed: Optional[float]):
+        self.speed = speed
+        self.reanchor = True
+
+    def now(self) -> datetime:
+        """Exchange time of the playback, the clock of its quote timestamps."""
+        anchor, speed = self.anchor, self.speed
+        if anchor is None:
+            return datetime.min
+        if not speed:
+            return self.last_ts or anchor[1]
+        wall, ts = anchor
+        return ts + timedelta(seconds=(time.monotonic() - wall) * speed)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def event(self, info: str, event: str):
+        if self.on_event:
+            self.on_event(0, 0, info, event)
+
+    def timeline(self) -> "pd.DataFrame":
+        import pandas as pd
+
+        return pd.concat(
+            [
+                pd.DataFrame(
+                    {"datetime": df["datetime"], "code": code, "row": df.index}
+                )
+                for code, df in self.feeds.items()
+            ],
+            ignore_index=True,
+        ).sort_values("datetime", kind="mergesort")
+
+    def run(self):
+        self.event("Replay", "Replay started")
+        anchor_wall, anchor_ts = time.monotonic(), None
+        for ts, code, row in self.timeline().itertuples(index=False):
+            if self.stopped.is_set():
+                return
+            if anchor_ts is None or self.reanchor:
+                self.reanchor = False
+                anchor_wall, anchor_ts = time.monotonic(), ts
+                self.anchor = (anchor_wall, anchor_ts)
+            if self.speed:
+                delay = (
+                    anchor_wall
+                    + (ts - anchor_ts).total_seconds() / self.speed
+                    - time.monotonic()
+                )
+                if delay > 0 and self.stopped.wait(delay):
+                    return
+            self.play(code, self.rows[code][row])
+            self.last_ts = ts
+        self.event("Replay", "Replay finished")
+
+    def play(self, code: str, row: tuple):
+        close = to_decimal(row.close)
+        volume = int(row.volume)
+        tick_type = int(row.tick_type)
+        session = self.sessions[code]
+        session.update(close, volume, tick_type)
+        self.played[code] += 1
+        dt = row.datetime.to_pydatetime()
+        stock = code in self.stocks
+        if code in self.bidask_codes:
+            callback = self.on_bidask_stk_v1 if stock else self.on_bidask_fop_v1
+            if callback:
+                callback(
+                    Exchange.TSE if stock else Exchange.TAIFEX,
+                    self.make_bidask(code, dt, row, stock),
+                )
+        if code in self.tick_codes:
+            callback = self.on_tick_stk_v1 if stock else self.on_tick_fop_v1
+            if callback:
+                callback(
+                    Exchange.TSE if stock else Exchange.TAIFEX,
+                    self.make_tick(code, dt, close, volume, tick_type, stock),
+                )
+
+    def make_tick(
+        self,
+        code: str,
+        dt: datetime,
+        close: Decimal,
+        volume: int,
+        tick_type: int,
+        stock: bool,
+    ):
+        session = self.sessions[code]
+        price_chg = close - session.reference
+        fields = dict(
+            code=code,
+            datetime=dt,
+            open=session.open,
+            avg_price=(
+                session.total_amount / session.total_volume
+                if session.total_volume
+                else close
+            ),
+            close=close,
+            high=session.high,
+            low=session.low,
+            amount=close * volume if stock else close,
+            total_amount=session.total_amount,
+            volume=volume,
+            total_volume=session.total_volume,
+            tick_type=tick_type,
+            chg_type=2 if price_chg > 0 else 4 if price_chg < 0 else 3,
+            price_chg=price_chg,
+            pct_chg=(
+                price_chg / session.reference * 100
+                if session.reference
+                else Decimal("0")
+            ),
+            bid_side_total_vol=session.bid_side_total_vol,
+            ask_side_total_vol=session.ask_side_total_vol,
+            simtrade=0,
+        )
+        if stock:
+            return sj.TickSTKv1(
+                **fields,
+                bid_side_total_cnt=session.bid_side_total_cnt,
+                ask_side_total_cnt=session.ask_side_total_cnt,
+                closing_oddlot_shares=0,
+                fixed_trade_vol=0,
+                suspend=False,
+                intraday_odd=False,
+            )
+        return sj.TickFOPv1(**fields, underlying_price=Decimal("0"))
+
+    def make_bidask(self, code: str, dt: datetime, row: tuple, stock: bool):
+        zeros = [0, 0, 0, 0]
+        fields = dict(
+            code=code,
+            datetime=dt,
+            bid_price=[to_decimal(row.bid_price)] + [Decimal("0")] * 4,
+            bid_volume=[int(row.bid_volume)] + zeros,
+            diff_bid_vol=[0] + zeros,
+            ask_price=[to_decimal(row.ask_price)] + [Decimal("0")] * 4,
+            ask_volume=[int(row.ask_volume)] + zeros,
+            diff_ask_vol=[0] + zeros,
+            simtrade=0,
+        )
+        if stock:
+            return sj.BidAskSTKv1(**fields, suspend=False, intraday_odd=False)
+        return sj.BidAskFOPv1(
+            **fields,
+            bid_total_vol=int(row.bid_volume),
+            ask_total_vol=int(row.ask_volume),
+            first_derived_bid_price=Decimal("0"),
+            first_derived_ask_price=Decimal("0"),
+            first_derived_bid_vol=0,
+            first_derived_ask_vol=0,
+            underlying_price=Decimal("0"),
+        )
+
+
+class ReplayShioaji:
+    """Offline `sj.Shioaji` replacement driven by local tick files."""
+
+    def __init__(self, path: Union[str, Path], speed: Optional[float] = 1.0) -> None:
+        self.feeds = load_ticks(path)
+        self.Contracts = build_contracts(list(self.feeds))
+        self.quote = ReplayQuote(self.feeds, speed)
+
+    def login(self, *args, **kwargs):
+        return []
+
+    def ticks(self, contract: sj.contracts.Contract, date=None, *args, **kwargs):
+        """Ticks played so far, `last_cnt` limits it to the newest ones and a
+        `RangeTime` query to the ones between `time_start` and `time_end`."""
+        df = self.feeds.get(contract.code)
+        if df is None:
+            return {col: [] for col in TICK_COLUMNS}
+        played = self.quote.played[contract.code]
+        last_cnt = kwargs.get("last_cnt", 0)
+        rows = df.iloc[max(played - last_cnt, 0) if last_cnt else 0 : played]
+        if kwargs.get("query_type") == TicksQueryType.RangeTime:
+            times = rows["datetime"].dt.time
+            rows = rows[
+                (times >= to_time(kwargs["time_start"]))
+                & (times <= to_time(kwargs["time_end"]))
+            ]
+        return {col: rows[col].tolist() for col in TICK_COLUMNS}
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from textual.widget import Widget
+
+
+@dataclass
+class FrameStats:
+    frame: int
+    widgets: int
+    requests: int
+    # seconds the frame was flushed after it was due
+    late: float = 0.0
+
+    @property
+    def collapsed(self) -> int:
+        """Refresh requests absorbed by this frame."""
+        return self.requests - self.widgets
+
+
+class RenderScheduler:
+    """Coalesce widget refresh requests into frames.
+
+    Widgets call `mark_dirty` from any thread, the scheduler refreshes each
+    dirty widget once per frame. With `fps` set, frames are at least
+    `1 / fps` seconds apart; with `fps=None` a frame is flushed as soon as
+    the event loop gets back to it (adaptive mode).
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        fps: Optional[float] = 30.0,
+        on_frame: Optional[Callable[[FrameStats], None]] = None,
+    ) -> None:
+        self.loop = loop
+        self.fps = fps
+        self.on_frame = on_frame
+        self.dirty: Dict[Widget, int] = {}
+        self.lock = threading.Lock()
+        self.pending = False
+        self.last_flush = 0.0
+        self.due = 0.0
+        self.frames = 0
+        self.requests = 0
+        self.collapsed = 0
+        self.last_frame: Optional[FrameStats] = None
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.fps if self.fps else 0.0
+
+    def mark_dirty(self, widget: Widget) -> None:
+        with self.lock:
+            self.dirty[widget] = self.dirty.get(widget, 0) + 1
+            if self.pending:
+                return
+            self.pending = True
+        self.loop.call_soon_threadsafe(self.schedule)
+
+    def schedule(self) -> None:
+        now = self.loop.time()
+        delay = self.last_flush + self.interval - now
+        self.due = now + max(delay, 0.0)
+        if delay > 0:
+            self.loop.call_later(delay, self.flush)
+        else:
+            self.loop.call_soon(self.flush)
+
+    def flush(self) -> None:
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+            self.pending = False
+        self.last_flush = self.loop.time()
+        if not dirty:
+            return
+        for widget in dirty:
+            widget.refresh()
+        self.frames += 1
+        stats = FrameStats(
+            frame=self.frames,
+            widgets=len(dirty),
+            requests=sum(dirty.values()),
+            late=max(self.last_flush - self.due, 0.0),
+        )
+        self.requests += stats.requests
+        self.collapsed += stats.collapsed
+        self.last_frame = stats
+        if self.on_frame:
+            self.on_frame(stats)
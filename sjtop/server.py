@@ -0,0 +1,332 @@
+"""`sjtop serve`: one shioaji session shared by the local viewers.
+
+The server logs in once, subscribes upstream a contract the first time a
+viewer asks for it and unsubscribes it with the last one, and fans the
+quotes out over a Unix socket in the `sjtop.protocol` format.
+"""
+
+import asyncio
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+import shioaji as sj
+from shioaji.constant import QuoteType, QuoteVersion, TicksQueryType
+
+from sjtop import DEFAULT_SOCKET
+from sjtop.ingest import QuoteIngest
+from sjtop.protocol import (
+    BIDASK,
+    CONTRACTS,
+    DELTAS,
+    HISTORY,
+    HISTORY_ERROR,
+    HISTORY_HEADER,
+    HISTORY_REQUEST,
+    REQUEST_ID,
+    SUBSCRIBE,
+    TICK,
+    UNSUBSCRIBE,
+    bidask_wire,
+    frame,
+    history_payload,
+    quote_prefix,
+    read_frame,
+    tick_wire,
+    time_from_us,
+)
+from sjtop.replay import ReplayShioaji
+from sjtop.startup import find_contract
+
+QUOTE_TYPES = {TICK: QuoteType.Tick, BIDASK: QuoteType.BidAsk}
+
+# kind, code, payload prefix (None for control frames), record or frame
+Entry = Tuple[int, str, Optional[bytes], bytes]
+
+
+class Outbox:
+    """Frames waiting for one viewer, its quotes conflated while it lags.
+
+    Like `QuoteIngest`: a bid/ask replaces the pending one of its contract
+    until a trade of that contract is queued after it, trades are kept up
+    to `max_pending` entries. Deltas are taken against the last record
+    written to the viewer, so whatever was skipped a delta stays exact.
+    Control frames are never dropped.
+    """
+
+    def __init__(self, max_pending: int = 10_000) -> None:
+        self.max_pending = max_pending
+        self.pending: List[Entry] = []
+        self.bidask_slot: Dict[str, int] = {}
+        self.sent: Dict[Tuple[int, str], bytes] = {}
+        self.ready = asyncio.Event()
+        self.conflated = 0
+        self.dropped = 0
+
+    def push_frame(self, data: bytes):
+        self.pending.append((0, "", None, data))
+        self.ready.set()
+
+    def push_quote(self, kind: int, code: str, prefix: bytes, record: bytes):
+        if kind == BIDASK:
+            slot = self.bidask_slot.get(code)
+            if slot is not None:
+                self.pending[slot] = (kind, code, prefix, record)
+                self.conflated += 1
+                return
+        else:
+            self.bidask_slot.pop(code, None)
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        if kind == BIDASK:
+            self.bidask_slot[code] = len(self.pending)
+        self.pending.append((kind, code, prefix, record))
+        self.ready.set()
+
+    def forget(self, kind: int, code: str):
+        """Next record of `code` goes out whole, pending ones are dropped."""
+        self.sent.pop((kind, code), None)
+        self.pending = [
+            entry for entry in self.pending if (entry[0], entry[1]) != (kind, code)
+        ]
+        self.bidask_slot = {}
+        for slot, (pending_kind, pending_code, _, _) in enumerate(self.pending):
+            if pending_kind == BIDASK:
+                self.bidask_slot[pending_code] = slot
+            elif pending_kind == TICK:
+                self.bidask_slot.pop(pending_code, None)
+
+    def take(self) -> bytes:
+        """Encode the pending entries into frames to write."""
+        batch, self.pending = self.pending, []
+        self.bidask_slot = {}
+        self.ready.clear()
+        frames = []
+        sent = self.sent
+        for kind, code, prefix, data in batch:
+            if prefix is None:
+                frames.append(data)
+                continue
+            delta = DELTAS[kind].encode(sent.get((kind, code)), data)
+            sent[(kind, code)] = data
+            frames.append(frame(kind, prefix + delta))
+        return b"".join(frames)
+
+
+class Viewer:
+    def __init__(self, writer: asyncio.StreamWriter, max_pending: int) -> None:
+        self.writer = writer
+        self.outbox = Outbox(max_pending)
+        self.subscriptions: Set[Tuple[int, str]] = set()
+
+    async def send(self):
+        """Write batches as fast as the viewer reads them."""
+        try:
+            while True:
+                await self.outbox.ready.wait()
+                self.writer.write(self.outbox.take())
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+class QuoteServer:
+    def __init__(
+        self,
+        api: sj.Shioaji,
+        path: Union[str, Path],
+        loop: asyncio.AbstractEventLoop,
+        max_pending: int = 10_000,
+    ) -> None:
+        self.api = api
+        self.path = Path(path).expanduser()
+        self.loop = loop
+        self.max_pending = max_pending
+        self.ingest = QuoteIngest(loop)
+        self.viewers: Set[Viewer] = set()
+        self.subscribers: Dict[Tuple[int, str], Set[Viewer]] = {}
+        # newest record of every subscribed contract, the snapshot
+        self.last: Dict[Tuple[int, str], Tuple[bytes, bytes]] = {}
+        self.prefixes: Dict[str, bytes] = {}
+        self.contracts = pickle.dumps(api.Contracts, protocol=pickle.HIGHEST_PROTOCOL)
+        self.server: Optional[asyncio.AbstractServer] = None
+        api.quote.set_on_tick_fop_v1_callback(self.on_tick)
+        api.quote.set_on_tick_stk_v1_callback(self.on_tick)
+        api.quote.set_on_bidask_fop_v1_callback(self.on_bidask)
+        api.quote.set_on_bidask_stk_v1_callback(self.on_bidask)
+
+    async def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self.path.unlink()
+        self.server = await asyncio.start_unix_server(
+            self.serve_viewer, path=str(self.path)
+        )
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for viewer in list(self.viewers):
+            viewer.writer.close()
+        if self.path.exists():
+            self.path.unlink()
+
+    def on_tick(self, exchange: sj.Exchange, tick):
+        self.ingest.push_tick(self.publish_tick, exchange, tick)
+
+    def on_bidask(self, exchange: sj.Exchange, quote):
+        self.ingest.push_bidask(self.publish_bidask, exchange, quote)
+
+    def publish_tick(self, exchange: sj.Exchange, tick):
+        stock = isinstance(tick, sj.TickSTKv1)
+        self.publish(TICK, exchange, stock, tick.code, tick_wire(tick))
+
+    def publish_bidask(self, exchange: sj.Exchange, quote):
+        stock = isinstance(quote, sj.BidAskSTKv1)
+        self.publish(BIDASK, exchange, stock, quote.code, bidask_wire(quote))
+
+    def publish(
+        self, kind: int, exchange: sj.Exchange, stock: bool, code: str, record: bytes
+    ):
+        key = (kind, code)
+        viewers = self.subscribers.get(key)
+        if not viewers:
+            return
+        prefix = self.prefixes.get(code)
+        if prefix is None:
+            prefix = self.prefixes[code] = quote_prefix(exchange, stock, code)
+        self.last[key] = (prefix, record)
+        for viewer in viewers:
+            viewer.outbox.push_quote(kind, code, prefix, record)
+
+    def subscribe(self, viewer: Viewer, kind: int, code: str):
+        key = (kind, code)
+        if key in viewer.subscriptions:
+            return
+        viewers = self.subscribers.get(key)
+        if viewers is None:
+            contract = find_contract(self.api.Contracts, code)
+            if contract is None:
+                return
+            viewers = self.subscribers[key] = set()
+            self.api.quote.subscribe(
+                contract, QUOTE_TYPES[kind], version=QuoteVersion.v1
+            )
+        viewers.add(viewer)
+        viewer.subscriptions.add(key)
+        viewer.outbox.forget(kind, code)
+        last = self.last.get(key)
+        if last is not None:
+            viewer.outbox.push_quote(kind, code, *last)
+
+    def unsubscribe(self, viewer: Viewer, kind: int, code: str):
+        key = (kind, code)
+        if key not in viewer.subscriptions:
+            return
+        viewer.subscriptions.discard(key)
+        viewer.outbox.forget(kind, code)
+        viewers = self.subscribers[key]
+        viewers.discard(viewer)
+        if viewers:
+            return
+        del self.subscribers[key]
+        self.last.pop(key, None)
+        contract = find_contract(self.api.Contracts, code)
+        self.api.quote.unsubscribe(contract, QUOTE_TYPES[kind], version=QuoteVersion.v1)
+
+    def fetch_history(self, code: str, payload: bytes) -> bytes:
+        """Blocking `api.ticks` query, run it in an executor."""
+        contract = find_contract(self.api.Contracts, code)
+        if contract is None:
+            raise KeyError(code)
+        _, last_cnt, date, start, end = HISTORY_HEADER.unpack_from(payload)
+        kwargs = dict(query_type=TicksQueryType.AllDay)
+        if last_cnt:
+            kwargs = dict(query_type=TicksQueryType.LastCount, last_cnt=last_cnt)
+        elif start >= 0:
+            kwargs = dict(
+                query_type=TicksQueryType.RangeTime,
+                time_start=time_from_us(start),
+                time_end=time_from_us(end),
+            )
+        day = date.decode().strip("\0")
+        if day:
+            kwargs["date"] = day
+        ticks = {**self.api.ticks(contract, **kwargs)}
+        return history_payload(code, ticks)
+
+    async def history(self, viewer: Viewer, payload: bytes):
+        code = payload[HISTORY_HEADER.size :].decode()
+        request_id = payload[: REQUEST_ID.size]
+        try:
+            data = await self.loop.run_in_executor(
+                None, self.fetch_history, code, payload
+            )
+        except Exception as e:
+            error = request_id + repr(e).encode()
+            viewer.outbox.push_frame(frame(HISTORY_ERROR, error))
+        else:
+            viewer.outbox.push_frame(frame(HISTORY, request_id + data))
+
+    async def serve_viewer(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        viewer = Viewer(writer, self.max_pending)
+        self.viewers.add(viewer)
+        viewer.outbox.push_frame(frame(CONTRACTS, self.contracts))
+        sender = asyncio.ensure_future(viewer.send())
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == SUBSCRIBE:
+                    self.subscribe(viewer, payload[0], payload[1:].decode())
+                elif kind == UNSUBSCRIBE:
+                    self.unsubscribe(viewer, payload[0], payload[1:].decode())
+                elif kind == HISTORY_REQUEST:
+                    asyncio.ensure_future(self.history(viewer, payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            sender.cancel()
+            for kind, code in list(viewer.subscriptions):
+                self.unsubscribe(viewer, kind, code)
+            self.viewers.discard(viewer)
+            writer.close()
+
+
+def connect(config: dict) -> sj.Shioaji:
+    """Log in with the `sjtop.json` settings, or open its replay."""
+    if config.get("replay"):
+        return ReplayShioaji(**config["replay"])
+    api = sj.Shioaji(simulation=config["simulation"])
+    api.login(
+        config["person_id"],
+        config["password"],
+        contracts_timeout=config.get("contracts_timeout", 30000),
+    )
+    return api
+
+
+def serve(path: Union[str, Path], config_file: Union[str, Path] = "sjtop.json"):
+    """Run the quote server until interrupted."""
+    config_file = Path(config_file)
+    config = (
+        json.loads(config_file.read_text())
+        if config_file.exists()
+        else dict(simulation=True, person_id="PAPIUSER01", password="2222")
+    )
+    loop = asyncio.get_event_loop()
+    api = connect(config)
+    server = QuoteServer(api, path, loop)
+    loop.run_until_complete(server.start())
+    print(f"sjtop serving quotes on {server.path} (pid {os.getpid()})")
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
@@ -1,15 +1,18 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import rich
 from shioaji.constant import SecurityType
 
 from shioaji.contracts import Contract, Contracts
 from textual.message import Message
 from textual._types import MessageTarget
-from textual.widgets import TreeControl, TreeNode, TreeClick
+from textual.widgets import ScrollView, TreeControl, TreeNode, TreeClick
 from textual.reactive import Reactive
 from textual.events import Mount
 
+# contract nodes materialized at a time under an exchange node
+CHUNK = 100
+
 
 @dataclass
 class ContractEntry:
@@ -17,6 +20,22 @@ class ContractEntry:
     security_type: Optional[SecurityType]
     exchange: Optional[str]
     is_contracts: bool
+    # placeholder node standing for the not yet materialized contracts
+    is_more: bool = False
+
+
+@dataclass
+class ExchangeIndex:
+    """Sorted contract codes of one exchange, built once."""
+
+    codes: List[str]
+    # stock view shows the 4-digit codes only (no warrants, ETNs, ...)
+    listed: List[str]
+
+    @classmethod
+    def build(cls, contracts: Iterable[Contract]) -> "ExchangeIndex":
+        codes = sorted(c.code for c in contracts)
+        return cls(codes=codes, listed=[code for code in codes if len(code) == 4])
 
 
 @rich.repr.auto
@@ -27,9 +46,12 @@ class ContractClick(Message, bubble=True):
 
 
 class ContractsTree(TreeControl[ContractEntry]):
-    def __init__(self, contracts: Contracts, name: str = None) -> None:
+    def __init__(self, contracts: Optional[Contracts], name: str = None) -> None:
         self.contract: Optional[Contract] = None
         self.contracts = contracts
+        self.indexes: Dict[Tuple[SecurityType, str], ExchangeIndex] = {}
+        # exchange node id -> number of contract nodes materialized
+        self.materialized: Dict[int, int] = {}
         label = "Contracts"
         data = ContractEntry(
             label, security_type=None, exchange=None, is_contracts=True
@@ -46,25 +68,132 @@ class ContractsTree(TreeControl[ContractEntry]):
         self.has_focus = False
 
     async def on_mount(self, event: Mount) -> None:
-        await self.load_contracts(self.root)
+        if self.contracts is not None and not self.root.loaded:
+            await self.load_contracts(self.root)
 
-    async def load_contracts(self, node: TreeNode[ContractEntry]):
-        if not node.data.security_type:
-            for secu_type, cstream in self.contracts:
-                await node.add(
-                    secu_type,
+    async def set_contracts(self, contracts: Contracts):
+        """Fill the tree once contracts are downloaded."""
+        self.contracts = contracts
+        self.indexes = {}
+        if not self.root.loaded:
+            await self.load_contracts(self.root)
+
+    async def add_nodes(
+        self,
+        parent: TreeNode[ContractEntry],
+        entries: Iterable[Tuple[str, ContractEntry]],
+    ):
+        """Add a batch of nodes, at most a `CHUNK` of contracts at a time."""
+        for label, entry in entries:
+            await self.add(parent.id, label, entry)
+
+    def index_of(self, security_type: SecurityType, exchange: str) -> ExchangeIndex:
+        index = self.indexes.get((security_type, exchange))
+        if index is None:
+            cstream = getattr(self.contracts, f"{security_type.name}s")
+            index = self.indexes[security_type, exchange] = ExchangeIndex.build(
+                getattr(cstream, exchange)
+            )
+        return index
+
+    def codes_of(self, entry: ContractEntry) -> List[str]:
+        index = self.index_of(entry.security_type, entry.exchange)
+        if entry.security_type == SecurityType.Stock:
+            return index.listed
+        return index.codes
+
+    async def load_chunk(self, node: TreeNode[ContractEntry]) -> Optional[TreeNode]:
+        """Materialize the next `CHUNK` contracts under an exchange node.
+
+        Returns the first new node, it takes the line of the "more" node.
+        """
+        if node.children and node.children[-1].data.is_more:
+            more = node.children.pop()
+            node.tree.children.pop()
+            del self.nodes[more.id]
+        codes = self.codes_of(node.data)
+        start = self.materialized.get(node.id, 0)
+        end = min(start + CHUNK, len(codes))
+        entries = [
+            (
+                code,
+                ContractEntry(
+                    code=code,
+                    security_type=node.data.security_type,
+                    exchange=node.data.exchange,
+                    is_contracts=False,
+                ),
+            )
+            for code in codes[start:end]
+        ]
+        if end < len(codes):
+            entries.append(
+                (
+                    f"… {len(codes) - end} more",
                     ContractEntry(
                         code=None,
-                        security_type=getattr(SecurityType, secu_type[:-1]),
-                        exchange=None,
+                        security_type=node.data.security_type,
+                        exchange=node.data.exchange,
                         is_contracts=True,
+                        is_more=True,
                     ),
                 )
-        else:
+            )
+        self.materialized[node.id] = end
+        first = len(node.children)
+        await self.add_nodes(node, entries)
+        return node.children[first] if entries else None
+
+    def line_of(self, node_id: int) -> Optional[int]:
+        """Line of a node in the rendered tree, None when collapsed away."""
+        line = 0
+        stack = [iter([self.root])]
+        while stack:
+            children = stack.pop()
+            node = next(children, None)
+            if node is None:
+                continue
+            if node.id == node_id:
+                return line
+            line += 1
+            stack.append(children)
+            if node.children and node.expanded:
+                stack.append(iter(node.children))
+        return None
+
+    async def load_visible(self, bottom: int):
+        """Materialize chunks until the tree is filled down to line `bottom`."""
+        for node_id in list(self.materialized):
+            node = self.nodes[node_id]
+            while node.expanded and node.children and node.children[-1].data.is_more:
+                line = self.line_of(node.children[-1].id)
+                if line is None or line > bottom:
+                    break
+                await self.load_chunk(node)
+
+    async def load_contracts(self, node: TreeNode[ContractEntry]):
+        if not node.data.security_type:
+            await self.add_nodes(
+                node,
+                [
+                    (
+                        secu_type,
+                        ContractEntry(
+                            code=None,
+                            security_type=getattr(SecurityType, secu_type[:-1]),
+                            exchange=None,
+                            is_contracts=True,
+                        ),
+                    )
+                    for secu_type, cstream in self.contracts
+                ],
+            )
+        elif not node.data.exchange:
             cstream = getattr(self.contracts, f"{node.data.security_type.name}s")
-            if not node.data.exchange:
-                for cs in cstream:
-                    await node.add(
+            await self.add_nodes(
+                node,
+                [
+                    (
                         cs._name,
                         ContractEntry(
                             code=None,
@@ -73,39 +202,27 @@ class ContractsTree(TreeControl[ContractEntry]):
                             is_contracts=True,
                         ),
                     )
-            else:
-                cs = getattr(cstream, node.data.exchange)
-                cs_sorted = sorted([c for c in cs], key=lambda x: x.code)
-                for c in cs_sorted:
-                    if node.data.security_type == SecurityType.Stock:
-                        if len(c.code) == 4:
-                            await node.add(
-                                c.code,
-                                ContractEntry(
-                                    code=c.code,
-                                    security_type=node.data.security_type,
-                                    exchange=cs._name,
-                                    is_contracts=False,
-                                ),
-                            )
-                    else:
-                        await node.add(
-                            c.code,
-                            ContractEntry(
-                                code=c.code,
-                                security_type=node.data.security_type,
-                                exchange=cs._name,
-                                is_contracts=False,
-                            ),
-                        )
+                    for cs in cstream
+                ],
+            )
+        else:
+            await self.load_chunk(node)
 
         node.loaded = True
         await node.expand()
         self.refresh(layout=True)
 
+    async def cursor_down(self) -> None:
+        await super().cursor_down()
+        node = self.nodes[self.cursor]
+        if node.data.is_more:
+            self.cursor = (await self.load_chunk(node.parent)).id
+
     async def handle_tree_click(self, message: TreeClick[ContractEntry]) -> None:
         contract_entry = message.node.data
-        if not contract_entry.is_contracts:
+        if contract_entry.is_more:
+            self.cursor = (await self.load_chunk(message.node.parent)).id
+        elif not contract_entry.is_contracts:
             contract = getattr(self.contracts, f"{contract_entry.security_type.name}s")[
                 contract_entry.code
             ]
@@ -116,3 +233,15 @@ class ContractsTree(TreeControl[ContractEntry]):
                 await message.node.expand()
             else:
                 await message.node.toggle()
+
+
+class ContractsScrollView(ScrollView):
+    """Scroll view of the contracts tree, materializes nodes scrolled into view."""
+
+    def __init__(self, tree: ContractsTree, name: Optional[str] = None) -> None:
+        self.tree = tree
+        super().__init__(tree, name=name)
+
+    async def watch_y(self, new_value: float) -> None:
+        await super().watch_y(new_value)
+        await self.tree.load_visible(round(new_value) + self.size.height)
@@ -0,0 +1,334 @@
+"""Synthetic spreads of several legs, like a calendar spread or the basis.
+
+A spread is configured as `{"name": "cal", "legs": "TXFJ1 - TXFK1"}`, its
+legs are `[ratio *] code` terms and `code.underlying` is the underlying
+price the futures and options quotes of `code` carry. Every leg keeps its
+last quote and exchange time; the synthetic bid / ask / last are running
+sums a leg update corrects by its own change, so a quote costs the same
+for a spread of 2 or 20 legs and for 1 or 100 spreads on other contracts.
+"""
+
+import re
+from array import array
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import shioaji as sj
+from rich import box
+from rich.table import Table
+from rich.text import Text
+from textual import events
+from textual.widget import Widget
+
+from sjtop.price import FACTOR, QuotePrices
+from sjtop.protocol import to_us
+from sjtop.scheduler import RenderScheduler
+
+TERM = re.compile(
+    r"\s*(?P<sign>[+-])?\s*(?:(?P<ratio>\d+)\s*\*\s*)?"
+    r"(?P<code>\w+)(?P<underlying>\.underlying)?\s*"
+)
+BARS = "▁▂▃▄▅▆▇█"
+
+
+class Leg(NamedTuple):
+    code: str
+    ratio: int
+    # the underlying price of the quotes of `code`, not their own
+    underlying: bool
+
+
+class Spread(NamedTuple):
+    name: str
+    legs: Tuple[Leg, ...]
+
+
+def parse_spread(config: dict) -> Spread:
+    """A `Spread` from a config entry like `{"legs": "TXFJ1 - 2 * MXFJ1"}`."""
+    text = config.get("legs", "")
+    legs: List[Leg] = []
+    pos = 0
+    while pos < len(text) or not legs:
+        match = TERM.match(text, pos)
+        if not match or (legs and not match["sign"]) or match["ratio"] == "0":
+            raise ValueError(f"spread {text!r}: bad leg at {text[pos:]!r}")
+        ratio = int(match["ratio"] or 1)
+        legs.append(
+            Leg(
+                match["code"],
+                -ratio if match["sign"] == "-" else ratio,
+                bool(match["underlying"]),
+            )
+        )
+        pos = match.end()
+    return Spread(config.get("name") or text.strip(), tuple(legs))
+
+
+class SpreadBook:
+    """Synthetic quotes of the spreads, their legs in flat per-leg lists.
+
+    Prices are integers in units of the finest tick, see `sjtop.price`, 0
+    while a leg side has no quote. A spread side is only shown once every
+    leg quoted it, `missing_*` count the legs still without one. Legs are
+    aligned by exchange time: the spread is as of its newest leg quote,
+    `lag` tells how old its stalest leg is at that time.
+    """
+
+    def __init__(
+        self,
+        spreads: Iterable[Spread] = (),
+        interval: int = 10,
+        capacity: int = 240,
+        prices: Optional[QuotePrices] = None,
+    ) -> None:
+        self.prices = prices or QuotePrices()
+        # seconds of a bucket of the history, buckets kept per spread
+        self.interval = interval
+        self.capacity = capacity
+        self.spreads: List[Spread] = []
+        # per leg
+        self.leg_spread: List[int] = []
+        self.ratios: List[int] = []
+        self.leg_bid: List[int] = []
+        self.leg_ask: List[int] = []
+        self.leg_last: List[int] = []
+        self.leg_ts: List[int] = []
+        # legs fed by the quotes or the underlying price of a code
+        self.routes: Dict[str, List[int]] = {}
+        self.underlying_routes: Dict[str, List[int]] = {}
+        # per spread
+        self.first_leg: List[int] = []
+        self.bid: List[int] = []
+        self.ask: List[int] = []
+        self.last: List[int] = []
+        self.missing_bid: List[int] = []
+        self.missing_ask: List[int] = []
+        self.missing_last: List[int] = []
+        self.ts: List[int] = []
+        self.decimals: List[int] = []
+        # [bucket, mid] of the last `capacity` buckets with a quote
+        self.history: List[Deque[list]] = []
+        for spread in spreads:
+            self.add(spread)
+
+    def __len__(self) -> int:
+        return len(self.spreads)
+
+    @property
+    def codes(self) -> List[str]:
+        """Contracts the legs need quotes of, in order of appearance."""
+        return list(dict.fromkeys(leg.code for s in self.spreads for leg in s.legs))
+
+    def add(self, spread: Spread) -> int:
+        row = len(self.spreads)
+        self.spreads.append(spread)
+        self.first_leg.append(len(self.ratios))
+        for leg in spread.legs:
+            routes = self.underlying_routes if leg.underlying else self.routes
+            routes.setdefault(leg.code, []).append(len(self.ratios))
+            self.leg_spread.append(row)
+            self.ratios.append(leg.ratio)
+            for prices in (self.leg_bid, self.leg_ask, self.leg_last, self.leg_ts):
+                prices.append(0)
+        for sums in (self.bid, self.ask, self.last, self.ts, self.decimals):
+            sums.append(0)
+        for missing in (self.missing_bid, self.missing_ask, self.missing_last):
+            missing.append(len(spread.legs))
+        self.history.append(deque(maxlen=self.capacity))
+        return row
+
+    def set_quote(self, leg: int, bid: int, ask: int):
+        row = self.leg_spread[leg]
+        ratio = self.ratios[leg]
+        old_bid, old_ask = self.leg_bid[leg], self.leg_ask[leg]
+        self.leg_bid[leg], self.leg_ask[leg] = bid, ask
+        # selling the spread sells the long legs at their bid, buys the short
+        # ones at their ask
+        if ratio < 0:
+            bid, ask, old_bid, old_ask = ask, bid, old_ask, old_bid
+        self.bid[row] += ratio * (bid - old_bid)
+        self.ask[row] += ratio * (ask - old_ask)
+        self.missing_bid[row] += (not bid) - (not old_bid)
+        self.missing_ask[row] += (not ask) - (not old_ask)
+
+    def set_last(self, leg: int, price: int):
+        row = self.leg_spread[leg]
+        old = self.leg_last[leg]
+        self.leg_last[leg] = price
+        self.last[row] += self.ratios[leg] * (price - old)
+        self.missing_last[row] += (not price) - (not old)
+
+    def stamp(self, leg: int, ts: int, decimals: int):
+        """Time the leg quote and add the spread as of then to its history."""
+        row = self.leg_spread[leg]
+        self.leg_ts[leg] = ts
+        if ts > self.ts[row]:
+            self.ts[row] = ts
+        if decimals > self.decimals[row]:
+            self.decimals[row] = decimals
+        value = self.mid(row)
+        if value is None:
+            return
+        bucket = self.ts[row] // (self.interval * 1_000_000)
+        history = self.history[row]
+        if history and history[-1][0] == bucket:
+            history[-1][1] = value
+        else:
+            history.append([bucket, value])
+
+    def mid(self, row: int) -> Optional[float]:
+        """Middle of the synthetic bid / ask, the last price before both."""
+        if not (self.missing_bid[row] or self.missing_ask[row]):
+            return (self.bid[row] + self.ask[row]) / (2 * FACTOR)
+        if not self.missing_last[row]:
+            return self.last[row] / FACTOR
+        return None
+
+    def lag(self, row: int) -> Optional[float]:
+        """Seconds the stalest leg is behind the newest, None until all quoted."""
+        first = self.first_leg[row]
+        oldest = min(self.leg_ts[first : first + len(self.spreads[row].legs)])
+        return (self.ts[row] - oldest) / 1_000_000 if oldest else None
+
+    def on_underlying(self, code: str, price, ts: int) -> bool:
+        legs = self.underlying_routes.get(code)
+        if not legs:
+            return False
+        # scaled apart from the quotes of `code`, like the leg it feeds
+        scaled = self.prices.scale(f"{code}.underlying").to_int(price)
+        decimals = self.leg_decimals(f"{code}.underlying")
+        for leg in legs:
+            self.set_quote(leg, scaled, scaled)
+            self.set_last(leg, scaled)
+            self.stamp(leg, ts, decimals)
+        return True
+
+    def leg_decimals(self, code: str) -> int:
+        return max(self.prices.scale(code).shown_decimals, 0)
+
+    def on_tick(self, tick, close: int) -> bool:
+        """Update the legs of `tick`, True when a spread changed."""
+        legs = self.routes.get(tick.code)
+        underlying = tick.code in self.underlying_routes
+        if not (legs or underlying):
+            return False
+        ts = to_us(tick.datetime)
+        if legs:
+            decimals = self.leg_decimals(tick.code)
+            for leg in legs:
+                self.set_last(leg, close)
+                self.stamp(leg, ts, decimals)
+        if underlying:
+            self.on_underlying(tick.code, getattr(tick, "underlying_price", 0), ts)
+        return True
+
+    def on_bidask(self, quote, bids: array, asks: array) -> bool:
+        """Update the legs of `quote`, True when a spread changed."""
+        legs = self.routes.get(quote.code)
+        underlying = quote.code in self.underlying_routes
+        if not (legs or underlying):
+            return False
+        ts = to_us(quote.datetime)
+        if legs:
+            bid, ask = bids[0], asks[0]
+            decimals = self.leg_decimals(quote.code)
+            for leg in legs:
+                self.set_quote(leg, bid, ask)
+                self.stamp(leg, ts, decimals)
+        if underlying:
+            self.on_underlying(quote.code, getattr(quote, "underlying_price", 0), ts)
+        return True
+
+
+def sparkline(history: Iterable[list], width: int) -> str:
+    """The last `width` buckets of `history`, a bucket without quotes shows
+    the value before it."""
+    history = list(history)
+    if not history or width <= 0:
+        return ""
+    start = history[-1][0] - width + 1
+    values: List[Optional[float]] = [None] * width
+    before = None
+    for bucket, value in history:
+        if bucket < start:
+            before = value
+        else:
+            values[bucket - start] = value
+    for idx, value in enumerate(values):
+        if value is None:
+            values[idx] = before
+        else:
+            before = value
+    shown = [value for value in values if value is not None]
+    lo, hi = min(shown), max(shown)
+    scale = (len(BARS) - 1) / (hi - lo) if hi > lo else 0
+    return "".join(
+        " " if value is None else BARS[round((value - lo) * scale)] for value in values
+    )
+
+
+def price_text(total: int, missing: int, decimals: int, style: str = "") -> Text:
+    if missing:
+        return Text("-", style="dim")
+    return Text(f"{total / FACTOR:.{decimals}f}", style=style)
+
+
+class SpreadPanel(Widget):
+    def __init__(
+        self,
+        name: str,
+        spreads: Iterable[Spread],
+        scheduler: RenderScheduler,
+        interval: int = 10,
+        prices: Optional[QuotePrices] = None,
+    ) -> None:
+        self.book = SpreadBook(spreads, interval, prices=prices)
+        self.scheduler = scheduler
+        self.chart_width = 30
+        self.cols = ["Spread", "Bid", "Ask", "Last", "Lag", "Chart"]
+        super().__init__(name=name)
+
+    @property
+    def codes(self) -> List[str]:
+        return self.book.codes
+
+    def on_tick(self, exchange: sj.Exchange, tick, close: int):
+        if self.book.on_tick(tick, close):
+            self.scheduler.mark_dirty(self)
+
+    def on_bidask(self, exchange: sj.Exchange, quote, bids: array, asks: array):
+        if self.book.on_bidask(quote, bids, asks):
+            self.scheduler.mark_dirty(self)
+
+    async def on_resize(self, event: events.Resize) -> None:
+        # name, three prices and the lag take about 60 columns
+        self.chart_width = max(event.width - 60, 8)
+        await super().on_resize(event)
+
+    def render(self):
+        book = self.book
+        table = Table(
+            show_header=True,
+            show_edge=False,
+            pad_edge=False,
+            box=box.MINIMAL,
+            expand=True,
+        )
+        for col in self.cols:
+            table.add_column(
+                col,
+                justify="left" if col in ("Spread", "Chart") else "right",
+                no_wrap=True,
+            )
+        for row, spread in enumerate(book.spreads):
+            decimals = book.decimals[row]
+            lag = book.lag(row)
+            table.add_row(
+                Text(spread.name),
+                price_text(book.bid[row], book.missing_bid[row], decimals, "green"),
+                price_text(book.ask[row], book.missing_ask[row], decimals, "red"),
+                price_text(book.last[row], book.missing_last[row], decimals),
+                Text("-" if lag is None else f"{lag:.1f}s"),
+                Text(sparkline(book.history[row], self.chart_width), style="yellow"),
+            )
+        return table
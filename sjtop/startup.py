@@ -0,0 +1,81 @@
+import pickle
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+from shioaji.contracts import Contract, Contracts
+
+
+def find_contract(contracts: Contracts, code: str) -> Optional[Contract]:
+    for product_contracts in (
+        contracts.Stocks,
+        contracts.Futures,
+        contracts.Options,
+        contracts.Indexs,
+    ):
+        contract = product_contracts[code]
+        if contract:
+            return contract
+    return None
+
+
+def snapshot_path(root: Path, day: date) -> Path:
+    return root / f"contracts-{day.strftime('%Y%m%d')}.pkl"
+
+
+def load_snapshot(root: Union[str, Path], day: date) -> Optional[Contracts]:
+    """Contracts saved for `day`, None when missing or unreadable."""
+    path = snapshot_path(Path(root), day)
+    try:
+        with path.open("rb") as f:
+            contracts = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        return None
+    if not isinstance(contracts, Contracts):
+        return None
+    for _, product_contracts in contracts:
+        product_contracts.set_status_fetched()
+    return contracts
+
+
+def save_snapshot(root: Union[str, Path], day: date, contracts: Contracts) -> Path:
+    """Write the snapshot of `day` and drop the ones of other days."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    path = snapshot_path(root, day)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        pickle.dump(contracts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(path)
+    for old in root.glob("contracts-*.pkl"):
+        if old != path:
+            old.unlink()
+    return path
+
+
+class PhaseTimer:
+    """Wall time of the named startup phases."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    @property
+    def total(self) -> float:
+        return time.perf_counter() - self.start
+
+    def summary(self) -> str:
+        phases = " | ".join(
+            f"{name} {elapsed * 1000:.0f}ms" for name, elapsed in self.phases.items()
+        )
+        return f"startup {self.total * 1000:.0f}ms: {phases}"
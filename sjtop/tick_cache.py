@@ -0,0 +1,88 @@
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class TickRecord(NamedTuple):
+    """A trade as the tick viewer shows it, from `api.ticks` or the stream."""
+
+    datetime: datetime
+    bid_price: Decimal
+    close: Decimal
+    ask_price: Decimal
+    volume: int
+    # aggressor side, shioaji `tick_type`: 1 at the ask, 2 at the bid, 0 unknown
+    tick_type: int = 0
+
+
+def records_from_ticks(ticks) -> List[TickRecord]:
+    """`api.ticks()` columns as records, without pandas on the startup path."""
+    ticks = {**ticks}
+    size = len(ticks.get("ts", ()))
+    columns = (
+        ticks[name] if name in ticks else [0] * size
+        for name in ("ts", "bid_price", "close", "ask_price", "volume", "tick_type")
+    )
+    return [
+        TickRecord(EPOCH + timedelta(microseconds=ns // 1000), *row)
+        for ns, *row in zip(*columns)
+    ]
+
+
+class TickCache:
+    """Last `depth` ticks of the `capacity` most recently viewed contracts.
+
+    Cached contracts stay subscribed, `on_tick` / `on_bidask` keep their
+    history current, so switching back to one needs no `api.ticks` query.
+    """
+
+    def __init__(self, capacity: int = 8, depth: int = 200) -> None:
+        self.capacity = capacity
+        self.depth = depth
+        self.entries: "OrderedDict[str, Deque[TickRecord]]" = OrderedDict()
+        # best bid / ask of the cached contracts, recorded with their trades
+        self.quotes: Dict[str, Tuple[Decimal, Decimal]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, code: str) -> Optional[Deque[TickRecord]]:
+        records = self.entries.get(code)
+        if records is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(code)
+        return records
+
+    def put(self, code: str, records: Iterable[TickRecord]) -> List[str]:
+        """Cache the history of `code`, return the codes evicted for it."""
+        self.entries[code] = deque(records, maxlen=self.depth)
+        self.entries.move_to_end(code)
+        evicted = []
+        while len(self.entries) > self.capacity:
+            old, _ = self.entries.popitem(last=False)
+            self.quotes.pop(old, None)
+            evicted.append(old)
+        return evicted
+
+    def on_tick(self, tick):
+        records = self.entries.get(tick.code)
+        if records is None:
+            return
+        bid, ask = self.quotes.get(tick.code, (tick.close, tick.close))
+        records.append(
+            TickRecord(tick.datetime, bid, tick.close, ask, tick.volume, tick.tick_type)
+        )
+
+    def on_bidask(self, quote):
+        if quote.code in self.entries:
+            self.quotes[quote.code] = (quote.bid_price[0], quote.ask_price[0])
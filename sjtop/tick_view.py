@@ -1,103 +1,345 @@
-import asyncio
-import pandas as pd
+from array import array
+from datetime import time
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
 
+import numpy as np
 from rich import box
 from rich.text import Text
 import shioaji as sj
+from textual import events
 from textual.widget import Widget
-from textual.widgets import ScrollView
 from rich.table import Table
 
+from sjtop.price import QuotePrices
+from sjtop.protocol import to_us
+from sjtop.scheduler import RenderScheduler
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# time, bid, deal, ask, volume, deal color
+TickRow = Tuple[str, str, str, str, str, str]
+
+# bid / ask of the ticks that came before the first quote
+NO_PRICE = np.iinfo(np.int32).min
+DAY_US = 86_400_000_000
+
+
+def time_text(us: int) -> str:
+    seconds, us = divmod(us % DAY_US, 1_000_000)
+    minutes, second = divmod(seconds, 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:{second:02d}.{us // 1000:03d}"
+
+
+def parse_time(text: str) -> Optional[time]:
+    """`HH:MM[:SS]`, or the same digits without the colons."""
+    if ":" not in text and len(text) in (4, 6):
+        text = ":".join(text[i : i + 2] for i in range(0, len(text), 2))
+    try:
+        return time.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+class TickTape:
+    """Every trade of a session in append-only columns, oldest first.
+
+    Prices are `PriceScale` integers of the viewed contract, `ts` is in
+    microseconds since the epoch; a tick takes 25 bytes. Columns double
+    when full, so an append is a few scalar writes.
+    """
+
+    fields = {
+        "ts": np.int64,
+        "bid": np.int32,
+        "close": np.int32,
+        "ask": np.int32,
+        "volume": np.int32,
+        # the deal took the ask
+        "buy": np.bool_,
+    }
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.size = 0
+        self.capacity = capacity
+        for field, dtype in self.fields.items():
+            setattr(self, field, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, field).nbytes for field in self.fields)
+
+    def columns(self) -> List[np.ndarray]:
+        return [getattr(self, field) for field in self.fields]
+
+    def resize(self, capacity: int):
+        for field, dtype in self.fields.items():
+            arr = np.zeros(capacity, dtype=dtype)
+            arr[: self.size] = getattr(self, field)[: self.size]
+            setattr(self, field, arr)
+        self.capacity = capacity
+
+    def clear(self):
+        self.size = 0
+
+    def append(self, ts: int, bid: int, close: int, ask: int, volume: int, buy: bool):
+        row = self.size
+        if row == self.capacity:
+            self.resize(self.capacity * 2)
+        self.ts[row] = ts
+        self.bid[row] = bid
+        self.close[row] = close
+        self.ask[row] = ask
+        self.volume[row] = volume
+        self.buy[row] = buy
+        self.size = row + 1
+
+    def extend(self, *columns: np.ndarray):
+        """Append whole columns, in the order of `fields`."""
+        n = len(columns[0])
+        end = self.size + n
+        if end > self.capacity:
+            self.resize(max(self.capacity * 2, end))
+        for arr, values in zip(self.columns(), columns):
+            arr[self.size : end] = values
+        self.size = end
+
+    def index_at(self, us: int) -> int:
+        """Row of the last tick at or before `us`, -1 if none."""
+        return int(np.searchsorted(self.ts[: self.size], us, side="right")) - 1
+
 
 class TickViewer(Widget):
-    def __init__(self, name: str, contract: sj.contracts.Contract) -> None:
+    """Scrollable tape of the shown contract, the newest tick on top.
+
+    Only the rows in the viewport are formatted. `offset` counts the ticks
+    above it; while scrolled back, new ticks push it up so the shown rows
+    stay put.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        contract: sj.contracts.Contract,
+        scheduler: RenderScheduler,
+        prices: Optional[QuotePrices] = None,
+    ) -> None:
         self.contract = contract
-        self.table = Table(
-            show_header=True,
-            show_edge=False,
-            pad_edge=False,
-            box=box.MINIMAL,
-        )
-        self.ask_price = None
-        self.bid_price = None
+        self.scheduler = scheduler
+        self.prices = prices or QuotePrices()
+        self.set_scale()
+        self.bid_price: Optional[int] = None
+        self.ask_price: Optional[int] = None
         self.cols = ["Time", "Bid", "Deal", "Ask", "Vol"]
         self.n = 15
-        for col in self.cols:
-            self.table.add_column(col)
-        self.loop = asyncio.get_event_loop()
+        self.offset = 0
+        self.modify = False
+        self.tape = TickTape()
+        # ticks of a history download, shown once it completes
+        self.history: Optional[TickTape] = None
+        self.table = self.build_table()
         super().__init__(name=name)
 
-    def on_mount(self):
-        self.loop = asyncio.get_event_loop()
+    def set_scale(self):
+        self.scale = self.prices.scale(self.contract.code)
+
+    def changed(self):
+        self.modify = True
+        self.scheduler.mark_dirty(self)
+
+    def set_depth(self, n: int):
+        n = max(n, 1)
+        if n != self.n:
+            self.n = n
+            self.offset = min(self.offset, self.last_offset())
+            self.changed()
+
+    async def on_resize(self, event: events.Resize) -> None:
+        # header line and the header separator of box.MINIMAL
+        self.set_depth(event.height - 2)
+        await super().on_resize(event)
 
-    def change_contract(self, contract: sj.contracts.Contract, df_tick: pd.DataFrame):
+    def to_int(self, price) -> int:
+        return NO_PRICE if price is None else self.scale.to_int(price)
+
+    def change_contract(self, contract: sj.contracts.Contract, ticks: Iterable):
+        """Show `ticks` (oldest first, rows like `TickRecord`) of `contract`."""
         self.contract = contract
-        for col in self.table.columns:
-            col._cells = []
-        self.table.rows = []
-        for i in range(self.n):
-            row = df_tick.loc[i]
-            row_color = "red" if row.close > row.bid_price else "green"
-            self.table.add_row(
-                *[
-                    Text(row.datetime.strftime("%H:%M:%S.%f")[:-3]),
-                    Text(str(row.bid_price), style="green"),
-                    Text(str(row.close), style=row_color),
-                    Text(str(row.ask_price), style="red"),
-                    Text(str(row.volume), style=row_color),
-                ]
+        self.set_scale()
+        self.bid_price = self.ask_price = None
+        self.tape.clear()
+        self.history = None
+        self.offset = 0
+        for row in ticks:
+            bid, close = self.to_int(row.bid_price), self.to_int(row.close)
+            self.tape.append(
+                to_us(row.datetime),
+                bid,
+                close,
+                self.to_int(row.ask_price),
+                row.volume,
+                close > bid,
             )
+        self.changed()
 
-        self.modify = True
-        self.loop.call_soon_threadsafe(self.refresh)
-
-    def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1):
-        row_color = "red" if tick.tick_type == 1 else "green"
-        self.table.rows = self.table.rows[::-1]
-        for col in self.table.columns:
-            col._cells = col._cells[::-1]
-        self.table.add_row(
-            *[
-                Text(tick.datetime.strftime("%H:%M:%S.%f")[:-3]),
-                Text(str(self.bid_price), style="green"),
-                Text(str(tick.close), style=row_color),
-                Text(str(self.ask_price), style="red"),
-                Text(str(tick.volume), style=row_color),
-            ]
+    def on_trade(self, tick, close: int):
+        self.tape.append(
+            to_us(tick.datetime),
+            NO_PRICE if self.bid_price is None else self.bid_price,
+            close,
+            NO_PRICE if self.ask_price is None else self.ask_price,
+            tick.volume,
+            tick.tick_type == 1,
         )
-        self.table.rows = self.table.rows[::-1][: self.n]
-        for col in self.table.columns:
-            col._cells = col._cells[::-1][: self.n]
-        self.modify = True
-        self.loop.call_soon_threadsafe(self.refresh)
-
-    def on_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1):
-        row_color = "red" if tick.tick_type == 1 else "green"
-        self.table.rows = self.table.rows[::-1]
-        for col in self.table.columns:
-            col._cells = col._cells[::-1]
-        self.table.add_row(
-            *[
-                Text(tick.datetime.strftime("%H:%M:%S.%f")[:-3]),
-                Text(str(self.bid_price), style="green"),
-                Text(str(tick.close), style=row_color),
-                Text(str(self.ask_price), style="red"),
-                Text(str(tick.volume), style=row_color),
-            ]
+        if self.offset:
+            self.offset += 1
+        self.changed()
+
+    def on_fop_v1_tick(self, exchange: sj.Exchange, tick: sj.TickFOPv1, close: int):
+        self.on_trade(tick, close)
+
+    def on_stk_v1_tick(self, exchange: sj.Exchange, tick: sj.TickSTKv1, close: int):
+        self.on_trade(tick, close)
+
+    def on_touch(self, bids: array, asks: array):
+        """Keep the best bid / ask for the next ticks."""
+        self.bid_price, self.ask_price = bids[0], asks[0]
+
+    def on_fop_v1_bidask(
+        self, exchange: sj.Exchange, quote: sj.BidAskFOPv1, bids: array, asks: array
+    ):
+        self.on_touch(bids, asks)
+
+    def on_stk_v1_bidask(
+        self, exchange: sj.Exchange, quote: sj.BidAskSTKv1, bids: array, asks: array
+    ):
+        self.on_touch(bids, asks)
+
+    def begin_history(self):
+        self.history = TickTape()
+
+    def add_history(self, ticks: "pd.DataFrame"):
+        """Add a chunk of `api.ticks` columns with `datetime`, oldest first."""
+        if self.history is None:
+            return
+        factor = self.scale.factor
+        self.history.extend(
+            ticks["datetime"].values.astype("datetime64[us]").view("i8"),
+            np.rint(ticks["bid_price"].values * factor),
+            np.rint(ticks["close"].values * factor),
+            np.rint(ticks["ask_price"].values * factor),
+            ticks["volume"].values,
+            ticks["tick_type"].values == 1,
         )
-        self.table.rows = self.table.rows[::-1][: self.n]
-        for col in self.table.columns:
-            col._cells = col._cells[::-1][: self.n]
-        self.modify = True
-        self.loop.call_soon_threadsafe(self.refresh)
 
-    def on_fop_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskFOPv1):
-        self.ask_price = quote.ask_price[0]
-        self.bid_price = quote.bid_price[0]
+    def end_history(self):
+        """Show the history ticks, followed by the ones streamed past them."""
+        history, self.history = self.history, None
+        if history is None:
+            return
+        tape = self.tape
+        last = history.ts[history.size - 1] if history.size else -1
+        start = tape.index_at(last) + 1
+        history.extend(*(arr[start : tape.size] for arr in tape.columns()))
+        # the newest ticks are the same, the same offset shows the same rows
+        self.tape = history
+        self.offset = min(self.offset, self.last_offset())
+        self.changed()
+
+    def last_offset(self) -> int:
+        return max(len(self.tape) - self.n, 0)
+
+    def scroll(self, rows: int):
+        """Move the viewport `rows` ticks back in time, forward if negative."""
+        offset = min(max(self.offset + rows, 0), self.last_offset())
+        if offset != self.offset:
+            self.offset = offset
+            self.changed()
+
+    def page(self, pages: int):
+        self.scroll(pages * self.n)
 
-    def on_stk_v1_bidask(self, exchange: sj.Exchange, quote: sj.BidAskSTKv1):
-        self.ask_price = quote.ask_price[0]
-        self.bid_price = quote.bid_price[0]
+    def follow(self):
+        """Back to the newest ticks."""
+        self.scroll(-self.offset)
+
+    def oldest(self):
+        self.scroll(self.last_offset() - self.offset)
+
+    def jump(self, at: time):
+        """Put the last tick at or before `at` on top of the viewport.
+
+        The time is taken in the 24 hours before the newest tick, night
+        session ticks before midnight included.
+        """
+        tape = self.tape
+        if not tape.size:
+            return
+        newest = int(tape.ts[tape.size - 1])
+        us = newest - newest % DAY_US
+        us += ((at.hour * 60 + at.minute) * 60 + at.second) * 1_000_000
+        us += at.microsecond
+        if us > newest:
+            us -= DAY_US
+        row = max(tape.index_at(us), 0)
+        self.scroll(tape.size - 1 - row - self.offset)
+
+    async def on_mouse_scroll_up(self, event: events.MouseScrollUp) -> None:
+        self.scroll(-1)
+
+    async def on_mouse_scroll_down(self, event: events.MouseScrollDown) -> None:
+        self.scroll(1)
+
+    @property
+    def rows(self) -> List[TickRow]:
+        """Texts of the ticks in the viewport, newest first."""
+        tape, scale = self.tape, self.scale
+        top = tape.size - self.offset
+        start = max(top - self.n, 0)
+        text = scale.text
+        rows = []
+        for ts, bid, close, ask, volume, buy in zip(
+            *(arr[start:top][::-1].tolist() for arr in tape.columns())
+        ):
+            rows.append(
+                (
+                    time_text(ts),
+                    str(None) if bid == NO_PRICE else text(bid),
+                    text(close),
+                    str(None) if ask == NO_PRICE else text(ask),
+                    str(volume),
+                    "red" if buy else "green",
+                )
+            )
+        return rows
+
+    def build_table(self) -> Table:
+        table = Table(
+            show_header=True,
+            show_edge=False,
+            pad_edge=False,
+            box=box.MINIMAL,
+        )
+        for col in self.cols:
+            table.add_column(col)
+        if self.offset:
+            # newer ticks above the viewport
+            table.columns[0].header = f"Time +{self.offset}"
+        for time_, bid, deal, ask, volume, row_color in self.rows:
+            table.add_row(
+                Text(time_),
+                Text(bid, style="green"),
+                Text(deal, style=row_color),
+                Text(ask, style="red"),
+                Text(volume, style=row_color),
+            )
+        return table
 
     def render(self):
+        if self.modify:
+            self.modify = False
+            self.table = self.build_table()
         return self.table
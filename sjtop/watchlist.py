@@ -0,0 +1,185 @@
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import shioaji as sj
+from rich import box
+from rich.table import Table
+from rich.text import Text
+from textual import events
+from textual.widget import Widget
+
+from sjtop.price import QuotePrices
+from sjtop.scheduler import RenderScheduler
+
+
+class WatchlistStore:
+    """Columnar per-contract quote state, one slot per code.
+
+    A tick or bid/ask quote writes a handful of scalars into the slot of its
+    code, so updating a row costs the same for 3 or 3000 contracts. Prices
+    are the integers of each code's `PriceScale` in `prices`.
+    """
+
+    fields = {
+        "close": np.int64,
+        "change": np.int64,
+        "pct_chg": np.float64,
+        "volume": np.int64,
+        "bid": np.int64,
+        "ask": np.int64,
+    }
+
+    def __init__(
+        self,
+        codes: Iterable[str] = (),
+        capacity: int = 64,
+        prices: Optional[QuotePrices] = None,
+    ) -> None:
+        self.prices = prices or QuotePrices()
+        self.codes: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.capacity = capacity
+        for field, dtype in self.fields.items():
+            setattr(self, field, np.zeros(capacity, dtype=dtype))
+        for code in codes:
+            self.add(code)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def columns(self) -> List[np.ndarray]:
+        return [getattr(self, field) for field in self.fields]
+
+    def resize(self, capacity: int):
+        n = len(self.codes)
+        for field, dtype in self.fields.items():
+            arr = np.zeros(capacity, dtype=dtype)
+            arr[:n] = getattr(self, field)[:n]
+            setattr(self, field, arr)
+        self.capacity = capacity
+
+    def add(self, code: str) -> int:
+        if code in self.index:
+            return self.index[code]
+        if len(self.codes) == self.capacity:
+            self.resize(self.capacity * 2)
+        row = len(self.codes)
+        self.codes.append(code)
+        self.index[code] = row
+        for arr in self.columns():
+            arr[row] = 0
+        return row
+
+    def remove(self, code: str):
+        row = self.index.pop(code)
+        del self.codes[row]
+        for arr in self.columns():
+            arr[row:-1] = arr[row + 1 :]
+        for i, c in enumerate(self.codes[row:], row):
+            self.index[c] = i
+
+    def on_tick(self, tick, close: int) -> int:
+        row = self.index.get(tick.code, -1)
+        if row < 0:
+            return row
+        self.close[row] = close
+        self.change[row] = self.prices.scale(tick.code).to_int(tick.price_chg)
+        self.pct_chg[row] = tick.pct_chg
+        self.volume[row] = tick.total_volume
+        return row
+
+    def on_bidask(self, quote, bids: array, asks: array) -> int:
+        row = self.index.get(quote.code, -1)
+        if row < 0:
+            return row
+        self.bid[row] = bids[0]
+        self.ask[row] = asks[0]
+        return row
+
+
+class Watchlist(Widget):
+    def __init__(
+        self,
+        name: str,
+        codes: Iterable[str],
+        scheduler: RenderScheduler,
+        prices: Optional[QuotePrices] = None,
+    ) -> None:
+        self.store = WatchlistStore(codes, prices=prices)
+        self.scheduler = scheduler
+        self.offset = 0
+        self.n = 10
+        self.cols = ["Code", "Last", "Chg", "Chg%", "Volume", "Bid", "Ask"]
+        super().__init__(name=name)
+
+    @property
+    def codes(self) -> List[str]:
+        return self.store.codes
+
+    def add(self, code: str):
+        self.store.add(code)
+        self.scheduler.mark_dirty(self)
+
+    def remove(self, code: str):
+        self.store.remove(code)
+        self.offset = min(self.offset, max(len(self.store) - self.n, 0))
+        self.scheduler.mark_dirty(self)
+
+    def is_visible(self, row: int) -> bool:
+        return self.offset <= row < self.offset + self.n
+
+    def on_tick(self, exchange: sj.Exchange, tick, close: int):
+        if self.is_visible(self.store.on_tick(tick, close)):
+            self.scheduler.mark_dirty(self)
+
+    def on_bidask(self, exchange: sj.Exchange, quote, bids: array, asks: array):
+        if self.is_visible(self.store.on_bidask(quote, bids, asks)):
+            self.scheduler.mark_dirty(self)
+
+    def scroll(self, rows: int):
+        offset = min(max(self.offset + rows, 0), max(len(self.store) - self.n, 0))
+        if offset != self.offset:
+            self.offset = offset
+            self.scheduler.mark_dirty(self)
+
+    async def on_resize(self, event: events.Resize) -> None:
+        # header line and the header separator of box.MINIMAL
+        self.n = max(event.height - 2, 1)
+        await super().on_resize(event)
+
+    async def on_mouse_scroll_up(self, event: events.MouseScrollUp) -> None:
+        self.scroll(-1)
+
+    async def on_mouse_scroll_down(self, event: events.MouseScrollDown) -> None:
+        self.scroll(1)
+
+    def render(self):
+        store = self.store
+        table = Table(
+            show_header=True,
+            show_edge=False,
+            pad_edge=False,
+            box=box.MINIMAL,
+            expand=True,
+        )
+        for col in self.cols:
+            table.add_column(col, justify="left" if col == "Code" else "right")
+        for row in range(self.offset, min(self.offset + self.n, len(store))):
+            code = store.codes[row]
+            text = store.prices.scale(code).text
+            change = int(store.change[row])
+            row_color = "red" if change > 0 else "green" if change < 0 else ""
+            table.add_row(
+                Text(code),
+                Text(text(int(store.close[row])), style=row_color),
+                Text(("+" if change >= 0 else "") + text(change), style=row_color),
+                Text(f"{store.pct_chg[row]:+.2f}%", style=row_color),
+                Text(str(store.volume[row])),
+                Text(text(int(store.bid[row])), style="green"),
+                Text(text(int(store.ask[row])), style="red"),
+            )
+        return table
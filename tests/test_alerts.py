@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from sjtop.alerts import (
+    ANY,
+    MEAN_VOLUME,
+    ONE,
+    TICK,
+    AlertEngine,
+    AlertLog,
+    parse_rule,
+)
+from sjtop.price import QuotePrices, to_int
+
+START = datetime(2021, 10, 4, 9)
+
+
+def tick(seconds: float, close: str, volume: int = 1, code="TXFJ1"):
+    return SimpleNamespace(
+        code=code,
+        datetime=START + timedelta(seconds=seconds),
+        close=Decimal(close),
+        volume=volume,
+    )
+
+
+def bidask(seconds: float, bids, asks, code="TXFJ1"):
+    return SimpleNamespace(
+        code=code,
+        datetime=START + timedelta(seconds=seconds),
+        bid_price=[Decimal(price) for price in bids],
+        ask_price=[Decimal(price) for price in asks],
+    )
+
+
+def on_tick(alerts: AlertEngine, tick):
+    alerts.on_tick(tick, to_int(tick.close))
+
+
+def on_bidask(alerts: AlertEngine, quote):
+    alerts.on_bidask(quote, *QuotePrices().book(quote))
+
+
+def engine(*rules, **kwargs) -> AlertEngine:
+    engine = AlertEngine(asyncio.get_event_loop(), rules, **kwargs)
+    engine.track("TXFJ1")
+    return engine
+
+
+def test_parse_rule():
+    rule = parse_rule({"code": "TXFJ1", "when": "close >= 17000.5"})
+    assert (rule.code, rule.op, rule.coef, rule.column) == ("TXFJ1", ">=", 17000.5, ONE)
+    rule = parse_rule({"when": "volume > 5 * mean_volume", "cooldown": 5})
+    assert (rule.code, rule.coef, rule.column, rule.cooldown) == (
+        ANY,
+        5.0,
+        MEAN_VOLUME,
+        5.0,
+    )
+    assert parse_rule({"when": "spread > 2 ticks"})[4:6] == (2.0, TICK)
+    assert parse_rule({"when": "close<bid", "name": "below"}).label == "below"
+    for when in ("close >> 1", "price > 1", "close > 2 * price", ""):
+        with pytest.raises(ValueError):
+            parse_rule({"when": when})
+
+
+def test_fires_on_the_edge_only():
+    alerts = engine({"when": "close > 100", "cooldown": 0})
+    for seconds, close in enumerate(("99", "101", "102")):
+        on_tick(alerts, tick(seconds, close))
+        fired = alerts.evaluate()
+        assert len(fired) == (seconds == 1)
+    assert fired == [] and alerts.active.tolist() == [True]
+    on_tick(alerts, tick(3, "100"))
+    alerts.evaluate()
+    on_tick(alerts, tick(4, "101"))
+    [alert] = alerts.evaluate()
+    assert (alert.code, alert.value, alert.text) == (
+        "TXFJ1",
+        101.0,
+        "TXFJ1 close > 100 (101)",
+    )
+
+
+def test_cooldown_in_quote_time():
+    alerts = engine({"when": "close > 100", "cooldown": 10})
+    for seconds, close, fires in ((0, "101", 1), (1, "99", 0), (2, "101", 0)):
+        on_tick(alerts, tick(seconds, close))
+        assert len(alerts.evaluate()) == fires
+    # still true after the cooldown, no new edge
+    on_tick(alerts, tick(20, "101"))
+    assert alerts.evaluate() == []
+    on_tick(alerts, tick(21, "99"))
+    on_tick(alerts, tick(22, "101"))
+    # the dip and the cross in one batch: the high is 101, the rule was true
+    assert alerts.evaluate() == []
+
+
+def test_a_cross_inside_a_batch_fires():
+    alerts = engine({"when": "close < 100"})
+    for seconds, close in enumerate(("101", "99", "101")):
+        on_tick(alerts, tick(seconds, close))
+    [alert] = alerts.evaluate()
+    assert alert.value == 99.0
+
+
+def test_volume_against_its_mean():
+    alerts = engine({"when": "volume > 3 * mean_volume"}, window=4)
+    for seconds in range(4):
+        on_tick(alerts, tick(seconds, "100", volume=2))
+    assert alerts.evaluate() == []
+    on_tick(alerts, tick(4, "100", volume=7))
+    assert len(alerts.evaluate()) == 1
+    assert alerts.last[0][MEAN_VOLUME] == 2.0
+    assert alerts.volume_sums[0] == 2 * 3 + 7
+
+
+def test_spread_in_ticks():
+    alerts = engine({"when": "spread > 2 ticks"})
+    on_bidask(alerts, bidask(0, ["100", "99.5", "99"], ["100.5", "101", "101.5"]))
+    assert alerts.evaluate() == []
+    on_bidask(alerts, bidask(1, ["100", "99.5", "99"], ["101.5", "102", "102.5"]))
+    [alert] = alerts.evaluate()
+    assert alert.value == 1.5
+    # no bid, no spread
+    on_bidask(alerts, bidask(2, ["0", "0"], ["101", "101.5"]))
+    assert alerts.evaluate() == [] and alerts.active.tolist() == [False]
+
+
+def test_wildcard_rules_per_contract():
+    rules = [{"when": "close > 100"}, {"code": "2330", "when": "close < 500"}]
+    alerts = engine(*rules, cooldown=0)
+    alerts.track("2330")
+    assert len(alerts) == 3 and alerts.watched_codes == ["2330"]
+    on_tick(alerts, tick(0, "101"))
+    on_tick(alerts, tick(0, "499", code="2330"))
+    fired = alerts.evaluate()
+    assert [(alert.code, alert.rule.when) for alert in fired] == [
+        ("TXFJ1", "close > 100"),
+        ("2330", "close > 100"),
+        ("2330", "close < 500"),
+    ]
+    # untracking rearms the rules of the contract
+    alerts.untrack("2330")
+    on_tick(alerts, tick(1, "99"))
+    alerts.evaluate()
+    assert alerts.active.tolist() == [False, False, False]
+    on_tick(alerts, tick(2, "499", code="2330"))
+    assert len(alerts.evaluate()) == 2
+
+
+def test_evaluation_is_batched():
+    loop = asyncio.get_event_loop()
+    fired = []
+    alerts = engine({"when": "close > 100"}, on_alert=fired.append)
+    for seconds in range(3):
+        on_tick(alerts, tick(seconds, "101"))
+    loop.run_until_complete(asyncio.sleep(0))
+    assert alerts.evaluations == 1 and len(fired) == 1
+
+
+def test_alert_log(tmp_path: Path):
+    alerts = engine({"when": "close > 100"})
+    on_tick(alerts, tick(1.5, "101"))
+    log = AlertLog(tmp_path / "logs" / "alerts.log")
+    for alert in alerts.evaluate():
+        log.write(alert)
+    log.close()
+    assert (tmp_path / "logs" / "alerts.log").read_text() == (
+        "2021-10-04T09:00:01.500 TXFJ1 close > 100 101\n"
+    )
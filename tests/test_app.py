@@ -1,9 +1,59 @@
-from datetime import date
+import asyncio
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
 from freezegun.api import FrozenDateTimeFactory
+import pandas as pd
 import pytest
-from shioaji.contracts import Future
+from pytest_mock import MockerFixture
+from shioaji.constant import Exchange, OptionRight
+from shioaji.contracts import Future, Option
+from textual import events
 from textual.app import App
+from textual.layouts.dock import Dock
+from sjtop.alerts import AlertEngine, AlertLog
 from sjtop.app import SJTop
+from sjtop.flow import TradeFlows
+from sjtop.ingest import QuoteIngest
+from sjtop.metrics import Metrics
+from sjtop.options import OptionChainView
+from sjtop.price import QuotePrices
+from sjtop.side import ContractsTree
+from sjtop.spreads import SpreadPanel, parse_spread
+from sjtop.startup import PhaseTimer
+from sjtop.tick_cache import TickCache, TickRecord
+from sjtop.watchlist import Watchlist
+
+
+@pytest.fixture
+def sjtop(mocker: MockerFixture) -> SJTop:
+    """An `SJTop` holding the state `on_mount` builds, its widgets mocked."""
+    app = SJTop()
+    app.loop = asyncio.get_event_loop()
+    app.config = {}
+    app.timer = PhaseTimer()
+    app.api = mocker.MagicMock()
+    app.contract = Future(code="TXFJ1")
+    app.subscribed = set()
+    app.tick_cache = TickCache()
+    app.prices = QuotePrices()
+    app.flows = TradeFlows(prices=app.prices)
+    app.alerts = AlertEngine(app.loop)
+    app.alert_log = None
+    app.metrics = Metrics(enabled=False)
+    app.switching = None
+    app.loading = None
+    app.prompt = None
+    app.journal = None
+    app.history = None
+    app.status_panel = mocker.MagicMock()
+    app.watchlist = Watchlist("watchlist", [], mocker.MagicMock(), app.prices)
+    app.spreads = SpreadPanel("spreads", [], mocker.MagicMock(), prices=app.prices)
+    app.option_chain = OptionChainView("chain", mocker.MagicMock())
+    app.option_chain.visible = False
+    for name in ("dashbaord", "tick_viewer", "chart", "flow_panel", "heatmap"):
+        setattr(app, name, mocker.MagicMock())
+    return app
 
 
 def test_app():
@@ -12,10 +62,303 @@ def test_app():
 
 
 @pytest.mark.freeze_time("2021-09-30 17:00:00")
-def test_app_get_current_date(freezer: FrozenDateTimeFactory):
-    sjtop = SJTop()
+def test_app_get_current_date(sjtop: SJTop, freezer: FrozenDateTimeFactory):
     query_date = sjtop.get_current_date(Future(code="TXFR1"))
     assert query_date == date(2021, 10, 1)
     freezer.move_to("2021-09-30 00:00:00")
     query_date = sjtop.get_current_date(Future(code="TXFR1"))
     assert query_date == date(2021, 9, 30)
+
+
+def test_app_dispatch_routes_by_contract(sjtop: SJTop, mocker: MockerFixture):
+    sjtop.metrics = Metrics(sample_every=1)
+    sjtop.watchlist = mocker.MagicMock()
+    sjtop.option_chain = mocker.MagicMock()
+    sjtop.spreads = mocker.MagicMock()
+    other = mocker.MagicMock(code="MXFJ1", close=Decimal("16400"))
+    sjtop.dispatch_fop_v1_tick(Exchange.TAIFEX, other)
+    sjtop.watchlist.on_tick.assert_called_once_with(Exchange.TAIFEX, other, 1640000)
+    sjtop.spreads.on_tick.assert_called_once_with(Exchange.TAIFEX, other, 1640000)
+    sjtop.option_chain.on_fop_v1_tick.assert_called_once_with(Exchange.TAIFEX, other)
+    sjtop.dashbaord.on_fop_v1_tick.assert_not_called()
+    current = mocker.MagicMock(
+        code="TXFJ1", bid_price=[Decimal("16399")], ask_price=[Decimal("16400")]
+    )
+    sjtop.dispatch_fop_v1_bidask(Exchange.TAIFEX, current)
+    bids, asks = sjtop.prices.book(current)
+    assert (bids[0], asks[0]) == (1639900, 1640000)
+    for widget in (sjtop.dashbaord, sjtop.tick_viewer, sjtop.heatmap):
+        widget.on_fop_v1_bidask.assert_called_once_with(
+            Exchange.TAIFEX, current, bids, asks
+        )
+    assert sorted(sjtop.metrics.callbacks) == [
+        "dispatch_fop_v1_bidask",
+        "dispatch_fop_v1_tick",
+    ]
+
+
+def test_app_counts_quotes_on_the_loop(sjtop: SJTop, mocker: MockerFixture):
+    sjtop.metrics = Metrics(sample_every=1)
+    sjtop.ingest = QuoteIngest(sjtop.loop)
+    tick = mocker.MagicMock(code="MXFJ1", close=Decimal("16400"))
+    callback = threading.Thread(
+        target=sjtop.on_fop_v1_tick, args=(Exchange.TAIFEX, tick)
+    )
+    callback.start()
+    callback.join()
+    # shioaji's thread only queued the quote
+    assert not sjtop.metrics.messages
+    assert sjtop.metrics.calls == 0
+    sjtop.loop.run_until_complete(asyncio.sleep(0))
+    assert sjtop.metrics.messages == {"MXFJ1": 1}
+    assert list(sjtop.metrics.callbacks) == ["dispatch_fop_v1_tick"]
+
+
+def test_app_start_session_with_replay(sjtop: SJTop, tmp_path, mocker: MockerFixture):
+    pd.DataFrame(
+        {
+            "ts": [pd.Timestamp("2021-10-04 09:00:00").value],
+            "close": [16400],
+            "volume": [1],
+            "bid_price": [16399],
+            "bid_volume": [2],
+            "ask_price": [16400],
+            "ask_volume": [3],
+            "tick_type": [1],
+        }
+    ).to_csv(tmp_path / "TXFJ1.csv", index=False)
+    sjtop.config = {"replay": {"path": str(tmp_path), "speed": None}}
+    sjtop.contract = None
+    sjtop.alerts = AlertEngine(sjtop.loop, [{"code": "TXFJ1", "when": "close > 1"}])
+    sjtop.tree = ContractsTree(None, "contracts")
+    sjtop.watchlist = Watchlist("watchlist", ["TXFJ1", "2330"], mocker.MagicMock())
+    sjtop.spreads = SpreadPanel(
+        "spreads",
+        [parse_spread({"legs": "TXFJ1 - TXFJ1.underlying - TXFK1"})],
+        mocker.MagicMock(),
+    )
+    mocker.patch("sjtop.replay.ReplayQuote.start")
+    sjtop.loop.run_until_complete(sjtop.start_session())
+    assert sjtop.contract.code == "TXFJ1"
+    assert sjtop.subscribed == {"TXFJ1"}
+    assert [n.label for n in sjtop.tree.root.children] == [
+        "Indexs",
+        "Stocks",
+        "Futures",
+        "Options",
+    ]
+    sjtop.dashbaord.change_contract.assert_called_once_with(sjtop.contract)
+    # nothing played yet
+    assert list(sjtop.tick_viewer.change_contract.call_args[0][1]) == []
+    assert "TXFJ1" in sjtop.tick_cache
+    assert sjtop.alerts.codes == ["TXFJ1"]
+    # TXFK1 is not in the replay files
+    assert sjtop.spreads.codes == ["TXFJ1", "TXFK1"]
+    assert list(sjtop.timer.phases) == ["replay", "login", "tree", "ticks"]
+    assert sjtop.status_panel.fit.call_args[0][0].startswith("Ready in ")
+
+
+def test_app_switch_contract(sjtop: SJTop, mocker: MockerFixture):
+    sjtop.tick_cache = TickCache(capacity=1)
+    sjtop.tick_cache.put("TXFJ1", [])
+    sjtop.subscribed = {"TXFJ1"}
+    record = TickRecord(datetime(2021, 10, 4, 9), 16399, 16400, 16400, 1)
+    fetch = mocker.patch.object(sjtop, "fetch_ticks", return_value=[record])
+    mxf, txo = Future(code="MXFJ1"), Future(code="TXO16400J1")
+    mocker.patch.object(sjtop, "find_contract", return_value=sjtop.contract)
+
+    async def clicks():
+        sjtop.change_contract(mxf)
+        superseded = sjtop.switching
+        sjtop.change_contract(txo)
+        await asyncio.sleep(0)
+        assert superseded.cancelled()
+        await sjtop.switching
+
+    sjtop.loop.run_until_complete(clicks())
+    assert sjtop.contract is txo
+    sjtop.tick_viewer.change_contract.assert_called_once()
+    assert list(sjtop.tick_viewer.change_contract.call_args[0][1]) == [record]
+    assert list(sjtop.chart.change_contract.call_args[0][1]) == [record]
+    assert list(sjtop.flows.flows) == ["TXO16400J1"]
+    assert len(sjtop.flows.get("TXO16400J1")["100t"]) == 1
+    # MXFJ1 was never cached, TXFJ1 evicted and unsubscribed
+    assert list(sjtop.tick_cache.entries) == ["TXO16400J1"]
+    assert sjtop.subscribed == {"TXO16400J1"}
+
+    fetch.reset_mock()
+    sjtop.change_contract(Future(code="TXO16400J1"))
+    sjtop.loop.run_until_complete(sjtop.switching)
+    fetch.assert_not_called()
+
+
+def test_app_release_keeps_pinned_codes(sjtop: SJTop, mocker: MockerFixture):
+    sjtop.watchlist = Watchlist("watchlist", ["2330"], mocker.MagicMock())
+    sjtop.alerts = AlertEngine(
+        asyncio.get_event_loop(), [{"code": "MXFJ1", "when": "close > 1"}]
+    )
+    sjtop.spreads = SpreadPanel(
+        "spreads", [parse_spread({"legs": "TXFJ1 - TXFK1"})], mocker.MagicMock()
+    )
+    sjtop.option_chain = mocker.MagicMock(visible=True, codes=["TXO16400J1"])
+    mocker.patch.object(
+        sjtop, "find_contract", side_effect=lambda code: Future(code=code)
+    )
+    unsubscribe = mocker.patch.object(sjtop, "unsubscribe")
+    for code in ("TXFJ1", "2330", "MXFJ1", "TXFK1", "TXO16400J1", "2317"):
+        sjtop.release(code)
+    assert [call[0][0].code for call in unsubscribe.call_args_list] == ["2317"]
+    # a closed chain pins nothing
+    sjtop.option_chain.visible = False
+    sjtop.release("TXO16400J1")
+    assert unsubscribe.call_args[0][0].code == "TXO16400J1"
+
+
+def test_app_goto_types_a_time(sjtop: SJTop):
+    pressed = []
+
+    async def press(key):
+        pressed.append(key)
+
+    sjtop.press = press
+
+    async def keys(*keys):
+        for key in keys:
+            await sjtop.on_key(events.Key(sjtop, key))
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(sjtop.action_goto())
+    loop.run_until_complete(keys("0", "9", "x", "1", "0", "ctrl+h", "5", "enter"))
+    sjtop.tick_viewer.jump.assert_called_once_with(time(9, 15))
+    assert sjtop.prompt is None
+    assert pressed == []
+    loop.run_until_complete(keys("g"))
+    assert pressed == ["g"]
+
+
+@pytest.mark.freeze_time("2021-10-05 01:00:00")
+def test_app_history_picks_a_day(sjtop: SJTop):
+    loaded = []
+
+    async def load_history(contract, day):
+        loaded.append((contract, day))
+
+    sjtop.load_history = load_history
+
+    async def keys(*keys):
+        for key in keys:
+            await sjtop.on_key(events.Key(sjtop, key))
+
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(sjtop.action_history())
+    loop.run_until_complete(keys(*"2021-10-01", "enter"))
+    loop.run_until_complete(sjtop.loading)
+    assert loaded == [(sjtop.contract, date(2021, 10, 1))]
+    loop.run_until_complete(sjtop.action_history())
+    loop.run_until_complete(keys(*"20211006", "enter"))
+    sjtop.status_panel.fit.assert_called_with("No history after 2021-10-05")
+    loop.run_until_complete(sjtop.action_history())
+    loop.run_until_complete(keys("enter"))
+    loop.run_until_complete(sjtop.loading)
+    # 09:00 in Taipei
+    assert loaded[-1] == (sjtop.contract, date(2021, 10, 5))
+
+
+def test_app_builds_panels_on_first_use(sjtop: SJTop, mocker: MockerFixture):
+    sjtop.scheduler = mocker.MagicMock()
+    sjtop.heatmap = None
+    sjtop.metrics_panel, sjtop.side = mocker.MagicMock(), mocker.MagicMock()
+    docks = [
+        Dock("right", [sjtop.metrics_panel]),
+        Dock("left", [sjtop.side]),
+        Dock("left", [sjtop.chart]),
+    ]
+    toggled = []
+
+    async def dock(widget, edge, size):
+        docks.append(Dock(edge, [widget]))
+
+    async def toggle(name):
+        toggled.append(name)
+
+    async def refresh_layout():
+        pass
+
+    view = mocker.MagicMock(
+        dock=dock, action_toggle=toggle, refresh_layout=refresh_layout
+    )
+    view.layout.docks = docks
+    mocker.patch.object(
+        SJTop, "view", new_callable=mocker.PropertyMock, return_value=view
+    )
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(sjtop.action_heatmap())
+    heatmap = sjtop.heatmap
+    assert heatmap.contract is sjtop.contract
+    # between the panels docked before and after it at mount
+    assert [d.widgets[0] for d in docks] == [
+        sjtop.metrics_panel,
+        heatmap,
+        sjtop.side,
+        sjtop.chart,
+    ]
+    loop.run_until_complete(sjtop.action_heatmap())
+    assert sjtop.heatmap is heatmap and len(docks) == 4
+    assert toggled == ["heatmap", "heatmap"]
+
+
+def test_app_shows_alerts(sjtop: SJTop, tmp_path, mocker: MockerFixture):
+    sjtop.alert_log = AlertLog(tmp_path / "alerts.log")
+    sjtop.alerts = AlertEngine(
+        asyncio.get_event_loop(),
+        [{"when": "close > 100", "name": "breakout"}],
+        on_alert=sjtop.on_alert,
+    )
+    sjtop.alerts.track("TXFJ1")
+    tick = mocker.MagicMock(
+        code="TXFJ1", datetime=datetime(2021, 10, 4, 9), close=101, volume=1
+    )
+    sjtop.alerts.on_tick(tick, sjtop.prices.trade(tick))
+    sjtop.alerts.evaluate()
+    sjtop.status_panel.fit.assert_called_once_with("Alert: TXFJ1 breakout (101)")
+    sjtop.alert_log.close()
+    assert (tmp_path / "alerts.log").read_text().endswith("TXFJ1 close > 100 101\n")
+
+
+def test_app_option_chain_subscribes_its_expiry(sjtop: SJTop, mocker: MockerFixture):
+    def option(strike, right, month):
+        return Option(
+            code=f"TXO{strike}{right.value}{month}",
+            category="TXO",
+            delivery_month=month,
+            delivery_date=f"2021/{month[-2:]}/20",
+            strike_price=strike,
+            option_right=right,
+        )
+
+    options = [
+        option(strike, right, month)
+        for month in ("202111", "202110")
+        for strike in (16400, 16300)
+        for right in (OptionRight.Call, OptionRight.Put)
+    ]
+    sjtop.api.Contracts.Options.get.return_value = options
+    toggled = []
+
+    async def toggle(name):
+        toggled.append(name)
+        sjtop.option_chain.visible = not sjtop.option_chain.visible
+
+    view = mocker.MagicMock(action_toggle=toggle)
+    mocker.patch.object(
+        SJTop, "view", new_callable=mocker.PropertyMock, return_value=view
+    )
+    sjtop.find_contract = {c.code: c for c in options}.get
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(sjtop.action_option_chain())
+    sjtop.api.Contracts.Options.get.assert_called_once_with("TXO")
+    assert sjtop.subscribed == {c.code for c in options[4:]}
+    assert list(sjtop.option_chain.chain.strikes) == [16300.0, 16400.0]
+    loop.run_until_complete(sjtop.action_option_chain())
+    assert sjtop.subscribed == set() and toggled == ["chain", "chain"]
+    assert len(sjtop.option_chain.chain) == 0
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import numpy as np
+
+from sjtop.candles import CandleBuffer, CandleSeries, seconds_of, timeframe_label
+
+
+def trades(n: int = 500, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    ts = np.cumsum(rng.integers(0, 3, n)) + seconds_of(datetime(2021, 10, 4, 9))
+    prices = 1640000 + np.cumsum(rng.integers(-2, 3, n)) * 100
+    volumes = rng.integers(1, 10, n)
+    return list(zip(ts.tolist(), prices.tolist(), volumes.tolist()))
+
+
+def bars(buffer: CandleBuffer):
+    return [tuple(bar) for bar in buffer.window(buffer.size).tolist()] + [
+        tuple(buffer.current)
+    ]
+
+
+def test_seconds_of():
+    assert (
+        seconds_of(datetime(2021, 10, 4, 9, 0, 5))
+        - seconds_of(datetime(2021, 10, 4, 8, 59, 55))
+        == 10
+    )
+    assert [timeframe_label(s) for s in (1, 5, 60, 300)] == ["1s", "5s", "1m", "5m"]
+
+
+def test_on_trade_updates_the_forming_bar():
+    buffer = CandleBuffer(5, size=4)
+    assert buffer.on_trade(100, 10, 1)
+    assert not buffer.on_trade(101, 12, 2)
+    assert not buffer.on_trade(104, 9, 1)
+    assert buffer.current == [100, 10, 12, 9, 9, 4]
+    assert len(buffer) == 0
+    assert buffer.on_trade(105, 11, 3)
+    # a late trade joins the forming bar
+    assert not buffer.on_trade(103, 13, 1)
+    assert buffer.current == [105, 11, 13, 11, 13, 4]
+    assert buffer.window(4).tolist() == [(100, 10, 12, 9, 9, 4)]
+
+
+def test_ring_keeps_the_newest_bars():
+    buffer = CandleBuffer(1, size=2)
+    for ts in range(5):
+        buffer.on_trade(ts, ts, 1)
+    assert buffer.closed == 4
+    assert len(buffer) == 2
+    assert buffer.window(5)["start"].tolist() == [2, 3]
+    assert buffer.window(1)["start"].tolist() == [3]
+
+
+def test_resample_matches_direct_aggregation():
+    base, direct = CandleBuffer(1, size=4096), CandleBuffer(60, size=64)
+    for trade in trades():
+        base.on_trade(*trade)
+        direct.on_trade(*trade)
+    resampled = CandleBuffer.resample(base, 60, size=64)
+    assert bars(resampled) == bars(direct)
+    assert resampled.closed == direct.closed
+    assert CandleBuffer.resample(CandleBuffer(1), 60).current is None
+
+
+def test_series_switches_timeframe_without_ticks():
+    series, direct = CandleSeries(), CandleBuffer(300)
+    history = trades(1000)
+    for trade in history[:600]:
+        series.on_trade(*trade)
+        direct.on_trade(*trade)
+    series.set_timeframe(300)
+    for trade in history[600:]:
+        series.on_trade(*trade)
+        direct.on_trade(*trade)
+    assert bars(series.view) == bars(direct)
+    series.set_timeframe(1)
+    assert series.view is series.base
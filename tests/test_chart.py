@@ -0,0 +1,110 @@
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from pytest_mock import MockerFixture
+from shioaji.constant import Exchange
+from shioaji.contracts import Future
+
+from sjtop.chart import CandleChart, column
+from sjtop.tick_cache import TickRecord
+
+
+def tick(second: int, close: str, volume: int = 1):
+    return SimpleNamespace(
+        code="TXFJ1",
+        datetime=datetime(2021, 10, 4, 9, 0, second),
+        close=Decimal(close),
+        volume=volume,
+    )
+
+
+def on_tick(chart: CandleChart, tick):
+    chart.on_fop_v1_tick(Exchange.TAIFEX, tick, chart.prices.trade(tick))
+
+
+@pytest.fixture
+def chart(mocker: MockerFixture):
+    contract = Future(code="TXFJ1")
+    chart = CandleChart("chart", contract, mocker.MagicMock())
+    history = [
+        TickRecord(datetime(2021, 10, 4, 9, 0, 0), 0, Decimal("16400"), 0, 1),
+        TickRecord(datetime(2021, 10, 4, 9, 0, 0), 0, Decimal("16404"), 0, 1),
+        TickRecord(datetime(2021, 10, 4, 9, 0, 1), 0, Decimal("16402"), 0, 2),
+    ]
+    chart.change_contract(contract, history)
+    return chart
+
+
+def test_column():
+    # open 4, high 8, low 0, close 2 on 5 rows from 8 down to 0
+    assert column([0, 4, 8, 0, 2, 1], 0, 8, 5) == ["│", "│", "┃", "┃", "│"]
+
+
+def test_change_contract_builds_bars(chart: CandleChart):
+    assert chart.series.view.closed == 1
+    assert chart.series.view.current == [
+        chart.series.view.current[0],
+        1640200,
+        1640200,
+        1640200,
+        1640200,
+        2,
+    ]
+    chart.scheduler.mark_dirty.assert_called_once_with(chart)
+
+
+def test_draw(chart: CandleChart):
+    lines = chart.draw(10, 4).renderables
+    assert lines[0].plain == "TXFJ1 1s  O 16402 H 16402 L 16402 C 16402 V 2"
+    assert [line.plain for line in lines[1:]] == ["┃ ", "┃┃", "┃ "]
+    assert lines[1].spans[0].style == "red"
+    assert chart.draw(1, 1).renderables[0].plain.startswith("TXFJ1 1s")
+
+
+def test_redraws_only_the_forming_bar(chart: CandleChart, mocker: MockerFixture):
+    draw_closed = mocker.spy(chart, "draw_closed")
+    chart.draw(10, 4)
+    on_tick(chart, tick(1, "16403"))
+    lines = chart.draw(10, 4).renderables
+    assert draw_closed.call_count == 1
+    assert [line.plain for line in lines[1:]] == ["┃┃", "┃┃", "┃ "]
+    # a new bar closes the forming one
+    on_tick(chart, tick(2, "16401"))
+    chart.draw(10, 4)
+    assert draw_closed.call_count == 2
+
+
+def test_next_timeframe_resamples(chart: CandleChart):
+    chart.next_timeframe()
+    assert chart.timeframe == 5
+    assert chart.series.view.current[1:] == [1640000, 1640400, 1640000, 1640200, 4]
+    assert chart.draw(10, 4).renderables[0].plain.startswith("TXFJ1 5s")
+    for _ in range(3):
+        chart.next_timeframe()
+    assert chart.series.view is chart.series.base
+
+
+def test_history_merges_live_trades(chart: CandleChart):
+    chart.begin_history()
+    assert "(loading history 0:00:00)" in chart.draw(40, 4).renderables[0].plain
+    # a live trade while the older ticks download
+    on_tick(chart, tick(2, "16405", volume=3))
+    chart.add_history(
+        pd.DataFrame(
+            {
+                "datetime": pd.to_datetime(
+                    ["2021-10-04 08:59:59", "2021-10-04 09:00:01"]
+                ),
+                "close": [16398.0, 16401.0],
+                "volume": [5, 2],
+            }
+        )
+    )
+    assert "(loading history 9:00:01)" in chart.header().plain
+    chart.end_history()
+    assert chart.history is None
+    assert chart.series.view.closed == 2
+    assert chart.series.view.current[1:] == [1640500, 1640500, 1640500, 1640500, 3]
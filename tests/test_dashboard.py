@@ -1,7 +1,7 @@
 import pytest
 from datetime import datetime
 from decimal import Decimal
-from shioaji import TickFOPv1
+from shioaji import TickFOPv1, BidAskFOPv1
 from shioaji.constant import Exchange
 from shioaji.contracts import Stock
 from sjtop.dashboard import ContractDashBoard
@@ -11,8 +11,7 @@ from pytest_mock import MockerFixture
 @pytest.fixture
 def contract_dashboard(mocker: MockerFixture):
     contract = Stock(exchange=Exchange.TSE, code="2330", symbol="TSE2330")
-    dashboard = ContractDashBoard("contract_dashboard", contract)
-    dashboard.loop = mocker.MagicMock()
+    dashboard = ContractDashBoard("contract_dashboard", contract, mocker.MagicMock())
     return dashboard
 
 
@@ -22,6 +21,7 @@ def test_change_contract(contract_dashboard: ContractDashBoard):
     assert contract_dashboard.table.title == contract.symbol
     assert contract_dashboard.contract == contract
     assert contract_dashboard.modify == True
+    contract_dashboard.scheduler.mark_dirty.assert_called_once_with(contract_dashboard)
 
 
 def test_on_fop_v1_tick(contract_dashboard: ContractDashBoard):
@@ -46,10 +46,87 @@ def test_on_fop_v1_tick(contract_dashboard: ContractDashBoard):
         pct_chg=Decimal("0"),
         simtrade=1,
     )
-    contract_dashboard.on_fop_v1_tick(Exchange.TAIFEX, tick)
+    contract_dashboard.on_fop_v1_tick(Exchange.TAIFEX, tick, 0)
 
-    contract_dashboard.loop.call_soon_threadsafe.assert_called_once_with(
-        contract_dashboard.refresh
-    )
+    contract_dashboard.scheduler.mark_dirty.assert_called_once_with(contract_dashboard)
     assert contract_dashboard.modify == True
     assert contract_dashboard.cur_tick == tick
+
+
+def test_on_fop_v1_bidask(contract_dashboard: ContractDashBoard):
+    quote = BidAskFOPv1(
+        code="TXFJ1",
+        datetime=datetime(2021, 10, 4, 20, 0, 45, 939000),
+        bid_total_vol=46,
+        ask_total_vol=60,
+        bid_price=[
+            Decimal("16411"),
+            Decimal("16410"),
+            Decimal("16409"),
+            Decimal("16408"),
+            Decimal("16407"),
+        ],
+        bid_volume=[2, 7, 7, 21, 9],
+        diff_bid_vol=[-2, 0, -5, 4, 1],
+        ask_price=[
+            Decimal("16413"),
+            Decimal("16414"),
+            Decimal("16415"),
+            Decimal("16416"),
+            Decimal("16417"),
+        ],
+        ask_volume=[8, 12, 19, 9, 12],
+        diff_ask_vol=[0, 0, 0, 0, 0],
+        first_derived_bid_price=Decimal("16410"),
+        first_derived_ask_price=Decimal("0"),
+        first_derived_bid_vol=1,
+        first_derived_ask_vol=0,
+        underlying_price=Decimal("16408.35"),
+        simtrade=0,
+    )
+    contract_dashboard.on_fop_v1_bidask(
+        Exchange.TAIFEX, quote, *contract_dashboard.prices.book(quote)
+    )
+    contract_dashboard.scheduler.mark_dirty.assert_called_once_with(contract_dashboard)
+    assert contract_dashboard.book.bid_total == 46
+    assert contract_dashboard.book.ask_total == 60
+
+    table = contract_dashboard.render()
+    assert len(table.rows) == 11
+    assert [cell.plain for cell in table.columns[1]._cells[:10]] == [
+        "12",
+        "9",
+        "19",
+        "12",
+        "8",
+        "2",
+        "7",
+        "7",
+        "21",
+        "9",
+    ]
+    assert [cell.plain for cell in table.columns[2]._cells[:10]] == [
+        "16417",
+        "16416",
+        "16415",
+        "16414",
+        "16413",
+        "16411",
+        "16410",
+        "16409",
+        "16408",
+        "16407",
+    ]
+    assert contract_dashboard.bars[4].begin == 52
+    assert contract_dashboard.bars[9].end == 46
+    assert contract_dashboard.total_bar.size == 106
+
+    cells = list(table.columns[1]._cells)
+    quote.bid_volume[0] = 3
+    contract_dashboard.on_fop_v1_bidask(
+        Exchange.TAIFEX, quote, *contract_dashboard.prices.book(quote)
+    )
+    table = contract_dashboard.render()
+    assert len(table.rows) == 11
+    assert all(a is b for a, b in zip(table.columns[1]._cells, cells))
+    assert cells[5].plain == "3"
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from pytest_mock import MockerFixture
+from rich.console import Console
+from shioaji.constant import Exchange
+from shioaji.contracts import Future
+
+from sjtop.flow import BUY, SELL, FlowPanel, FlowWindow, TradeFlows
+from sjtop.tick_cache import TickRecord
+
+START = datetime(2021, 10, 4, 9)
+
+
+def tick(seconds: float, close: str, volume: int, tick_type: int, code="TXFJ1"):
+    return SimpleNamespace(
+        code=code,
+        datetime=START + timedelta(seconds=seconds),
+        close=Decimal(close),
+        volume=volume,
+        tick_type=tick_type,
+    )
+
+
+def test_time_window_evicts_expired_trades():
+    window = FlowWindow(seconds=10)
+    window.add(0.0, 100, 2, BUY)
+    window.add(5.5, 110, 1, SELL)
+    window.add(9.0, 120, 1, 0)
+    assert window.vwap == pytest.approx((200 + 110 + 120) / 4)
+    assert window.imbalance == pytest.approx(1 / 3)
+    assert window.rate == pytest.approx(0.4)
+    window.add(12.0, 130, 3, SELL)
+    assert len(window) == 3
+    assert (window.volume, window.buy, window.sell) == (5, 0, 4)
+    assert window.imbalance == -1
+    assert window.label == "10s"
+
+
+def test_trade_window_keeps_last_trades():
+    window = FlowWindow(trades=2)
+    assert window.vwap is None
+    assert (window.imbalance, window.rate) == (0.0, 0.0)
+    for ts, price in enumerate((100, 200, 300)):
+        window.add(float(ts), price, 1, BUY)
+    assert window.vwap == 250
+    assert window.rate == 2
+    assert window.label == "2t"
+
+
+def test_expire_between_trades():
+    window = FlowWindow(seconds=10)
+    window.add(0.0, 100, 2, BUY)
+    window.expire(5.0)
+    assert len(window) == 1
+    window.expire(10.0)
+    assert (len(window), window.volume, window.vwap) == (0, 0, None)
+    trades = FlowWindow(trades=2)
+    trades.add(0.0, 100, 1, BUY)
+    trades.expire(1000.0)
+    assert len(trades) == 1
+
+
+def on_tick(flows: TradeFlows, tick):
+    flows.on_tick(tick, flows.prices.trade(tick))
+
+
+def test_flows_track_tracked_codes():
+    flows = TradeFlows()
+    # printed at the bid of a quote the cache did not have yet
+    history = [
+        TickRecord(START, Decimal("16400"), Decimal("16400"), Decimal("16400"), 3, 2)
+    ]
+    flow = flows.track("TXFJ1", history)
+    assert flows.track("TXFJ1") is flow
+    on_tick(flows, tick(1, "16399", 1, SELL))
+    on_tick(flows, tick(1, "2330", 1, SELL, code="2330"))
+    assert "2330" not in flows
+    window = flow["10s"]
+    assert (window.buy, window.sell) == (0, 4)
+    assert window.vwap == pytest.approx(1639975)
+    on_tick(flows, tick(70, "16401", 1, BUY))
+    assert len(flow["60s"]) == 1
+    assert len(flow["100t"]) == 3
+    with pytest.raises(KeyError):
+        flow["5s"]
+    flows.untrack("TXFJ1")
+    assert flows.get("TXFJ1") is None
+
+
+def test_flow_panel(mocker: MockerFixture):
+    flows = TradeFlows()
+    panel = FlowPanel("flow", flows, mocker.MagicMock())
+    assert panel.render().plain == "no trades"
+    panel.change_contract(Future(code="TXFJ1"))
+    flows.track("TXFJ1")
+    on_tick(flows, tick(0, "16400", 2, BUY))
+    panel.on_tick(Exchange.TAIFEX, tick(0, "16400", 2, BUY))
+    assert panel.scheduler.mark_dirty.call_count == 2
+    console = Console(width=44, record=True)
+    console.print(panel.render())
+    text = console.export_text()
+    # formatted as the feed shows the contract's prices
+    assert "16400 " in text
+    assert "+100%" in text
+    # the feed moves on without trades of the contract
+    panel.visible = True
+    quote = SimpleNamespace(code="TXFK1", datetime=START + timedelta(seconds=30))
+    flows.on_bidask(quote)
+    panel.on_bidask(Exchange.TAIFEX, quote)
+    assert panel.scheduler.mark_dirty.call_count == 3
+    console = Console(width=44, record=True)
+    console.print(panel.render())
+    rows = {
+        line.split()[0]: line.split()[2]
+        for line in console.export_text().splitlines()
+        if line.endswith(("0", "1"))
+    }
+    assert (rows["10s"], rows["60s"]) == ("-", "16400")
+    assert len(flows.get("TXFJ1")["60s"]) == 1
@@ -0,0 +1,148 @@
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from pytest_mock import MockerFixture
+from shioaji.constant import Exchange
+from shioaji.contracts import Future
+
+from sjtop.flow import BUY, SELL
+from sjtop.heatmap import DepthBuffer, DepthHeatmap, tick_of
+
+
+def book(bid: int, volumes=(1, 2, 3, 4, 5), tick: int = 100):
+    bids = [bid - i * tick for i in range(5)]
+    asks = [bid + (i + 1) * tick for i in range(5)]
+    return bids, list(volumes), asks, list(volumes)
+
+
+def test_tick_of():
+    assert tick_of([1640000, 1639900, 0, 1640100]) == 100
+    assert tick_of([15050, 15000, 15100]) == 50
+    assert tick_of([0, 0]) == 100
+
+
+def test_book_fills_rows_by_price():
+    buffer = DepthBuffer(rows=32, slots=4)
+    buffer.on_book(100, *book(1640000))
+    assert buffer.tick == 100
+    assert buffer.row_of(1640000) == 16
+    column = buffer.resting[buffer.slot % 4]
+    assert column[12:22].tolist() == [5, 4, 3, 2, 1, 1, 2, 3, 4, 5]
+    # a slot keeps the largest volume seen
+    buffer.on_book(100, *book(1640000, volumes=(9, 1, 1, 1, 1)))
+    assert column[16] == 9 and column[15] == 2
+
+
+def test_slots_scroll_in_a_ring():
+    buffer = DepthBuffer(rows=32, slots=4)
+    buffer.on_book(100, *book(1640000))
+    buffer.on_book(102, *book(1640000, volumes=(7, 0, 0, 0, 0)))
+    assert buffer.resting[101 % 4].sum() == 0
+    assert buffer.resting[102 % 4][16] == 7
+    # late quotes join the newest slot
+    buffer.on_book(101, *book(1640000, volumes=(8, 0, 0, 0, 0)))
+    assert buffer.resting[102 % 4][16] == 8
+    buffer.on_book(104, *book(1640000, volumes=(6, 0, 0, 0, 0)))
+    assert buffer.first == 101
+    # the column of slot 100 was reused
+    assert buffer.resting[104 % 4][16] == 6
+    assert buffer.resting[104 % 4][15] == 0
+    buffer.on_book(200, *book(1640000))
+    assert buffer.first == 200
+    assert buffer.resting.sum() == 30
+    assert buffer.nbytes == 3 * 4 * 32 * 4
+
+
+def test_recenter_keeps_rows_in_range():
+    buffer = DepthBuffer(rows=32, slots=4)
+    buffer.on_book(100, *book(1640000))
+    buffer.on_book(100, *book(1641000))
+    assert buffer.row_of(1641000) == 26
+    buffer.on_book(100, *book(1641600))
+    assert buffer.row_of(1641600) == 16
+    # the old best bid moved 16 rows down
+    assert buffer.resting[100 % 4][0] == 1
+    buffer.on_book(100, *book(1650000))
+    assert buffer.resting[100 % 4][:8].sum() == 0
+
+
+def test_trades():
+    buffer = DepthBuffer(rows=32, slots=4)
+    buffer.on_trade(100, 1640000, 3, BUY)
+    buffer.on_trade(100, 1640000, 1, SELL)
+    buffer.on_trade(100, 1640000, 2, 0)
+    col = 100 % 4
+    assert buffer.traded[col, 16] == 6
+    assert buffer.bought[col, 16] == 4
+
+
+def test_window():
+    buffer = DepthBuffer(rows=32, slots=4)
+    buffer.on_book(100, *book(1640000))
+    buffer.on_book(101, *book(1640000, volumes=(9, 0, 0, 0, 0)))
+    resting, traded, _ = buffer.window(14, 4, 3)
+    # slot 99 predates the data, row 14 + 3 = 17 is the first ask
+    assert resting.tolist() == [[0, 0, 0, 0], [3, 2, 1, 1], [0, 0, 9, 9]]
+    assert traded.sum() == 0
+    assert buffer.window(40, 4, 3)[0].sum() == 0
+
+
+def quote(second: int, bid: str, volume: int = 5):
+    bid_price = Decimal(bid)
+    return SimpleNamespace(
+        code="TXFJ1",
+        datetime=datetime(2021, 10, 4, 9, 0, second),
+        bid_price=[bid_price - i for i in range(5)],
+        bid_volume=[volume, 1, 1, 1, 1],
+        ask_price=[bid_price + 1 + i for i in range(5)],
+        ask_volume=[volume, 1, 1, 1, 1],
+    )
+
+
+def on_bidask(heatmap: DepthHeatmap, quote):
+    heatmap.on_fop_v1_bidask(Exchange.TAIFEX, quote, *heatmap.prices.book(quote))
+
+
+@pytest.fixture
+def heatmap(mocker: MockerFixture):
+    heatmap = DepthHeatmap("heatmap", Future(code="TXFJ1"), mocker.MagicMock())
+    heatmap.change_contract(Future(code="TXFJ1"))
+    return heatmap
+
+
+def test_draw(heatmap: DepthHeatmap):
+    assert heatmap.draw(20, 5).renderables[0].plain == "TXFJ1 depth  1s/col"
+    on_bidask(heatmap, quote(0, "16400"))
+    heatmap.on_fop_v1_tick(
+        Exchange.TAIFEX,
+        SimpleNamespace(
+            datetime=datetime(2021, 10, 4, 9, 0, 1),
+            close=Decimal("16401"),
+            volume=2,
+            tick_type=BUY,
+        ),
+        1640100,
+    )
+    on_bidask(heatmap, quote(1, "16400", volume=10))
+    lines = heatmap.draw(10, 5).renderables
+    assert lines[0].plain == "TXFJ1 depth  1s/col  max 10"
+    assert [line.plain for line in lines[1:]] == [
+        "16401    ●",
+        "16400     ",
+        "16399     ",
+        "16398     ",
+    ]
+    # the ask row, its previous and current slot
+    assert lines[1].style == "green"
+    styles = [str(span.style) for span in lines[1].spans]
+    assert styles == ["on #3a86a8", "red on #f2d64b"]
+
+
+def test_hidden_heatmap_keeps_recording(heatmap: DepthHeatmap):
+    heatmap.visible = False
+    heatmap.scheduler.reset_mock()
+    on_bidask(heatmap, quote(0, "16400"))
+    heatmap.scheduler.mark_dirty.assert_not_called()
+    assert heatmap.buffer.resting.sum() == 18
@@ -0,0 +1,141 @@
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+import pytest
+from pytest_mock import MockerFixture
+from shioaji.constant import Exchange, TicksQueryType
+from shioaji.contracts import Future, Stock
+
+from sjtop.history import (
+    HistoryLoader,
+    HistoryStore,
+    parse_day,
+    session_close,
+    sessions,
+    ticks_frame,
+    time_ranges,
+)
+
+DAY = date(2021, 10, 4)
+
+
+def ns(value: str) -> int:
+    return pd.Timestamp(value).value
+
+
+class FakeApi:
+    """`api.ticks` answering range queries from a list of (ts, close)."""
+
+    def __init__(self, ticks) -> None:
+        self.ticks_ = ticks
+        self.calls = []
+
+    def ticks(self, contract, date, query_type, time_start, time_end):
+        self.calls.append((date, query_type, time_start, time_end))
+        # newest first, the loader sorts each chunk
+        rows = [
+            (ts, close)
+            for ts, close in reversed(self.ticks_)
+            if time_start <= pd.Timestamp(ts).time() <= time_end
+        ]
+        return {
+            "ts": [ts for ts, _ in rows],
+            "close": [close for _, close in rows],
+            "volume": [1] * len(rows),
+        }
+
+
+TICKS = [
+    (ns("2021-10-01 15:00:00"), 16400.0),
+    (ns("2021-10-01 15:30:00"), 16401.0),
+    (ns("2021-10-01 23:59:59"), 16402.0),
+    (ns("2021-10-04 08:45:00"), 16403.0),
+    (ns("2021-10-04 08:45:01"), 16404.0),
+]
+
+
+def test_ticks_frame():
+    df = ticks_frame({"ts": [ns("2021-10-04 09:00:00.001")], "close": [16400.0]})
+    assert df["datetime"][0] == pd.Timestamp("2021-10-04 09:00:00.001")
+    assert df["volume"].dtype == "i8" and df["tick_type"].dtype == "i1"
+    assert list(ticks_frame({}, ["datetime", "close"]).columns) == ["datetime", "close"]
+
+
+def test_time_ranges_cover_the_sessions():
+    ranges = list(time_ranges(sessions(Future(code="TXFJ1")), timedelta(hours=6)))
+    assert ranges == [
+        (time(15), time(20, 59, 59, 999999)),
+        (time(21), time.max),
+        (time(0), time(5, 0, 59, 999999)),
+        (time(8, 45), time(13, 45, 59, 999999)),
+    ]
+    stock = sessions(Stock(code="2330", exchange=Exchange.TSE))
+    assert list(time_ranges(stock, timedelta(hours=6))) == [
+        (time(9), time(14, 30, 59, 999999))
+    ]
+
+
+def test_chunks_in_session_order():
+    api = FakeApi(TICKS)
+    loader = HistoryLoader(api, chunk=timedelta(hours=6))
+    chunks = list(loader.chunks(Future(code="TXFJ1"), DAY, ["datetime", "close"]))
+    assert [chunk["close"].tolist() for chunk in chunks] == [
+        [16400.0, 16401.0],
+        [16402.0],
+        [16403.0, 16404.0],
+    ]
+    assert list(chunks[0].columns) == ["datetime", "close"]
+    assert api.calls[0] == (
+        "2021-10-04",
+        TicksQueryType.RangeTime,
+        time(15),
+        time(20, 59, 59, 999999),
+    )
+    assert len(api.calls) == 4
+
+
+def test_session_close():
+    assert session_close(Future(code="TXFJ1"), DAY) == datetime(2021, 10, 4, 13, 46)
+    stock = Stock(code="2330", exchange=Exchange.TSE)
+    assert session_close(stock, DAY) == datetime(2021, 10, 4, 14, 31)
+
+
+def test_finished_by_the_exchange_clock():
+    now = datetime(2021, 10, 4, 13, 45, 30)
+    loader = HistoryLoader(FakeApi([]), clock=lambda: now)
+    assert not loader.finished(Future(code="TXFJ1"), DAY)
+    now = datetime(2021, 10, 4, 13, 46)
+    assert loader.finished(Future(code="TXFJ1"), DAY)
+    assert not loader.finished(Stock(code="2330", exchange=Exchange.TSE), DAY)
+
+
+def test_parse_day():
+    assert parse_day("", DAY) == DAY
+    assert parse_day("2021-10-01", DAY) == date(2021, 10, 1)
+    assert parse_day("20211001", DAY) == date(2021, 10, 1)
+    assert parse_day("2021-13", DAY) is None
+
+
+def test_finished_day_is_cached(tmp_path, mocker: MockerFixture):
+    pytest.importorskip("pyarrow")
+    api = FakeApi(TICKS)
+    store = HistoryStore(tmp_path)
+    loader = HistoryLoader(api, store, chunk=timedelta(hours=6))
+    mocker.patch.object(loader, "finished", return_value=True)
+    contract = Future(code="TXFJ1")
+    first = loader.load(contract, DAY)
+    assert (tmp_path / "code=TXFJ1" / "date=2021-10-04" / "ticks.parquet").exists()
+    calls = len(api.calls)
+    cached = loader.load(contract, DAY, ["datetime", "close"])
+    assert len(api.calls) == calls
+    assert list(cached.columns) == ["datetime", "close"]
+    assert cached["close"].tolist() == first["close"].tolist()
+    assert cached["datetime"].tolist() == first["datetime"].tolist()
+
+
+def test_unfinished_day_is_not_cached(tmp_path, mocker: MockerFixture):
+    store = HistoryStore(tmp_path)
+    loader = HistoryLoader(FakeApi(TICKS), store, chunk=timedelta(hours=6))
+    mocker.patch.object(loader, "finished", return_value=False)
+    assert len(loader.load(Future(code="TXFJ1"), DAY)) == 5
+    assert (Future(code="TXFJ1").code, DAY) not in store
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+from pytest_mock import MockerFixture
+from shioaji.constant import Exchange
+
+from sjtop.ingest import QuoteIngest
+
+
+@pytest.fixture
+def ingest(mocker: MockerFixture):
+    return QuoteIngest(mocker.MagicMock())
+
+
+def quote(code: str, seq: int):
+    return SimpleNamespace(code=code, seq=seq)
+
+
+def test_wakes_loop_once_per_batch(ingest: QuoteIngest, mocker: MockerFixture):
+    handler = mocker.MagicMock()
+    ingest.push_tick(handler, Exchange.TAIFEX, quote("TXFJ1", 1))
+    ingest.push_tick(handler, Exchange.TAIFEX, quote("TXFJ1", 2))
+    ingest.loop.call_soon_threadsafe.assert_called_once_with(ingest.drain)
+    assert ingest.depth == 2
+    ingest.drain()
+    assert [c[0][1].seq for c in handler.call_args_list] == [1, 2]
+    assert (ingest.depth, ingest.batches, ingest.last_batch) == (0, 1, 2)
+    ingest.push_tick(handler, Exchange.TAIFEX, quote("TXFJ1", 3))
+    assert ingest.loop.call_soon_threadsafe.call_count == 2
+
+
+def test_bidask_conflation_keeps_order(ingest: QuoteIngest):
+    seen = []
+
+    def handler(exchange, q):
+        seen.append((q.code, q.seq))
+
+    ingest.push_bidask(handler, Exchange.TAIFEX, quote("TXFJ1", 1))
+    ingest.push_bidask(handler, Exchange.TAIFEX, quote("MXFJ1", 2))
+    ingest.push_bidask(handler, Exchange.TAIFEX, quote("TXFJ1", 3))
+    ingest.push_tick(handler, Exchange.TAIFEX, quote("TXFJ1", 4))
+    ingest.push_bidask(handler, Exchange.TAIFEX, quote("TXFJ1", 5))
+    ingest.push_bidask(handler, Exchange.TAIFEX, quote("TXFJ1", 6))
+    ingest.drain()
+    assert seen == [("TXFJ1", 3), ("MXFJ1", 2), ("TXFJ1", 4), ("TXFJ1", 6)]
+    assert ingest.received == 6
+    assert ingest.conflated == 2
+    assert ingest.max_depth == 4
+
+
+def test_keeps_every_trade(ingest: QuoteIngest, mocker: MockerFixture):
+    handler = mocker.MagicMock()
+    for seq in range(1000):
+        ingest.push_bidask(handler, Exchange.TAIFEX, quote("TXFJ1", seq))
+        ingest.push_bidask(handler, Exchange.TAIFEX, quote("TXFJ1", seq))
+        ingest.push_tick(handler, Exchange.TAIFEX, quote("TXFJ1", seq))
+    assert ingest.depth == 2000
+    assert ingest.conflated == 1000
+    ingest.drain()
+    ticks = [c[0][1].seq for c in handler.call_args_list[1::2]]
+    assert ticks == list(range(1000))
@@ -0,0 +1,155 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+from shioaji import BidAskFOPv1, TickFOPv1
+
+from sjtop import journal
+from sjtop.journal import (
+    TICK_DTYPE,
+    JournalFile,
+    JournalReader,
+    JournalWriter,
+    index_path,
+    tick_record,
+    trading_day,
+)
+
+
+def make_tick(ts: datetime, close: int) -> TickFOPv1:
+    return TickFOPv1(
+        code="TXFJ1",
+        datetime=ts,
+        open=Decimal("16400"),
+        underlying_price=Decimal("16408.35"),
+        bid_side_total_vol=1,
+        ask_side_total_vol=2,
+        avg_price=Decimal("16405.5"),
+        close=Decimal(close),
+        high=Decimal("16420"),
+        low=Decimal("16390"),
+        amount=Decimal(close),
+        total_amount=Decimal(close),
+        volume=1,
+        total_volume=10,
+        tick_type=1,
+        chg_type=2,
+        price_chg=Decimal("5"),
+        pct_chg=Decimal("0.03"),
+        simtrade=0,
+    )
+
+
+def make_bidask(ts: datetime) -> BidAskFOPv1:
+    return BidAskFOPv1(
+        code="TXFJ1",
+        datetime=ts,
+        bid_total_vol=46,
+        ask_total_vol=60,
+        bid_price=[Decimal(16411 - i) for i in range(5)],
+        bid_volume=[2, 7, 7, 21, 9],
+        diff_bid_vol=[0, 0, 0, 0, 0],
+        ask_price=[Decimal(16413 + i) for i in range(5)],
+        ask_volume=[8, 12, 19, 9, 12],
+        diff_ask_vol=[0, 0, 0, 0, 0],
+        first_derived_bid_price=Decimal("0"),
+        first_derived_ask_price=Decimal("0"),
+        first_derived_bid_vol=0,
+        first_derived_ask_vol=0,
+        underlying_price=Decimal("16408.35"),
+        simtrade=0,
+    )
+
+
+def test_trading_day():
+    assert trading_day(datetime(2021, 10, 4, 14, 59)) == date(2021, 10, 4)
+    assert trading_day(datetime(2021, 10, 4, 15, 0)) == date(2021, 10, 5)
+    # Friday night session, before and after midnight, is Monday's
+    assert trading_day(datetime(2021, 10, 8, 15, 0)) == date(2021, 10, 11)
+    assert trading_day(datetime(2021, 10, 9, 4, 59)) == date(2021, 10, 11)
+    assert trading_day(datetime(2021, 10, 4, 15, 0), False) == date(2021, 10, 4)
+
+
+def test_writer_failure_stops_queuing(tmp_path: Path, mocker: MockerFixture):
+    writer = JournalWriter(tmp_path)
+    mocker.patch.object(writer, "write", side_effect=OSError("disk full"))
+    writer.start()
+    writer.record_tick(make_tick(datetime(2021, 10, 4, 9), 16400))
+    writer.thread.join()
+    assert not writer.running
+    assert isinstance(writer.error, OSError)
+    writer.record_tick(make_tick(datetime(2021, 10, 4, 9), 16401))
+    assert writer.queue.empty()
+    writer.close()
+
+
+def test_write_and_read_range(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(journal, "INDEX_STRIDE", 4)
+    start = datetime(2021, 10, 4, 9, 0, 0)
+    writer = JournalWriter(tmp_path)
+    writer.start()
+    for i in range(10):
+        writer.record_tick(make_tick(start + timedelta(seconds=i), 16400 + i))
+    writer.record_bidask(make_bidask(start))
+    writer.close()
+    for i in range(10, 20):
+        writer.write([("tick", make_tick(start + timedelta(seconds=i), 16400 + i))])
+    writer.flush()
+    assert writer.recorded == 21
+
+    reader = JournalReader(tmp_path)
+    assert reader.days() == [date(2021, 10, 4)]
+    assert reader.codes(date(2021, 10, 4)) == ["TXFJ1"]
+    index = np.fromfile(
+        str(tmp_path / "20211004" / "TXFJ1.tick.idx"), dtype=journal.INDEX_DTYPE
+    )
+    assert index["record"].tolist() == [0, 4, 8, 12, 16]
+
+    ticks = reader.read_ticks("TXFJ1", date(2021, 10, 4))
+    assert ticks["close"].tolist() == [16400.0 + i for i in range(20)]
+    assert ticks[0]["ts"] == np.datetime64("2021-10-04T09:00:00")
+    assert ticks[0]["underlying_price"] == 16408.35
+    assert ticks[0]["tick_type"] == 1
+
+    window = reader.read_ticks(
+        "TXFJ1",
+        date(2021, 10, 4),
+        start + timedelta(seconds=5),
+        start + timedelta(seconds=13),
+    )
+    assert window["close"].tolist() == [16400.0 + i for i in range(5, 13)]
+
+    bidasks = reader.read_bidasks("TXFJ1", date(2021, 10, 4))
+    assert bidasks["bid_price"][0].tolist() == [16411, 16410, 16409, 16408, 16407]
+    assert bidasks["ask_volume"][0].tolist() == [8, 12, 19, 9, 12]
+    assert len(reader.read_bidasks("MXFJ1", date(2021, 10, 4))) == 0
+
+
+def test_reopen_drops_a_partial_record(tmp_path: Path):
+    path = tmp_path / "TXFJ1.tick"
+    start = datetime(2021, 10, 4, 9, 0, 0)
+    records = np.array(
+        [tick_record(make_tick(start, 16400 + i)) for i in range(3)],
+        dtype=TICK_DTYPE,
+    )
+    journal_file = JournalFile(path, TICK_DTYPE)
+    journal_file.append(records[:2])
+    journal_file.close()
+    # killed in the middle of the next write, its index entry got out
+    with open(path, "ab") as file:
+        file.write(records[2:].tobytes()[:10])
+    stale = np.array([(start, 0), (start, 2)], dtype=journal.INDEX_DTYPE)
+    index_path(path).write_bytes(stale.tobytes())
+
+    journal_file = JournalFile(path, TICK_DTYPE)
+    assert journal_file.count == 2
+    journal_file.append(records[2:])
+    journal_file.close()
+    assert path.stat().st_size == 3 * TICK_DTYPE.itemsize
+    stored = np.fromfile(str(path), dtype=TICK_DTYPE)
+    assert stored["close"].tolist() == [16400.0, 16401.0, 16402.0]
+    index = np.fromfile(str(index_path(path)), dtype=journal.INDEX_DTYPE)
+    assert index["record"].tolist() == [0]
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pytest_mock import MockerFixture
+from rich.console import Console
+
+from sjtop.metrics import (
+    LatencyStats,
+    Metrics,
+    MetricsPanel,
+    exchange_now,
+    instrumented,
+)
+from sjtop.scheduler import FrameStats
+
+
+class Handlers:
+    def __init__(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+        self.handled = []
+
+    @instrumented
+    def update_chain(self, exchange, tick):
+        self.handled.append(tick)
+
+    @instrumented
+    def dispatch_fop_v1_tick(self, exchange, tick):
+        self.handled.append(tick)
+
+
+def test_latency_stats_ring():
+    stats = LatencyStats(size=4)
+    assert stats.percentiles(50) == [0.0]
+    for value in range(6):
+        stats.record(value)
+    assert stats.count == 6
+    assert sorted(stats.window()) == [2, 3, 4, 5]
+    assert stats.percentiles(0, 100) == [2, 5]
+
+
+def test_instrumented_samples_and_counts(mocker: MockerFixture):
+    handlers = Handlers(Metrics(sample_every=2))
+    tick = mocker.MagicMock(code="TXFJ1")
+    for _ in range(4):
+        handlers.dispatch_fop_v1_tick(None, tick)
+    handlers.update_chain(None, tick)
+    handlers.update_chain(None, tick)
+    assert len(handlers.handled) == 6
+    assert handlers.metrics.messages == {"TXFJ1": 4}
+    assert handlers.metrics.callbacks["dispatch_fop_v1_tick"].count == 2
+    assert handlers.metrics.callbacks["update_chain"].count == 1
+
+
+def test_disabled_records_nothing(mocker: MockerFixture):
+    handlers = Handlers(Metrics(enabled=False))
+    handlers.dispatch_fop_v1_tick(None, mocker.MagicMock(code="TXFJ1"))
+    assert len(handlers.handled) == 1
+    assert handlers.metrics.callbacks == {}
+    assert not handlers.metrics.messages
+    widget = mocker.MagicMock()
+    render_lines = widget.render_lines
+    handlers.metrics.watch_render(widget)
+    assert widget.render_lines is render_lines
+
+
+def test_skipped_frames():
+    metrics = Metrics()
+    metrics.interval = 0.1
+    metrics.on_frame(FrameStats(frame=1, widgets=1, requests=1, late=0.05))
+    metrics.on_frame(FrameStats(frame=2, widgets=1, requests=1, late=0.35))
+    assert (metrics.frames, metrics.skipped) == (2, 3)
+
+
+def test_watch_render_measures_lag(mocker: MockerFixture):
+    metrics = Metrics()
+    widget = mocker.MagicMock()
+    widget.name = "tickviewer"
+    render_lines = widget.render_lines
+    metrics.watch_render(widget, shows_ticks=True)
+    now = exchange_now()
+    metrics.on_shown_tick(now - timedelta(milliseconds=200))
+    metrics.on_shown_tick(now - timedelta(milliseconds=100))
+    widget.render_lines()
+    render_lines.assert_called_once_with()
+    assert metrics.renders["tickviewer"].count == 1
+    assert metrics.lag.count == 1
+    assert metrics.lag.percentiles(50)[0] == pytest.approx(0.2, abs=0.05)
+    assert metrics.pending_ts is None
+
+
+def test_lag_clock_is_exchange_time(mocker: MockerFixture):
+    taipei = exchange_now()
+    utc = datetime.utcnow()
+    assert abs(taipei - utc - timedelta(hours=8)) < timedelta(seconds=1)
+    replayed = datetime(2021, 10, 4, 9)
+    metrics = Metrics(clock=lambda: replayed + timedelta(milliseconds=30))
+    widget = mocker.MagicMock()
+    widget.name = "tickviewer"
+    metrics.watch_render(widget, shows_ticks=True)
+    metrics.on_shown_tick(replayed)
+    widget.render_lines()
+    assert metrics.lag.percentiles(50)[0] == pytest.approx(0.03)
+
+
+def test_roll_rates(mocker: MockerFixture):
+    metrics = Metrics()
+    metrics.messages.update({"TXFJ1": 30, "2330": 10})
+    metrics.frames = 6
+    metrics.since -= 2
+    metrics.roll()
+    assert metrics.fps == pytest.approx(3, rel=0.05)
+    assert [code for code, _ in metrics.top_rates()] == ["TXFJ1", "2330"]
+    assert metrics.rates["TXFJ1"] == pytest.approx(15, rel=0.05)
+    metrics.roll()
+    assert metrics.rates["TXFJ1"] == 0
+    assert "fps" in metrics.summary()
+
+
+def test_metrics_panel(mocker: MockerFixture):
+    metrics = Metrics()
+    handlers = Handlers(metrics)
+    for _ in range(8):
+        handlers.dispatch_fop_v1_tick(None, mocker.MagicMock(code="TXFJ1"))
+    metrics.roll()
+    console = Console(width=44, record=True)
+    console.print(MetricsPanel("metrics", metrics).render())
+    text = console.export_text()
+    assert "dispatch_fop_v1_tick" in text
+    assert "TXFJ1" in text
+    disabled = MetricsPanel("metrics", Metrics(enabled=False))
+    assert disabled.render().plain == "metrics disabled"
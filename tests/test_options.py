@@ -0,0 +1,137 @@
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+from rich.console import Console
+from shioaji.constant import OptionRight
+from shioaji.contracts import Option
+
+from sjtop.options import (
+    CALL,
+    PUT,
+    OptionChain,
+    OptionChainView,
+    black_scholes,
+    chain_of,
+    expiry_of,
+    greeks,
+    implied_vol,
+    norm_cdf,
+)
+
+NOW = datetime(2021, 10, 4, 9)
+
+
+def option(strike: int, right: OptionRight, month="202110", day="2021/10/20"):
+    letter = ("ABCDEFGHIJKL" if right == OptionRight.Call else "MNOPQRSTUVWX")[9]
+    return Option(
+        code=f"TXO{strike}{letter}1{month[-1]}",
+        symbol=f"TXO{month}{strike}{right.value}",
+        name="TXO",
+        category="TXO",
+        delivery_month=month,
+        delivery_date=day,
+        strike_price=strike,
+        option_right=right,
+    )
+
+
+def chain_contracts():
+    return [
+        option(strike, right)
+        for strike in (16300, 16400, 16500)
+        for right in (OptionRight.Put, OptionRight.Call)
+    ]
+
+
+def bidask(code: str, bid: str, ask: str, underlying="16412"):
+    return SimpleNamespace(
+        code=code,
+        datetime=NOW,
+        bid_price=[Decimal(bid)],
+        ask_price=[Decimal(ask)],
+        underlying_price=Decimal(underlying),
+    )
+
+
+def test_norm_cdf():
+    x = np.array([-3.0, -1.0, 0.0, 0.5, 2.0])
+    expected = [0.0013499, 0.1586553, 0.5, 0.6914625, 0.9772499]
+    assert list(norm_cdf(x)) == pytest.approx(expected, abs=1e-7)
+
+
+def test_black_scholes_and_greeks():
+    call = np.array([True, False])
+    prices = black_scholes(100.0, 100.0, 1.0, 0.2, 0.05, call)
+    assert list(prices) == pytest.approx([10.4506, 5.5735], abs=1e-4)
+    delta, gamma, vega = greeks(100.0, 100.0, 1.0, 0.2, 0.05, call)
+    assert list(delta) == pytest.approx([0.6368, -0.3632], abs=1e-4)
+    assert list(gamma) == pytest.approx([0.018762] * 2, abs=1e-6)
+    assert list(vega) == pytest.approx([0.375240] * 2, abs=1e-6)
+
+
+def test_implied_vol_round_trip():
+    strikes = np.array([14000.0, 15500.0, 16400.0, 17500.0, 19000.0])
+    vols = np.array([0.35, 0.25, 0.18, 0.16, 0.22])
+    call = np.array([False, False, True, True, True])
+    prices = black_scholes(16400.0, strikes, 0.05, vols, 0.01, call)
+    solved = implied_vol(prices, 16400.0, strikes, 0.05, 0.01, call)
+    assert list(solved) == pytest.approx(list(vols), abs=1e-5)
+    # below intrinsic, above the spot, no price
+    bad = implied_vol([100.0, 17000.0, np.nan], 16400.0, 16000.0, 0.05, 0.0, True)
+    assert np.isnan(bad).all()
+
+
+def test_chain_of_nearest_expiry():
+    contracts = chain_contracts() + [
+        option(16400, OptionRight.Call, "202111", "2021/11/17")
+    ]
+    chain = chain_of(reversed(contracts))
+    assert [(c.strike_price, c.option_right) for c in chain[:2]] == [
+        (16300, OptionRight.Call),
+        (16300, OptionRight.Put),
+    ]
+    assert {c.delivery_month for c in chain} == {"202110"}
+    assert len(chain_of(contracts, "202111")) == 1
+    assert expiry_of(chain[0]) == datetime(2021, 10, 20, 8, 45)
+
+
+def test_chain_reprices_changed_cells_only():
+    contracts = chain_contracts()
+    chain = OptionChain(rate=0.01)
+    chain.reset(contracts)
+    call_16400 = next(
+        c for c in contracts if c.strike_price == 16400 and c.option_right == "C"
+    )
+    assert chain.on_bidask(bidask(call_16400.code, "180", "182"))
+    assert not chain.on_bidask(bidask("TXFJ1", "1", "2"))
+    # the underlying came in: every cell, only the quoted one solves
+    assert chain.reprice() == 6
+    assert chain.iv[CALL, 1] == pytest.approx(0.125, abs=1e-3)
+    assert np.isnan(chain.iv[PUT, 1]) and 0.5 < chain.delta[CALL, 1] < 0.6
+    assert chain.reprice() == 0
+    chain.on_bidask(bidask(call_16400.code, "181", "183"))
+    assert chain.reprice() == 1
+    assert chain.texts["bid"][CALL][1] == "181"
+    chain.on_bidask(bidask(call_16400.code, "181", "183", underlying="16420"))
+    assert chain.reprice() == 6
+    assert chain.atm_row() == 1
+
+
+def test_view_renders_strikes_around_the_money(mocker: MockerFixture):
+    scheduler = mocker.MagicMock()
+    view = OptionChainView("chain", scheduler)
+    view.change_chain(chain_contracts())
+    view.set_depth(1)
+    call = chain_contracts()[3]
+    view.on_fop_v1_bidask(None, bidask(call.code, "180", "182"))
+    scheduler.mark_dirty.assert_called_with(view)
+    console = Console(width=120, record=True)
+    console.print(view.render())
+    text = console.export_text()
+    assert "202110  underlying 16,412.00" in text
+    assert "16400" in text and "16300" not in text and "180" in text
+    assert view.chain.repriced == 6
@@ -0,0 +1,29 @@
+from sjtop.orderbook import OrderBook
+
+
+def test_update_layout():
+    book = OrderBook()
+    book.update(
+        [1641100, 1641000, 1640900, 1640800, 1640700],
+        [2, 7, 7, 21, 9],
+        [1641300, 1641400, 1641500, 1641600, 1641700],
+        [8, 12, 19, 9, 12],
+    )
+    assert book.price[:5].tolist() == [1641700, 1641600, 1641500, 1641400, 1641300]
+    assert book.price[5:].tolist() == [1641100, 1641000, 1640900, 1640800, 1640700]
+    assert book.volume.tolist() == [12, 9, 19, 12, 8, 2, 7, 7, 21, 9]
+    assert book.cumvol.tolist() == [60, 48, 39, 20, 8, 2, 9, 16, 37, 46]
+    assert book.ask_total == 60
+    assert book.bid_total == 46
+    assert book.depth == 60
+
+
+def test_update_overwrites_previous_quote():
+    book = OrderBook(levels=2)
+    book.update([10, 9], [1, 1], [11, 12], [1, 1])
+    book.update([10, 9], [5, 0], [11, 12], [0, 3])
+    assert len(book) == 4
+    assert book.price.tolist() == [12, 11, 10, 9]
+    assert book.volume.tolist() == [3, 0, 5, 0]
+    assert book.cumvol.tolist() == [3, 0, 5, 5]
+    assert book.depth == 5
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from sjtop.price import PriceScale, ScaledLevels, decimals_of, to_int
+
+
+def test_to_int():
+    assert to_int(Decimal("16411")) == 1641100
+    assert to_int(Decimal("150.55")) == 15055
+    assert to_int(Decimal("-1.5")) == -150
+    assert to_int(1.15) == 115
+    assert decimals_of(Decimal("150.50")) == 2
+    assert decimals_of(16411) == 0
+
+
+def test_text_matches_str_of_the_feed():
+    scale = PriceScale()
+    for price in ("0", "150.50", "151", "149.5"):
+        assert scale.text(scale.to_int(Decimal(price))) == price
+    assert scale.shown_decimals == 2
+    # derived values are formatted with the precision of the feed
+    assert scale.text(15025) == "150.25"
+    assert scale.text(-100) == "-1.00"
+    assert PriceScale().text(1641100) == "16411"
+    assert scale.to_int(1.15) == 115
+
+
+def test_float_prices_do_not_set_the_text():
+    scale = PriceScale()
+    assert scale.text(scale.to_int(150.5)) == "150.5"
+    assert scale.text(scale.to_int(16400.0)) == "16400"
+    assert scale.shown_decimals == -1
+    scale.to_int(Decimal("150.50"))
+    assert scale.text(15050) == "150.50"
+    assert scale.text(15025) == "150.25"
+
+
+def test_scaled_levels_convert_changed_levels(mocker):
+    scale = PriceScale()
+    levels = ScaledLevels(scale, levels=3)
+    prices = [Decimal("16411"), Decimal("16410"), Decimal("16409")]
+    assert levels(prices).tolist() == [1641100, 1641000, 1640900]
+    to_int = mocker.spy(scale, "to_int")
+    assert levels(list(prices)).tolist() == [1641100, 1641000, 1640900]
+    to_int.assert_not_called()
+    prices[1] = Decimal("16408")
+    assert levels(prices).tolist() == [1641100, 1640800, 1640900]
+    to_int.assert_called_once_with(Decimal("16408"))
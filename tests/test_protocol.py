@@ -0,0 +1,149 @@
+from datetime import datetime
+from decimal import Decimal
+
+from shioaji import BidAskFOPv1, BidAskSTKv1, TickFOPv1, TickSTKv1
+from shioaji.constant import Exchange
+
+from sjtop.protocol import (
+    BIDASK,
+    BIDASK_STRUCT,
+    BIDASK_WIRE_DTYPE,
+    DELTAS,
+    MASK,
+    TICK,
+    TICK_STRUCT,
+    TICK_WIRE_DTYPE,
+    QuoteDecoder,
+    bidask_wire,
+    from_us,
+    parse_history,
+    history_payload,
+    parse_quote,
+    quote_prefix,
+    tick_wire,
+    to_us,
+)
+
+DT = datetime(2021, 10, 4, 9, 0, 1, 500)
+
+
+def make_tick(close: str = "16400"):
+    return TickFOPv1(
+        code="TXFJ1",
+        datetime=DT,
+        open=Decimal("16380"),
+        avg_price=Decimal("16391.25"),
+        close=Decimal(close),
+        high=Decimal("16410"),
+        low=Decimal("16370"),
+        amount=Decimal(close),
+        total_amount=Decimal("0"),
+        volume=2,
+        total_volume=1200,
+        tick_type=1,
+        chg_type=2,
+        price_chg=Decimal("20"),
+        pct_chg=Decimal("0.12"),
+        bid_side_total_vol=500,
+        ask_side_total_vol=600,
+        simtrade=0,
+        underlying_price=Decimal("16395.55"),
+    )
+
+
+def make_bidask(bid: str = "150.5"):
+    return BidAskSTKv1(
+        code="2330",
+        datetime=DT,
+        bid_price=[Decimal(bid), Decimal("150"), Decimal("149.5"), 0, 0],
+        bid_volume=[10, 20, 30, 0, 0],
+        diff_bid_vol=[0] * 5,
+        ask_price=[Decimal("151"), Decimal("151.5"), Decimal("152"), 0, 0],
+        ask_volume=[5, 6, 7, 0, 0],
+        diff_ask_vol=[0] * 5,
+        simtrade=0,
+        suspend=False,
+        intraday_odd=False,
+    )
+
+
+def test_wire_layouts_match_dtypes():
+    assert TICK_STRUCT.size == TICK_WIRE_DTYPE.itemsize
+    assert BIDASK_STRUCT.size == BIDASK_WIRE_DTYPE.itemsize
+    assert from_us(to_us(DT)) == DT
+
+
+def test_tick_round_trip():
+    tick = make_tick()
+    decoded = QuoteDecoder().tick("TXFJ1", False, tick_wire(tick))
+    assert isinstance(decoded, TickFOPv1)
+    for name in ("datetime", "close", "avg_price", "underlying_price", "volume"):
+        assert getattr(decoded, name) == getattr(tick, name)
+    assert str(decoded.close) == "16400"
+    assert str(decoded.avg_price) == "16391.25"
+
+
+def test_bidask_round_trip_keeps_decimal_text():
+    quote = make_bidask()
+    decoded = QuoteDecoder().bidask("2330", True, bidask_wire(quote))
+    assert isinstance(decoded, BidAskSTKv1)
+    assert [str(p) for p in decoded.bid_price] == ["150.5", "150", "149.5", "0", "0"]
+    assert decoded.ask_volume == [5, 6, 7, 0, 0]
+
+
+def test_delta_sends_changed_fields_only():
+    codec = DELTAS[BIDASK]
+    first = bidask_wire(make_bidask())
+    snapshot = codec.encode(None, first)
+    assert len(snapshot) == MASK.size + len(first)
+    assert codec.decode(None, snapshot) == first
+    second = bidask_wire(make_bidask("150"))
+    delta = codec.encode(first, second)
+    # the price and its decimal places
+    assert len(delta) == MASK.size + 8 + 1
+    assert codec.decode(first, delta) == second
+    assert codec.encode(second, second) == MASK.pack(0)
+    tick_codec = DELTAS[TICK]
+    ticks = tick_wire(make_tick()), tick_wire(make_tick("16401"))
+    assert tick_codec.decode(ticks[0], tick_codec.encode(*ticks)) == ticks[1]
+
+
+def test_quote_prefix_and_history():
+    payload = quote_prefix(Exchange.TAIFEX, False, "TXFJ1") + b"delta"
+    assert parse_quote(payload) == (Exchange.TAIFEX, False, "TXFJ1", b"delta")
+    ticks = dict(
+        ts=[1633338000000000000],
+        close=[16400.0],
+        volume=[2],
+        bid_price=[16399.0],
+        bid_volume=[5],
+        ask_price=[16400.0],
+        ask_volume=[8],
+        tick_type=[1],
+    )
+    assert parse_history(history_payload("TXFJ1", ticks)) == ("TXFJ1", ticks)
+
+
+def test_fop_bidask_decodes_underlying():
+    quote = BidAskFOPv1(
+        code="TXFJ1",
+        datetime=DT,
+        bid_price=[Decimal("16399")] * 5,
+        bid_volume=[1] * 5,
+        diff_bid_vol=[0] * 5,
+        ask_price=[Decimal("16400")] * 5,
+        ask_volume=[2] * 5,
+        diff_ask_vol=[0] * 5,
+        simtrade=0,
+        bid_total_vol=5,
+        ask_total_vol=10,
+        first_derived_bid_price=Decimal("0"),
+        first_derived_ask_price=Decimal("0"),
+        first_derived_bid_vol=0,
+        first_derived_ask_vol=0,
+        underlying_price=Decimal("16395.55"),
+    )
+    decoded = QuoteDecoder().bidask("TXFJ1", False, bidask_wire(quote))
+    assert isinstance(decoded, BidAskFOPv1)
+    assert decoded.underlying_price == Decimal("16395.55")
+    assert decoded.ask_total_vol == 10
@@ -0,0 +1,144 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from shioaji import BidAskFOPv1, BidAskSTKv1, TickFOPv1, TickSTKv1
+from shioaji.constant import Exchange, QuoteType, QuoteVersion, TicksQueryType
+
+from sjtop.replay import ReplayShioaji, load_ticks
+
+
+@pytest.fixture
+def replay_dir(tmp_path: Path):
+    # ns timestamps like api.ticks, whatever unit pandas parses to
+    ts = [
+        pd.Timestamp(text).value
+        for text in (
+            "2021-10-04 09:00:00",
+            "2021-10-04 09:00:00.5",
+            "2021-10-04 09:00:01",
+        )
+    ]
+    pd.DataFrame(
+        {
+            "ts": ts,
+            "close": [16400, 16401, 16399],
+            "volume": [2, 1, 3],
+            "bid_price": [16399, 16400, 16399],
+            "bid_volume": [5, 6, 7],
+            "ask_price": [16400, 16401, 16400],
+            "ask_volume": [8, 9, 10],
+            "tick_type": [1, 1, 2],
+        }
+    ).to_csv(tmp_path / "TXFJ1.csv", index=False)
+    pd.DataFrame(
+        {
+            "ts": ts[1:2],
+            "close": [600.0],
+            "volume": [10],
+            "bid_price": [599.0],
+            "bid_volume": [100],
+            "ask_price": [600.0],
+            "ask_volume": [50],
+            "tick_type": [2],
+        }
+    ).to_csv(tmp_path / "2330.csv", index=False)
+    return tmp_path
+
+
+def test_load_ticks(replay_dir: Path):
+    feeds = load_ticks(replay_dir)
+    assert sorted(feeds) == ["2330", "TXFJ1"]
+    assert feeds["TXFJ1"]["datetime"][2] == pd.Timestamp("2021-10-04 09:00:01")
+
+
+def test_contracts(replay_dir: Path):
+    api = ReplayShioaji(replay_dir)
+    assert api.Contracts.Futures["TXFJ1"].code == "TXFJ1"
+    assert api.Contracts.Stocks["2330"].exchange == Exchange.TSE
+    assert [c.code for c in api.Contracts.Futures.TXF] == ["TXFJ1"]
+    assert api.Contracts.Options["TXO16400J1"] is None
+
+
+def test_replay_drives_callbacks(replay_dir: Path, mocker):
+    api = ReplayShioaji(replay_dir, speed=None)
+    mocker.patch.object(api.quote, "start")
+    received = []
+    events = []
+    api.quote.set_event_callback(lambda *args: events.append(args[3]))
+    for kind in ["tick_fop_v1", "bidask_fop_v1", "tick_stk_v1", "bidask_stk_v1"]:
+        getattr(api.quote, f"set_on_{kind}_callback")(
+            lambda exchange, quote: received.append((exchange, quote))
+        )
+    api.quote.subscribe(
+        api.Contracts.Stocks["2330"], QuoteType.Tick, version=QuoteVersion.v1
+    )
+    api.quote.subscribe(
+        api.Contracts.Futures["TXFJ1"], QuoteType.Tick, version=QuoteVersion.v1
+    )
+    api.quote.subscribe(
+        api.Contracts.Futures["TXFJ1"], QuoteType.BidAsk, version=QuoteVersion.v1
+    )
+    api.quote.start.assert_called()
+    assert api.quote.now() == datetime.min
+    api.quote.run()
+    assert events == ["Replay started", "Replay finished"]
+    # as fast as possible, the clock is the last row played
+    assert api.quote.now() == datetime(2021, 10, 4, 9, 0, 1)
+    assert [type(q) for _, q in received] == [
+        BidAskFOPv1,
+        TickFOPv1,
+        TickSTKv1,
+        BidAskFOPv1,
+        TickFOPv1,
+        BidAskFOPv1,
+        TickFOPv1,
+    ]
+    exchange, tick = received[-1]
+    assert exchange == Exchange.TAIFEX
+    assert tick.close == Decimal("16399")
+    assert (tick.open, tick.high, tick.low) == (16400, 16401, 16399)
+    assert tick.total_volume == 6
+    assert (tick.bid_side_total_vol, tick.ask_side_total_vol) == (3, 3)
+    assert tick.price_chg == -1
+    _, quote = received[-2]
+    assert quote.bid_price[0] == 16399
+    assert quote.ask_volume == [10, 0, 0, 0, 0]
+    assert received[2][0] == Exchange.TSE
+
+    last = api.ticks(api.Contracts.Futures["TXFJ1"], "2021-10-04", last_cnt=2)
+    assert last["close"] == [16401, 16399]
+    assert list(last) == [
+        "ts",
+        "close",
+        "volume",
+        "bid_price",
+        "bid_volume",
+        "ask_price",
+        "ask_volume",
+        "tick_type",
+    ]
+    ranged = api.ticks(
+        api.Contracts.Futures["TXFJ1"],
+        "2021-10-04",
+        query_type=TicksQueryType.RangeTime,
+        time_start="09:00:00.100",
+        time_end=time(9, 0, 1),
+    )
+    assert ranged["close"] == [16401, 16399]
+
+
+def test_replay_paces_at_speed(replay_dir: Path, mocker):
+    api = ReplayShioaji(replay_dir, speed=2)
+    wait = mocker.patch.object(api.quote.stopped, "wait", return_value=False)
+    api.quote.set_on_tick_fop_v1_callback(lambda exchange, tick: None)
+    api.quote.subscribe(api.Contracts.Futures["TXFJ1"], QuoteType.Tick)
+    api.quote.thread.join()
+    delays = [c[0][0] for c in wait.call_args_list]
+    assert len(delays) == 3
+    assert delays[-1] == pytest.approx(0.5, abs=0.05)
+    wall, ts = api.quote.anchor
+    mocker.patch("sjtop.replay.time.monotonic", return_value=wall + 0.5)
+    assert api.quote.now() == ts + timedelta(seconds=1)
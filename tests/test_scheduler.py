@@ -0,0 +1,66 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from sjtop.scheduler import RenderScheduler
+
+
+@pytest.fixture
+def scheduler(mocker: MockerFixture):
+    loop = mocker.MagicMock()
+    loop.time.return_value = 100.0
+    return RenderScheduler(loop, fps=10)
+
+
+def test_mark_dirty_wakes_loop_once(scheduler: RenderScheduler, mocker: MockerFixture):
+    widget = mocker.MagicMock()
+    for _ in range(5):
+        scheduler.mark_dirty(widget)
+    scheduler.loop.call_soon_threadsafe.assert_called_once_with(scheduler.schedule)
+    assert scheduler.dirty == {widget: 5}
+
+
+def test_flush_collapses_requests(scheduler: RenderScheduler, mocker: MockerFixture):
+    on_frame = scheduler.on_frame = mocker.MagicMock()
+    w1, w2 = mocker.MagicMock(), mocker.MagicMock()
+    for _ in range(3):
+        scheduler.mark_dirty(w1)
+    scheduler.mark_dirty(w2)
+    scheduler.flush()
+    w1.refresh.assert_called_once_with()
+    w2.refresh.assert_called_once_with()
+    stats = on_frame.call_args[0][0]
+    assert (stats.frame, stats.widgets, stats.requests) == (1, 2, 4)
+    assert stats.collapsed == 2
+    assert scheduler.collapsed == 2
+    assert not scheduler.pending
+    assert scheduler.dirty == {}
+
+
+def test_schedule_respects_frame_rate(scheduler: RenderScheduler):
+    scheduler.last_flush = 99.95
+    scheduler.schedule()
+    delay, callback = scheduler.loop.call_later.call_args[0]
+    assert delay == pytest.approx(0.05)
+    assert callback == scheduler.flush
+    scheduler.last_flush = 99.0
+    scheduler.schedule()
+    scheduler.loop.call_soon.assert_called_once_with(scheduler.flush)
+
+
+def test_adaptive_schedule_flushes_on_next_iteration(scheduler: RenderScheduler):
+    scheduler.fps = None
+    scheduler.last_flush = 100.0
+    scheduler.schedule()
+    scheduler.loop.call_soon.assert_called_once_with(scheduler.flush)
+    scheduler.loop.call_later.assert_not_called()
+
+
+def test_frame_reports_lateness(scheduler: RenderScheduler, mocker: MockerFixture):
+    on_frame = scheduler.on_frame = mocker.MagicMock()
+    scheduler.last_flush = 99.95
+    scheduler.mark_dirty(mocker.MagicMock())
+    scheduler.schedule()
+    assert scheduler.due == pytest.approx(100.05)
+    scheduler.loop.time.return_value = 100.35
+    scheduler.flush()
+    assert on_frame.call_args[0][0].late == pytest.approx(0.3)
@@ -0,0 +1,140 @@
+import asyncio
+import queue
+import threading
+from decimal import Decimal
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from pytest_mock import MockerFixture
+from shioaji.constant import QuoteType, QuoteVersion
+
+from sjtop.protocol import (
+    BIDASK,
+    DELTAS,
+    HEADER,
+    HISTORY,
+    HISTORY_DTYPE,
+    MASK,
+    REQUEST_ID,
+    TICK,
+    frame,
+    history_payload,
+)
+from sjtop.remote import RemoteShioaji
+from sjtop.replay import ReplayShioaji
+from sjtop.server import Outbox, QuoteServer
+
+
+def test_outbox_conflates_bidask_until_a_trade():
+    outbox = Outbox(max_pending=3)
+    outbox.push_frame(b"control")
+    outbox.push_quote(BIDASK, "2330", b"", b"a")
+    outbox.push_quote(BIDASK, "2330", b"", b"b")
+    assert outbox.conflated == 1
+    outbox.push_quote(TICK, "2330", b"", b"t")
+    outbox.push_quote(BIDASK, "2330", b"", b"c")
+    assert outbox.dropped == 1
+    assert [entry[3] for entry in outbox.pending] == [b"control", b"b", b"t"]
+    outbox.forget(BIDASK, "2330")
+    assert [entry[3] for entry in outbox.pending] == [b"control", b"t"]
+
+
+def test_outbox_sends_deltas_against_what_was_written():
+    outbox = Outbox()
+    record = bytes(DELTAS[TICK].spans[-1][1])
+    outbox.push_quote(TICK, "2330", b"P", record)
+    assert outbox.ready.is_set()
+    data = outbox.take()
+    assert not outbox.ready.is_set()
+    assert data == frame(TICK, b"P" + MASK.pack(DELTAS[TICK].full) + record)
+    outbox.push_quote(TICK, "2330", b"P", record)
+    assert outbox.take() == frame(TICK, b"P" + MASK.pack(0))
+    outbox.forget(TICK, "2330")
+    outbox.push_quote(TICK, "2330", b"P", record)
+    assert len(outbox.take()) == HEADER.size + 1 + MASK.size + len(record)
+
+
+@pytest.fixture
+def server(tmp_path: Path, mocker: MockerFixture):
+    pd.DataFrame(
+        {
+            "ts": [
+                pd.Timestamp(text).value
+                for text in ["2021-10-04 09:00:00", "2021-10-04 09:00:01"]
+            ],
+            "close": [16400, 16401],
+            "volume": [2, 1],
+            "bid_price": [16399, 16400],
+            "bid_volume": [5, 6],
+            "ask_price": [16400, 16401],
+            "ask_volume": [8, 9],
+            "tick_type": [1, 1],
+        }
+    ).to_csv(tmp_path / "TXFJ1.csv", index=False)
+    api = ReplayShioaji(tmp_path, speed=None)
+    mocker.patch.object(api.quote, "start")
+    loop = asyncio.new_event_loop()
+    server = QuoteServer(api, tmp_path / "sjtop.sock", loop)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def viewer(server: QuoteServer) -> "queue.Queue":
+    api = RemoteShioaji(server.path)
+    received: "queue.Queue" = queue.Queue()
+    api.quote.set_on_tick_fop_v1_callback(lambda exchange, tick: received.put(tick))
+    api.quote.set_on_bidask_fop_v1_callback(lambda exchange, quote: received.put(quote))
+    received.api = api
+    return received
+
+
+def test_fan_out_snapshot_and_unsubscribe(server: QuoteServer):
+    first, second = viewer(server), viewer(server)
+    contract = first.api.Contracts.Futures["TXFJ1"]
+    assert contract is not None
+    replay = server.api.quote
+    rows = replay.rows["TXFJ1"]
+    for received in (first, second):
+        received.api.quote.subscribe(contract, QuoteType.Tick, QuoteVersion.v1)
+        # answered after the subscription, frames are handled in order
+        history = received.api.ticks(contract, "2021-10-04", last_cnt=5)
+        assert history["close"] == []
+    # both viewers share one upstream subscription
+    assert replay.tick_codes == {"TXFJ1"}
+    replay.play("TXFJ1", rows[0])
+    for received in (first, second):
+        tick = received.get(timeout=5)
+        assert (tick.code, tick.close, tick.volume) == ("TXFJ1", Decimal("16400"), 2)
+    replay.play("TXFJ1", rows[1])
+    assert first.get(timeout=5).close == Decimal("16401")
+    assert second.get(timeout=5).close == Decimal("16401")
+    assert first.api.ticks(contract, "2021-10-04", last_cnt=1)["close"] == [16401.0]
+    # a late viewer starts with the snapshot
+    late = viewer(server)
+    late.api.quote.subscribe(contract, QuoteType.Tick, QuoteVersion.v1)
+    assert late.get(timeout=5).close == Decimal("16401")
+    for received in (first, second, late):
+        received.api.quote.unsubscribe(contract, QuoteType.Tick, QuoteVersion.v1)
+        received.api.ticks(contract, "2021-10-04")
+    assert replay.tick_codes == set()
+    for received in (first, second, late):
+        received.api.close()
+
+
+def test_history_drops_late_answers(server: QuoteServer):
+    received = viewer(server)
+    contract = received.api.Contracts.Futures["TXFJ1"]
+    server.api.quote.play("TXFJ1", server.api.quote.rows["TXFJ1"][0])
+    # the answer of a request that timed out, still in the queue
+    late = history_payload("MXFJ1", {name: [] for name in HISTORY_DTYPE.names})
+    received.api.history.put((HISTORY, REQUEST_ID.pack(0) + late))
+    history = received.api.ticks(contract, "2021-10-04", last_cnt=5)
+    assert history["close"] == [16400.0]
+    received.api.close()
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+from shioaji.constant import SecurityType
+from textual.widgets import TreeClick
+
+from sjtop.replay import build_contracts
+from sjtop.side import CHUNK, ContractsTree, ExchangeIndex
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+@pytest.fixture(scope="module")
+def contracts():
+    codes = [f"{i:04d}" for i in range(1000, 9000)]
+    codes += [f"{i:06d}" for i in range(10000, 14000)]
+    return build_contracts(codes + ["TXFJ1", "TXFK1"])
+
+
+@pytest.fixture
+def tree(contracts):
+    tree = ContractsTree(contracts, "contracts")
+    run(tree.load_contracts(tree.root))
+    return tree
+
+
+def child(node, label):
+    return next(c for c in node.children if c.label == label)
+
+
+def test_exchange_index():
+    index = ExchangeIndex.build(
+        [type("C", (), {"code": code}) for code in ["2330", "030001", "1101"]]
+    )
+    assert index.codes == ["030001", "1101", "2330"]
+    assert index.listed == ["1101", "2330"]
+
+
+def test_expand_materializes_one_chunk(tree: ContractsTree):
+    stocks = child(tree.root, "Stocks")
+    run(tree.load_contracts(stocks))
+    tse = child(stocks, "TSE")
+    start = time.perf_counter()
+    run(tree.load_contracts(tse))
+    assert time.perf_counter() - start < 0.1
+    assert len(tse.children) == CHUNK + 1
+    assert [c.data.code for c in tse.children[:2]] == ["1000", "1001"]
+    more = tse.children[-1]
+    assert more.data.is_more
+    assert more.label == f"… {8000 - CHUNK} more"
+    # the index keeps the 6-digit codes for the unfiltered view
+    assert len(tree.indexes[SecurityType.Stock, "TSE"].codes) == 12000
+
+    run(tree.handle_tree_click(TreeClick(tree, more)))
+    assert len(tse.children) == 2 * CHUNK + 1
+    assert more.id not in tree.nodes
+    assert tree.nodes[tree.cursor].data.code == str(1000 + CHUNK)
+
+
+def test_load_visible(tree: ContractsTree):
+    futures = child(tree.root, "Futures")
+    run(tree.load_contracts(futures))
+    stocks = child(tree.root, "Stocks")
+    run(tree.load_contracts(stocks))
+    tse = child(stocks, "TSE")
+    run(tree.load_contracts(tse))
+    more_line = tree.line_of(tse.children[-1].id)
+    run(tree.load_visible(more_line - 1))
+    assert len(tse.children) == CHUNK + 1
+    run(tree.load_visible(more_line + 2 * CHUNK - 1))
+    assert len(tse.children) == 3 * CHUNK + 1
+    assert tree.line_of(tse.children[-1].id) == more_line + 2 * CHUNK
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from pytest_mock import MockerFixture
+from rich.console import Console
+
+from sjtop.spreads import (
+    Leg,
+    SpreadBook,
+    SpreadPanel,
+    parse_spread,
+    sparkline,
+)
+
+START = datetime(2021, 10, 4, 9)
+
+
+def tick(seconds: float, code: str, close: str, underlying="0"):
+    return SimpleNamespace(
+        code=code,
+        datetime=START + timedelta(seconds=seconds),
+        close=Decimal(close),
+        underlying_price=Decimal(underlying),
+    )
+
+
+def bidask(seconds: float, code: str, bid: str, ask: str, underlying="0"):
+    return SimpleNamespace(
+        code=code,
+        datetime=START + timedelta(seconds=seconds),
+        bid_price=[Decimal(bid)],
+        ask_price=[Decimal(ask)],
+        underlying_price=Decimal(underlying),
+    )
+
+
+def on_tick(spreads: SpreadBook, tick) -> bool:
+    return spreads.on_tick(tick, spreads.prices.trade(tick))
+
+
+def on_bidask(spreads: SpreadBook, quote) -> bool:
+    return spreads.on_bidask(quote, *spreads.prices.book(quote))
+
+
+def book(*legs: str, **kwargs) -> SpreadBook:
+    return SpreadBook([parse_spread({"legs": text}) for text in legs], **kwargs)
+
+
+def test_parse_spread():
+    spread = parse_spread({"name": "cal", "legs": "TXFJ1 - TXFK1"})
+    assert spread.name == "cal"
+    assert spread.legs == (Leg("TXFJ1", 1, False), Leg("TXFK1", -1, False))
+    spread = parse_spread({"legs": " -2*MXFJ1 + TXFJ1.underlying "})
+    assert spread.name == "-2*MXFJ1 + TXFJ1.underlying"
+    assert spread.legs == (Leg("MXFJ1", -2, False), Leg("TXFJ1", 1, True))
+    for legs in ("", "TXFJ1 TXFK1", "TXFJ1 - 0 * TXFK1", "TXFJ1.close", "TXFJ1 -"):
+        with pytest.raises(ValueError):
+            parse_spread({"legs": legs})
+
+
+def test_calendar_spread_sides():
+    spreads = book("TXFJ1 - TXFK1")
+    assert spreads.codes == ["TXFJ1", "TXFK1"]
+    assert on_bidask(spreads, bidask(0, "TXFJ1", "16400", "16401"))
+    assert not on_bidask(spreads, bidask(0, "MXFJ1", "1", "2"))
+    assert spreads.mid(0) is None and spreads.missing_bid == [1]
+    on_bidask(spreads, bidask(1, "TXFK1", "16380", "16383"))
+    # sell the near at its bid, buy the far at its ask
+    assert (spreads.bid[0], spreads.ask[0]) == (1700, 2100)
+    assert spreads.mid(0) == 19.0
+    on_bidask(spreads, bidask(2, "TXFK1", "16390", "16392"))
+    assert (spreads.bid[0], spreads.ask[0]) == (800, 1100)
+    # an empty side of a leg empties the side of the spread
+    on_bidask(spreads, bidask(3, "TXFJ1", "0", "16401"))
+    assert spreads.missing_bid == [1] and spreads.mid(0) is None
+    on_tick(spreads, tick(4, "TXFJ1", "16400"))
+    on_tick(spreads, tick(4, "TXFK1", "16391"))
+    assert spreads.last[0] == 900 and spreads.missing_last == [0]
+
+
+def test_ratios_and_shared_legs():
+    spreads = book("TXFJ1 - 4 * MXFJ1", "2 * MXFJ1")
+    assert spreads.routes == {"TXFJ1": [0], "MXFJ1": [1, 2]}
+    on_tick(spreads, tick(0, "MXFJ1", "16401"))
+    on_tick(spreads, tick(0, "TXFJ1", "16400"))
+    assert spreads.last == [(16400 - 4 * 16401) * 100, 2 * 16401 * 100]
+
+
+def test_basis_from_the_underlying():
+    spreads = book("TXFJ1 - TXFJ1.underlying")
+    assert spreads.codes == ["TXFJ1"]
+    on_tick(spreads, tick(0, "TXFJ1", "16420", underlying="16401.25"))
+    assert spreads.last == [1875] and spreads.decimals == [2]
+    on_bidask(spreads, bidask(1, "TXFJ1", "16419", "16421", underlying="16400.5"))
+    assert (spreads.bid[0], spreads.ask[0]) == (1850, 2050)
+    # one quote feeds both legs at the same exchange time
+    assert spreads.lag(0) == 0.0
+
+
+def test_legs_aligned_by_exchange_time():
+    spreads = book("TXFJ1 - TXFK1", interval=1)
+    on_tick(spreads, tick(0.5, "TXFJ1", "16400"))
+    assert spreads.lag(0) is None
+    on_tick(spreads, tick(2.25, "TXFK1", "16390"))
+    assert spreads.lag(0) == 1.75 and spreads.ts[0] == spreads.leg_ts[1]
+    # a late leg quote keeps the spread at the time of its newest leg
+    on_tick(spreads, tick(1, "TXFJ1", "16401"))
+    assert spreads.ts[0] == spreads.leg_ts[1] and spreads.lag(0) == 1.25
+    on_tick(spreads, tick(2.75, "TXFJ1", "16402"))
+    on_tick(spreads, tick(4, "TXFJ1", "16405"))
+    bucket = spreads.ts[0] // 1_000_000
+    assert list(spreads.history[0]) == [[bucket - 2, 12.0], [bucket, 15.0]]
+
+
+def test_history_is_bounded():
+    spreads = book("TXFJ1", interval=1, capacity=3)
+    for second in range(5):
+        on_tick(spreads, tick(second, "TXFJ1", str(100 + second)))
+    assert [value for _, value in spreads.history[0]] == [102.0, 103.0, 104.0]
+
+
+def test_sparkline():
+    assert sparkline([], 5) == ""
+    assert sparkline([[10, 1.0], [11, 2.0], [13, 9.0]], 4) == "▁▂▂█"
+    # older buckets carry over the start of the window
+    assert sparkline([[1, 5.0], [10, 5.0]], 3) == "▁▁▁"
+    assert sparkline([[10, 1.0]], 3) == "  ▁"
+
+
+def test_panel_renders_spreads(mocker: MockerFixture):
+    scheduler = mocker.MagicMock()
+    spreads = [
+        parse_spread({"name": "cal", "legs": "TXFJ1 - TXFK1"}),
+        parse_spread({"name": "basis", "legs": "TXFJ1 - TXFJ1.underlying"}),
+    ]
+    panel = SpreadPanel("spreads", spreads, scheduler)
+    assert panel.codes == ["TXFJ1", "TXFK1"]
+    prices = panel.book.prices
+    quote = bidask(0, "2330", "500", "501")
+    panel.on_bidask(None, quote, *prices.book(quote))
+    scheduler.mark_dirty.assert_not_called()
+    quote = bidask(0, "TXFJ1", "16419", "16421", underlying="16400.5")
+    panel.on_bidask(None, quote, *prices.book(quote))
+    scheduler.mark_dirty.assert_called_with(panel)
+    trade = tick(1, "TXFK1", "16390")
+    panel.on_tick(None, trade, prices.trade(trade))
+    console = Console(width=120, record=True)
+    console.print(panel.render())
+    text = console.export_text()
+    assert "cal" in text and "basis" in text
+    assert "18.5 " in text and "20.5 " in text and "1.0s" in text
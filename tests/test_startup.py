@@ -0,0 +1,91 @@
+import subprocess
+import sys
+from datetime import date
+from pathlib import Path
+from typing import Dict
+
+from sjtop.replay import build_contracts
+from sjtop.startup import PhaseTimer, load_snapshot, save_snapshot, snapshot_path
+
+# cumulative import time budgets, in microseconds; the fastest of 3 imports
+# of sjtop.app measures about 510ms (shioaji alone about 310ms), the entry
+# point about 11ms
+MAIN_BUDGET_US = 50_000
+APP_BUDGET_US = 700_000
+# loaded by the mode, panel or action that uses them
+LAZY_MODULES = {
+    "sjtop.alerts",
+    "sjtop.heatmap",
+    "sjtop.history",
+    "sjtop.options",
+    "sjtop.remote",
+    "sjtop.replay",
+    "sjtop.spreads",
+}
+
+
+def import_times(module: str) -> Dict[str, int]:
+    """Cumulative `-X importtime` microseconds of every module `module` loads."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_entry_point_imports_nothing_heavy():
+    times = import_times("sjtop.__main__")
+    assert times["sjtop.__main__"] < MAIN_BUDGET_US
+    assert not {"numpy", "pandas", "shioaji", "textual.app"} & set(times)
+
+
+def test_app_import_budget():
+    runs = [import_times("sjtop.app") for _ in range(3)]
+    assert min(times["sjtop.app"] for times in runs) < APP_BUDGET_US
+    # pandas comes with the first history load
+    assert "pandas" not in runs[0]
+    assert not LAZY_MODULES & set(runs[0])
+
+
+def test_snapshot_round_trip(tmp_path: Path):
+    contracts = build_contracts(["2330", "TXFJ1"])
+    day = date(2021, 10, 4)
+    assert load_snapshot(tmp_path, day) is None
+    path = save_snapshot(tmp_path, day, contracts)
+    assert path == tmp_path / "contracts-20211004.pkl"
+    loaded = load_snapshot(tmp_path, day)
+    assert loaded.Stocks["2330"].code == "2330"
+    assert [c.code for c in loaded.Futures.TXF] == ["TXFJ1"]
+    assert load_snapshot(tmp_path, date(2021, 10, 5)) is None
+
+
+def test_snapshot_keeps_one_day(tmp_path: Path):
+    contracts = build_contracts(["2330"])
+    save_snapshot(tmp_path, date(2021, 10, 4), contracts)
+    save_snapshot(tmp_path, date(2021, 10, 5), contracts)
+    assert [p.name for p in tmp_path.iterdir()] == ["contracts-20211005.pkl"]
+
+
+def test_corrupt_snapshot(tmp_path: Path):
+    day = date(2021, 10, 4)
+    snapshot_path(tmp_path, day).write_bytes(b"not a pickle")
+    assert load_snapshot(tmp_path, day) is None
+
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    with timer.phase("login"):
+        pass
+    with timer.phase("ticks"):
+        pass
+    assert list(timer.phases) == ["login", "ticks"]
+    assert timer.summary().startswith("startup ")
+    assert "| ticks " in timer.summary()
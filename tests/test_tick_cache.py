@@ -0,0 +1,63 @@
+from datetime import datetime
+from decimal import Decimal
+
+from pytest_mock import MockerFixture
+
+from sjtop.tick_cache import TickCache, TickRecord, records_from_ticks
+
+
+def record(second: int) -> TickRecord:
+    return TickRecord(datetime(2021, 10, 4, 9, 0, second), 99, 100, 100, 1)
+
+
+def test_records_from_ticks():
+    ticks = {
+        "ts": [1633338000001000000],
+        "close": [150.5],
+        "volume": [3],
+        "bid_price": [150.0],
+        "ask_price": [150.5],
+        "tick_type": [1],
+    }
+    assert records_from_ticks(ticks) == [
+        TickRecord(datetime(2021, 10, 4, 9, 0, 0, 1000), 150.0, 150.5, 150.5, 3, 1)
+    ]
+    assert records_from_ticks({"ts": [0], "close": [1.0]})[0][1:] == (0, 1.0, 0, 0, 0)
+    assert records_from_ticks({}) == []
+
+
+def test_lru_eviction():
+    cache = TickCache(capacity=2)
+    assert cache.put("TXFJ1", [record(0)]) == []
+    assert cache.put("MXFJ1", []) == []
+    assert cache.get("TXFJ1") is not None
+    assert cache.put("2330", []) == ["MXFJ1"]
+    assert list(cache.entries) == ["TXFJ1", "2330"]
+    assert cache.get("MXFJ1") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_depth():
+    cache = TickCache(depth=2)
+    cache.put("TXFJ1", [record(0), record(1), record(2)])
+    assert list(cache.get("TXFJ1")) == [record(1), record(2)]
+
+
+def test_live_stream_keeps_history_fresh(mocker: MockerFixture):
+    cache = TickCache()
+    cache.put("TXFJ1", [record(0)])
+    cache.on_bidask(mocker.MagicMock(code="TXFJ1", bid_price=[101], ask_price=[102]))
+    tick = mocker.MagicMock(
+        code="TXFJ1",
+        datetime=datetime(2021, 10, 4, 9, 0, 5),
+        close=102,
+        volume=4,
+        tick_type=2,
+    )
+    cache.on_tick(tick)
+    cache.on_tick(mocker.MagicMock(code="MXFJ1"))
+    assert list(cache.get("TXFJ1")) == [
+        record(0),
+        TickRecord(datetime(2021, 10, 4, 9, 0, 5), 101, 102, 102, 4, 2),
+    ]
+    assert "MXFJ1" not in cache
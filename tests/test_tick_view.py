@@ -1,5 +1,7 @@
+import numpy as np
 import pytest
-from datetime import datetime
+import pandas as pd
+from datetime import datetime, time, timedelta
 from decimal import Decimal
 from rich.text import Text
 from shioaji import TickFOPv1, BidAskFOPv1
@@ -7,20 +9,41 @@ from shioaji.constant import Exchange
 from shioaji.contracts import Stock
 from pytest_mock import MockerFixture
 
-from sjtop.tick_view import TickViewer
+from sjtop.tick_view import TickTape, TickViewer, parse_time
 
 
 @pytest.fixture
 def tickview(mocker: MockerFixture):
     contract = Stock(exchange=Exchange.TSE, code="2330", symbol="TSE2330")
-    tickview = TickViewer("tickview", contract)
-    tickview.loop = mocker.MagicMock()
+    tickview = TickViewer("tickview", contract, mocker.MagicMock())
     return tickview
 
 
-# def test_change_contract(tickview: TickViewer):
-#     contract = Stock(exchange=Exchange.TSE, code="2609", symbol="TSE2609")
-#     tickview.change_contract(contract)
+def on_tick(tickview: TickViewer, tick):
+    """Feed a trade like `SJTop.dispatch_fop_v1_tick`."""
+    tickview.on_fop_v1_tick(Exchange.TAIFEX, tick, tickview.prices.trade(tick))
+
+
+def test_change_contract(tickview: TickViewer):
+    contract = Stock(exchange=Exchange.TSE, code="2609", symbol="TSE2609")
+    df_tick = pd.DataFrame(
+        {
+            "datetime": pd.to_datetime(
+                ["2021-10-04 09:00:00.001", "2021-10-04 09:00:01.500"]
+            ),
+            "close": [Decimal("150.5"), Decimal("150")],
+            "volume": [3, 1],
+            "bid_price": [Decimal("150"), Decimal("150")],
+            "ask_price": [Decimal("150.5"), Decimal("150.5")],
+        }
+    )
+    tickview.change_contract(contract, df_tick.itertuples())
+    assert tickview.contract == contract
+    assert list(tickview.rows) == [
+        ("09:00:01.500", "150", "150", "150.5", "1", "green"),
+        ("09:00:00.001", "150", "150.5", "150.5", "3", "red"),
+    ]
+    tickview.scheduler.mark_dirty.assert_called_once_with(tickview)
 
 
 def test_on_fop_v1_tick(tickview: TickViewer, mocker: MockerFixture):
@@ -45,19 +68,50 @@ def test_on_fop_v1_tick(tickview: TickViewer, mocker: MockerFixture):
         pct_chg=Decimal("0"),
         simtrade=1,
     )
-    tickview.table = mocker.MagicMock()
-    tickview.on_fop_v1_tick(Exchange.TAIFEX, tick)
-    tickview.table.add_row.assert_called_once_with(
-        *[
-            Text("10:10:15.000"),
-            Text(str(tickview.bid_price), style="green"),
-            Text(str(tick.close), style="green"),
-            Text(str(tickview.ask_price), style="red"),
-            Text(str(tick.volume), style="green"),
-        ]
-    )
-    tickview.loop.call_soon_threadsafe.assert_called_once_with(tickview.refresh)
+    on_tick(tickview, tick)
+    assert tickview.rows[0] == ("10:10:15.000", "None", "0", "None", "0", "green")
+    tickview.scheduler.mark_dirty.assert_called_once_with(tickview)
     assert tickview.modify == True
+    table = tickview.render()
+    assert tickview.modify == False
+    assert [col._cells[0] for col in table.columns] == [
+        Text("10:10:15.000"),
+        Text(str(tickview.bid_price), style="green"),
+        Text(str(tick.close), style="green"),
+        Text(str(tickview.ask_price), style="red"),
+        Text(str(tick.volume), style="green"),
+    ]
+
+
+def test_tape_keeps_newest_ticks(tickview: TickViewer):
+    tickview.set_depth(3)
+    for second in range(5):
+        tick = TickFOPv1(
+            code="TXFA0",
+            datetime=datetime(2021, 1, 1, 10, 10, second, 0),
+            open=Decimal("0"),
+            underlying_price=Decimal("0"),
+            bid_side_total_vol=1,
+            ask_side_total_vol=1,
+            avg_price=Decimal("0"),
+            close=Decimal(16400 + second),
+            high=Decimal("0"),
+            low=Decimal("0"),
+            amount=Decimal("0"),
+            total_amount=Decimal("0"),
+            volume=1,
+            total_volume=0,
+            tick_type=1,
+            chg_type=0,
+            price_chg=Decimal("0"),
+            pct_chg=Decimal("0"),
+            simtrade=1,
+        )
+        on_tick(tickview, tick)
+    assert [row[2] for row in tickview.rows] == ["16404", "16403", "16402"]
+    tickview.set_depth(2)
+    assert [row[2] for row in tickview.rows] == ["16404", "16403"]
+    assert len(tickview.render().rows) == 2
 
 
 def test_on_fop_v1_bidask(tickview: TickViewer):
@@ -91,6 +145,102 @@ def test_on_fop_v1_bidask(tickview: TickViewer):
         underlying_price=Decimal("16408.35"),
         simtrade=0,
     )
-    tickview.on_fop_v1_bidask(Exchange.TAIFEX, ba)
-    assert tickview.ask_price == 16413
-    assert tickview.bid_price == 16411
+    tickview.on_fop_v1_bidask(Exchange.TAIFEX, ba, *tickview.prices.book(ba))
+    assert tickview.ask_price == 1641300
+    assert tickview.bid_price == 1641100
+
+
+def fop_tick(dt: datetime, close: int, tick_type: int = 1):
+    return TickFOPv1(
+        code="TXFJ1",
+        datetime=dt,
+        open=Decimal("0"),
+        underlying_price=Decimal("0"),
+        bid_side_total_vol=1,
+        ask_side_total_vol=1,
+        avg_price=Decimal("0"),
+        close=Decimal(close),
+        high=Decimal("0"),
+        low=Decimal("0"),
+        amount=Decimal("0"),
+        total_amount=Decimal("0"),
+        volume=1,
+        total_volume=0,
+        tick_type=tick_type,
+        chg_type=0,
+        price_chg=Decimal("0"),
+        pct_chg=Decimal("0"),
+        simtrade=1,
+    )
+
+
+def test_tape_grows_and_finds_times():
+    tape = TickTape(capacity=2)
+    for i in range(5):
+        tape.append(i * 10, 0, i, 0, 1, True)
+    assert len(tape) == 5 and tape.capacity == 8
+    assert tape.close[:5].tolist() == [0, 1, 2, 3, 4]
+    assert tape.nbytes == 8 * 25
+    tape.extend(*(np.array([50]) for _ in TickTape.fields))
+    assert tape.ts[5] == 50
+    assert [tape.index_at(us) for us in (-1, 0, 15, 99)] == [-1, 0, 1, 5]
+
+
+def test_scrolled_back_rows_stay_put(tickview: TickViewer):
+    tickview.set_depth(2)
+    for second in range(5):
+        on_tick(
+            tickview,
+            fop_tick(datetime(2021, 10, 4, 9, 0, second), 16400 + second),
+        )
+    tickview.page(1)
+    assert [row[2] for row in tickview.rows] == ["16402", "16401"]
+    on_tick(tickview, fop_tick(datetime(2021, 10, 4, 9, 0, 5), 16405))
+    assert tickview.offset == 3
+    assert [row[2] for row in tickview.rows] == ["16402", "16401"]
+    assert tickview.render().columns[0].header == "Time +3"
+    tickview.oldest()
+    assert [row[2] for row in tickview.rows] == ["16401", "16400"]
+    tickview.scroll(10)
+    assert tickview.offset == 4
+    tickview.follow()
+    assert [row[2] for row in tickview.rows] == ["16405", "16404"]
+
+
+def test_jump_to_time(tickview: TickViewer):
+    # a night session across midnight
+    start = datetime(2021, 10, 4, 23, 59, 58)
+    for second in range(4):
+        on_tick(tickview, fop_tick(start + timedelta(seconds=second), 16400 + second))
+    tickview.set_depth(2)
+    tickview.jump(time(23, 59, 59))
+    assert tickview.rows[0][:3] == ("23:59:59.000", "None", "16401")
+    tickview.jump(time(0, 0, 0, 500000))
+    assert tickview.rows[0][0] == "00:00:00.000"
+    assert parse_time("0905") == time(9, 5) and parse_time("9x") is None
+
+
+def test_history_goes_below_the_live_ticks(tickview: TickViewer):
+    on_tick(tickview, fop_tick(datetime(2021, 10, 4, 9, 0, 1), 16401))
+    tickview.begin_history()
+    on_tick(tickview, fop_tick(datetime(2021, 10, 4, 9, 0, 2), 16402, tick_type=2))
+    tickview.add_history(
+        pd.DataFrame(
+            {
+                "datetime": pd.to_datetime(
+                    ["2021-10-04 08:45:00", "2021-10-04 09:00:01"]
+                ),
+                "close": [16399.0, 16401.0],
+                "volume": [5, 1],
+                "bid_price": [16398.0, 16400.0],
+                "ask_price": [16399.0, 16401.0],
+                "tick_type": [1, 1],
+            }
+        )
+    )
+    tickview.end_history()
+    assert tickview.rows == [
+        ("09:00:02.000", "None", "16402", "None", "1", "green"),
+        ("09:00:01.000", "16400", "16401", "16401", "1", "red"),
+        ("08:45:00.000", "16398", "16399", "16399", "5", "red"),
+    ]
@@ -0,0 +1,104 @@
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from pytest_mock import MockerFixture
+from shioaji.constant import Exchange
+
+from sjtop.watchlist import Watchlist, WatchlistStore
+
+
+def tick(code: str, close: str, price_chg: str = "0", total_volume: int = 1):
+    return SimpleNamespace(
+        code=code,
+        datetime=datetime(2021, 10, 4, 9, 0, 0),
+        close=Decimal(close),
+        price_chg=Decimal(price_chg),
+        pct_chg=Decimal("0.5"),
+        total_volume=total_volume,
+    )
+
+
+def bidask(code: str, bid: str, ask: str):
+    return SimpleNamespace(
+        code=code, bid_price=[Decimal(bid)], ask_price=[Decimal(ask)]
+    )
+
+
+def on_tick(target, tick):
+    """Feed a `WatchlistStore` or `Watchlist` like `SJTop.dispatch_*`."""
+    store = getattr(target, "store", target)
+    close = store.prices.trade(tick)
+    if target is store:
+        return store.on_tick(tick, close)
+    target.on_tick(Exchange.TSE, tick, close)
+
+
+def on_bidask(target, quote):
+    store = getattr(target, "store", target)
+    bids, asks = store.prices.book(quote)
+    if target is store:
+        return store.on_bidask(quote, bids, asks)
+    target.on_bidask(Exchange.TSE, quote, bids, asks)
+
+
+@pytest.fixture
+def watchlist(mocker: MockerFixture):
+    watchlist = Watchlist("watchlist", ["2330", "2609", "TXFJ1"], mocker.MagicMock())
+    watchlist.n = 2
+    return watchlist
+
+
+def test_store_updates_one_slot():
+    store = WatchlistStore(["2330", "2609"], capacity=1)
+    assert store.capacity == 2
+    assert on_tick(store, tick("2609", "150.50", "-1.5", 1234)) == 1
+    assert on_bidask(store, bidask("2609", "150.00", "150.50")) == 1
+    assert on_tick(store, tick("0050", "140")) == -1
+    assert store.close.tolist() == [0, 15050]
+    assert store.change[1] == -150
+    assert store.volume[1] == 1234
+    assert (store.bid[1], store.ask[1]) == (15000, 15050)
+
+
+def test_store_add_remove():
+    store = WatchlistStore(["2330", "2609", "0050"], capacity=2)
+    on_tick(store, tick("0050", "140.1"))
+    assert store.add("2609") == 1
+    store.remove("2609")
+    assert store.codes == ["2330", "0050"]
+    assert store.index == {"2330": 0, "0050": 1}
+    assert store.close[1] == 14010
+    assert "2609" not in store
+    assert store.add("2603") == 2
+    assert store.close[2] == 0
+
+
+def test_marks_dirty_only_for_visible_rows(watchlist: Watchlist):
+    on_tick(watchlist, tick("TXFJ1", "16411"))
+    watchlist.scheduler.mark_dirty.assert_not_called()
+    on_bidask(watchlist, bidask("2609", "150", "150.5"))
+    watchlist.scheduler.mark_dirty.assert_called_once_with(watchlist)
+    watchlist.scroll(5)
+    assert watchlist.offset == 1
+    assert watchlist.is_visible(2)
+
+
+def test_render(watchlist: Watchlist):
+    on_tick(watchlist, tick("2330", "600.00", "5.00", 20000))
+    on_bidask(watchlist, bidask("2330", "599", "600"))
+    table = watchlist.render()
+    assert len(table.rows) == 2
+    cells = [col._cells[0] for col in table.columns]
+    assert [cell.plain for cell in cells] == [
+        "2330",
+        "600.00",
+        "+5.00",
+        "+0.50%",
+        "20000",
+        # as the feed sent them
+        "599",
+        "600.00",
+    ]
+    assert cells[1].style == "red"